@@ -23,12 +23,14 @@ export const memory = {
 	pos_last_sync_totals: { pending: 0, synced: 0, drafted: 0 },
 	uom_cache: {},
 	offers_cache: [],
+	offers_etag: null,
 	customer_balance_cache: {},
 	local_stock_cache: {},
 	stock_cache_ready: false,
 	customer_storage: [],
 	pos_opening_storage: null,
 	opening_dialog_storage: null,
+	pos_bootstrap: null,
 	sales_persons_storage: [],
 	item_details_cache: {},
 	tax_template_cache: {},
@@ -37,6 +39,8 @@ export const memory = {
 	item_groups_cache: [],
 	items_last_sync: null,
 	customers_last_sync: null,
+	customers_sync_cursor: null,
+	customers_sync_scope: null,
 	// Track the current cache schema version
 	cache_version: CACHE_VERSION,
 	cache_ready: false,
@@ -235,6 +239,16 @@ export async function clearCustomerStorage() {
         }
 }
 
+export async function removeCustomersFromStorage(names) {
+        try {
+                await checkDbHealth();
+                if (!db.isOpen()) await db.open();
+                await db.table("customers").bulkDelete(names);
+        } catch (e) {
+                console.error("Failed to remove customers from storage", e);
+        }
+}
+
 export function getItemsLastSync() {
 	return memory.items_last_sync || null;
 }
@@ -253,6 +267,17 @@ export function setCustomersLastSync(ts) {
 	persist("customers_last_sync", memory.customers_last_sync);
 }
 
+export function getCustomersSyncCursor() {
+	return { cursor: memory.customers_sync_cursor || null, scope: memory.customers_sync_scope || null };
+}
+
+export function setCustomersSyncCursor(cursor, scope) {
+	memory.customers_sync_cursor = cursor;
+	memory.customers_sync_scope = scope;
+	persist("customers_sync_cursor", memory.customers_sync_cursor);
+	persist("customers_sync_scope", memory.customers_sync_scope);
+}
+
 export function getSalesPersonsStorage() {
 	return memory.sales_persons_storage || [];
 }
@@ -322,6 +347,35 @@ export function setOpeningDialogStorage(data) {
 	}
 }
 
+export function getBootstrapStorage() {
+	return memory.pos_bootstrap || null;
+}
+
+// Merge a get_pos_bootstrap response into the stored sections and return them
+export function mergeBootstrapStorage(response) {
+	const stored = memory.pos_bootstrap || { etag: null, hashes: {}, sections: {} };
+	if (!response || !response.changed) {
+		return stored;
+	}
+	const merged = {
+		etag: response.etag,
+		hashes: response.hashes || {},
+		sections: {},
+	};
+	// Keep only sections the server still lists, taking changed ones from the response
+	Object.keys(merged.hashes).forEach((section) => {
+		merged.sections[section] =
+			section in (response.sections || {}) ? response.sections[section] : stored.sections[section];
+	});
+	try {
+		memory.pos_bootstrap = JSON.parse(JSON.stringify(merged));
+		persist("pos_bootstrap", memory.pos_bootstrap);
+	} catch (e) {
+		console.error("Failed to cache bootstrap", e);
+	}
+	return merged;
+}
+
 export function getTaxTemplate(name) {
 	try {
 		const cache = memory.tax_template_cache || {};
@@ -499,8 +553,11 @@ export async function clearAllCache() {
 	memory.customer_storage = [];
 	memory.items_last_sync = null;
 	memory.customers_last_sync = null;
+	memory.customers_sync_cursor = null;
+	memory.customers_sync_scope = null;
 	memory.pos_opening_storage = null;
 	memory.opening_dialog_storage = null;
+	memory.pos_bootstrap = null;
 	memory.sales_persons_storage = [];
 	memory.item_details_cache = {};
 	memory.tax_template_cache = {};
@@ -538,8 +595,11 @@ export async function forceClearAllCache() {
 	memory.customer_storage = [];
 	memory.items_last_sync = null;
 	memory.customers_last_sync = null;
+	memory.customers_sync_cursor = null;
+	memory.customers_sync_scope = null;
 	memory.pos_opening_storage = null;
 	memory.opening_dialog_storage = null;
+	memory.pos_bootstrap = null;
 	memory.sales_persons_storage = [];
 	memory.item_details_cache = {};
 	memory.tax_template_cache = {};
@@ -23,10 +23,13 @@ export {
         setCustomerStorage,
         getCustomerStorageCount,
         clearCustomerStorage,
+        removeCustomersFromStorage,
         getItemsLastSync,
         setItemsLastSync,
         getCustomersLastSync,
 	setCustomersLastSync,
+	getCustomersSyncCursor,
+	setCustomersSyncCursor,
 	getSalesPersonsStorage,
 	setSalesPersonsStorage,
 	getOpeningStorage,
@@ -34,6 +37,8 @@ export {
 	clearOpeningStorage,
         getOpeningDialogStorage,
         setOpeningDialogStorage,
+        getBootstrapStorage,
+        mergeBootstrapStorage,
         getTaxTemplate,
         setTaxTemplate,
         getPrintTemplate,
@@ -102,6 +107,7 @@ export {
 	getItemUOMs,
 	saveOffers,
 	getCachedOffers,
+	getCachedOffersEtag,
 	savePriceListItems,
 	getCachedPriceListItems,
 	clearPriceListCache,
@@ -127,3 +133,4 @@ export { saveCoupons, getCachedCoupons, clearCoupons } from "./coupons.js";
 
 // Translation cache exports
 export { getTranslationsCache, saveTranslationsCache } from "./cache.js";
+export { loadTranslationBundle } from "./translations.js";
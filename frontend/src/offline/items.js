@@ -30,15 +30,25 @@ export function getItemUOMs(itemCode) {
 	}
 }
 
-export function saveOffers(offers) {
+export function saveOffers(offers, etag = null) {
 	try {
 		memory.offers_cache = offers;
+		memory.offers_etag = etag;
 		persist("offers_cache", memory.offers_cache);
+		persist("offers_etag", memory.offers_etag);
 	} catch (e) {
 		console.error("Failed to cache offers", e);
 	}
 }
 
+export function getCachedOffersEtag() {
+	try {
+		return memory.offers_cache && memory.offers_cache.length ? memory.offers_etag : null;
+	} catch {
+		return null;
+	}
+}
+
 export function getCachedOffers() {
 	try {
 		return memory.offers_cache || [];
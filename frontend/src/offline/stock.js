@@ -1,5 +1,6 @@
 import { memory } from "./cache.js";
 import { persist } from "./core.js";
+import { posProfileArg } from "../utils/pos_profile.js";
 
 // Modify initializeStockCache function to set the flag
 export async function initializeStockCache(items, pos_profile) {
@@ -174,7 +175,7 @@ export async function fetchItemStockQuantities(items, pos_profile, chunkSize = 1
                                 frappe.call({
                                         method: "posawesome.posawesome.api.items.get_items_details",
                                         args: {
-                                                pos_profile: JSON.stringify(pos_profile),
+                                                pos_profile: posProfileArg(pos_profile),
                                                 items_data: JSON.stringify(chunk),
                                         },
                                         freeze: false,
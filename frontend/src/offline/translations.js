@@ -1 +1,37 @@
-export { getTranslationsCache, saveTranslationsCache } from "./cache.js";
+import { getTranslationsCache, saveTranslationsCache } from "./cache.js";
+
+export { getTranslationsCache, saveTranslationsCache };
+
+function applyMessages(messages) {
+	if (messages && window.frappe) {
+		frappe._messages = Object.assign(frappe._messages || {}, messages);
+	}
+}
+
+// Load the compiled translation bundle of a language. The bundle file is
+// immutable, so it is only downloaded when the server reports a new hash;
+// offline the cached copy is used.
+export async function loadTranslationBundle(lang) {
+	if (!lang || lang === "en") return null;
+	const cached = getTranslationsCache(lang);
+	try {
+		const response = await frappe.call({
+			method: "posawesome.posawesome.api.translations.get_translation_bundle",
+			args: { lang },
+		});
+		const bundle = response && response.message;
+		if (!bundle) return cached && cached.messages;
+		if (cached && cached.hash === bundle.hash) {
+			applyMessages(cached.messages);
+			return cached.messages;
+		}
+		const messages = await (await fetch(bundle.url)).json();
+		saveTranslationsCache(lang, { hash: bundle.hash, messages });
+		applyMessages(messages);
+		return messages;
+	} catch (e) {
+		console.error("Failed to load translation bundle", e);
+		if (cached) applyMessages(cached.messages);
+		return cached && cached.messages;
+	}
+}
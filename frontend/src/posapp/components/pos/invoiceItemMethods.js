@@ -11,6 +11,7 @@ import {
 } from "../../../offline/index.js";
 
 // Import composables
+import { posProfileArg } from "../../../utils/pos_profile.js";
 import { useBatchSerial } from "../../composables/useBatchSerial.js";
 import { useDiscounts } from "../../composables/useDiscounts.js";
 import { useItemAddition } from "../../composables/useItemAddition.js";
@@ -1922,7 +1923,7 @@ export default {
 			const response = await frappe.call({
 				method: "posawesome.posawesome.api.items.get_items_details",
 				args: {
-					pos_profile: JSON.stringify(this.pos_profile),
+					pos_profile: posProfileArg(this.pos_profile),
 					items_data: JSON.stringify(items),
 					price_list: this.selected_price_list || this.pos_profile.selling_price_list,
 				},
@@ -2534,12 +2535,17 @@ export default {
 			primary_action(values) {
 				const rate = flt(values.new_rate);
 				frappe.call({
-					method: "posawesome.posawesome.api.items.update_price_list_rate",
+					method: "posawesome.posawesome.api.item_prices.update_price_list_rates",
 					args: {
-						item_code: item.item_code,
-						price_list: vm.get_price_list(),
-						rate: rate,
-						uom: item.uom,
+						pos_profile: vm.pos_profile.name,
+						rows: [
+							{
+								item_code: item.item_code,
+								price_list: vm.get_price_list(),
+								rate: rate,
+								uom: item.uom,
+							},
+						],
 					},
 					callback(r) {
 						if (!r.exc) {
@@ -2551,7 +2557,7 @@ export default {
 							}
 							vm.calc_item_price(item);
 							vm.eventBus.emit("show_message", {
-								title: r.message || __("Item price updated"),
+								title: __("Item price updated"),
 								color: "success",
 							});
 						}
@@ -6,6 +6,7 @@ export function useDatabaseStats(pollInterval = 10000, windowSize = 60) {
     const loading = ref(true);
     const error = ref(null);
     let timer = null;
+    let lastSampledAt = null;
 
     async function fetchDatabaseStats() {
         loading.value = true;
@@ -16,8 +17,12 @@ export function useDatabaseStats(pollInterval = 10000, windowSize = 60) {
             });
             if (res && res.message) {
                 dbStats.value = res.message;
-                history.value.push(res.message);
-                if (history.value.length > windowSize) history.value.shift();
+                // The server returns its last background sample, only new ones are recorded
+                if (res.message.sampled_at && res.message.sampled_at !== lastSampledAt) {
+                    lastSampledAt = res.message.sampled_at;
+                    history.value.push(res.message);
+                    if (history.value.length > windowSize) history.value.shift();
+                }
             } else {
                 error.value = "No data from server";
             }
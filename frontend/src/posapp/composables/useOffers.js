@@ -1,5 +1,5 @@
 import { ref, getCurrentInstance } from "vue";
-import { getCachedOffers, saveOffers } from "../../offline/index.js";
+import { getCachedOffers, getCachedOffersEtag, saveOffers } from "../../offline/index.js";
 
 export function useOffers() {
     const { proxy } = getCurrentInstance();
@@ -15,14 +15,22 @@ export function useOffers() {
             }
         }
         return frappe
-            .call("posawesome.posawesome.api.offers.get_offers", { profile: profileName })
+            .call("posawesome.posawesome.api.offers.get_offers_if_changed", {
+                profile: profileName,
+                etag: getCachedOffersEtag(),
+            })
             .then((r) => {
-                if (r.message) {
+                if (!r.message) {
+                    return;
+                }
+                // Offers are only re-downloaded when the server side set changed
+                const data = r.message.changed ? r.message.offers : getCachedOffers();
+                if (r.message.changed) {
                     console.info("LoadOffers");
-                    saveOffers(r.message);
-                    offers.value = r.message;
-                    eventBus?.emit("set_offers", r.message);
+                    saveOffers(data, r.message.etag);
                 }
+                offers.value = data;
+                eventBus?.emit("set_offers", data);
             })
             .catch((err) => {
                 console.error("Failed to fetch offers:", err);
@@ -6,7 +6,11 @@ import {
     setOpeningStorage,
     clearOpeningStorage,
     setTaxTemplate,
+    getBootstrapStorage,
+    mergeBootstrapStorage,
+    saveOffers,
 } from "../../offline/index.js";
+import { watchPosSettingsVersion } from "../../utils/pos_profile.js";
 
 export function usePosShift(openDialog) {
     const { proxy } = getCurrentInstance();
@@ -14,15 +18,63 @@ export function usePosShift(openDialog) {
 
     const pos_profile = ref(null);
     const pos_opening_shift = ref(null);
+    let refreshingVersion = null;
+
+    // Reload the profile settings once an API reports the terminal's copy as stale
+    async function refresh_pos_settings(version) {
+        const profile = pos_profile.value;
+        if (!profile || !profile.name || version === profile.posa_settings_version) return;
+        if (refreshingVersion === version) return;
+        refreshingVersion = version;
+        try {
+            const r = await frappe.call({
+                method: "posawesome.posawesome.api.utils.get_pos_profile_settings",
+                args: { pos_profile: profile.name, version: profile.posa_settings_version },
+            });
+            if (!r.message || !r.message.changed) return;
+            pos_profile.value = r.message.settings;
+            const data = { ...(getOpeningStorage() || {}), pos_profile: r.message.settings };
+            if (pos_opening_shift.value) {
+                data.pos_opening_shift = pos_opening_shift.value;
+            }
+            setOpeningStorage(data);
+            eventBus?.emit("register_pos_profile", data);
+            console.info("LoadPosProfile (settings changed)");
+        } catch (e) {
+            console.error("Failed to refresh POS Profile settings", e);
+        } finally {
+            refreshingVersion = null;
+        }
+    }
+
+    watchPosSettingsVersion(refresh_pos_settings);
 
     async function check_opening_entry() {
         await initPromise;
         await checkDbHealth();
+        const stored = getBootstrapStorage();
         return frappe
-            .call("posawesome.posawesome.api.shifts.check_opening_shift", {
-                user: frappe.session.user,
+            .call("posawesome.posawesome.api.bootstrap.get_pos_bootstrap", {
+                hashes: stored ? stored.hashes : null,
+                etag: stored ? stored.etag : null,
             })
-            .then((r) => {
+            .then((res) => {
+                // Unchanged sections are not sent again, they come from the stored bootstrap
+                const bootstrap = mergeBootstrapStorage(res.message);
+                const sections = bootstrap.sections;
+                if (res.message && res.message.changed && sections.offers) {
+                    saveOffers(sections.offers, bootstrap.hashes.offers);
+                }
+                const r = {
+                    message: sections.pos_opening_shift
+                        ? {
+                              pos_profile: sections.pos_profile,
+                              pos_opening_shift: sections.pos_opening_shift,
+                              company: sections.company,
+                              stock_settings: sections.stock_settings,
+                          }
+                        : null,
+                };
                 if (r.message) {
                     pos_profile.value = r.message.pos_profile;
                     pos_opening_shift.value = r.message.pos_opening_shift;
@@ -12,6 +12,7 @@ export function useServerCpu(pollInterval = 10000, windowSize = 60) {
     const loading = ref(true);
     const error = ref(null);
     let timer = null;
+    let lastSampledAt = null;
 
     async function fetchServerCpu() {
         loading.value = true;
@@ -26,6 +27,10 @@ export function useServerCpu(pollInterval = 10000, windowSize = 60) {
                 memoryUsed.value = data.message.memory_used;
                 memoryAvailable.value = data.message.memory_available;
                 const uptime = data.message.uptime;
+                const sampledAt = data.message.sampled_at;
+                // The server returns its last background sample, only new ones are recorded
+                if (!sampledAt || sampledAt === lastSampledAt) return;
+                lastSampledAt = sampledAt;
                 history.value.push({
                     cpu: cpu.value,
                     memory: memory.value,
@@ -10,6 +10,7 @@ export function useServerStats(pollInterval = 10000, windowSize = 60) {
     const loading = ref(true);
     const error = ref(null);
     let timer = null;
+    let lastSampledAt = null;
 
     async function fetchServerStats() {
         loading.value = true;
@@ -25,6 +26,10 @@ export function useServerStats(pollInterval = 10000, windowSize = 60) {
                 memoryUsed.value = res.message.memory_used;
                 memoryAvailable.value = res.message.memory_available;
                 const uptime = res.message.uptime;
+                const sampledAt = res.message.sampled_at;
+                // The server returns its last background sample, only new ones are recorded
+                if (!sampledAt || sampledAt === lastSampledAt) return;
+                lastSampledAt = sampledAt;
                 history.value.push({
                     cpu: cpu.value,
                     memory: memory.value,
@@ -10,6 +10,7 @@ import themePlugin from "./plugins/theme.js";
 import * as components from "vuetify/components";
 import * as directives from "vuetify/directives";
 import Home from "./Home.vue";
+import { loadTranslationBundle } from "../offline/translations.js";
 
 // Expose Dexie globally for libraries that expect a global Dexie instance
 if (typeof window !== "undefined" && !window.Dexie) {
@@ -26,6 +27,7 @@ frappe.PosApp.posapp = class {
 	}
 	make_body() {
 		this.$el = this.$parent.find(".main-section");
+		loadTranslationBundle(frappe.boot.lang);
 		const vuetify = createVuetify({
 			components,
 			directives,
@@ -46,6 +46,33 @@ async function cachePrintTemplateAndTerms(profile) {
         }
 }
 
+// Profile argument of POS API calls: only the name and settings version when
+// the profile is the slim server projection, the server resolves the rest
+export function posProfileArg(profile) {
+        if (profile && profile.name && profile.posa_settings_version) {
+                return JSON.stringify({ name: profile.name, version: profile.posa_settings_version });
+        }
+        return JSON.stringify(profile || {});
+}
+
+let staleVersionHandler = null;
+let staleVersionWatched = false;
+
+// POS APIs add ``pos_settings_version`` to their response when the profile
+// version the terminal sent is stale; ``onStale`` receives the new version
+export function watchPosSettingsVersion(onStale) {
+        staleVersionHandler = onStale;
+        if (staleVersionWatched || typeof $ === "undefined") return;
+        staleVersionWatched = true;
+        // frappe.call goes through jQuery ajax, so every call is seen here
+        $(document).ajaxComplete((event, xhr) => {
+                const version = xhr && xhr.responseJSON && xhr.responseJSON.pos_settings_version;
+                if (version && staleVersionHandler) {
+                        staleVersionHandler(version);
+                }
+        });
+}
+
 export async function ensurePosProfile() {
         const bootProfile = frappe?.boot?.pos_profile;
         if (bootProfile && bootProfile.warehouse && bootProfile.selling_price_list) {
@@ -0,0 +1,6 @@
+"""Performance benchmarks for POS Awesome, run against a local bench site.
+
+``data`` generates a seeded synthetic dataset, ``scenarios`` times the
+catalogue, checkout, payment and closing paths on it and ``suite`` runs
+them and compares the results with ``baseline.json``.
+"""
@@ -0,0 +1,88 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Benchmark multi-order consolidation for a restaurant tab.
+
+Run against a local site (all data is rolled back afterwards)::
+
+	bench --site mysite execute posawesome.benchmarks.consolidation.run \
+		--kwargs "{'order_count': 20, 'items_per_order': 3}"
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import nowdate
+
+
+@contextmanager
+def count_queries():
+	"""Count the SQL statements issued through ``frappe.db.sql`` in the block."""
+	counter = {"queries": 0}
+	original_sql = frappe.db.sql
+
+	def counting_sql(*args, **kwargs):
+		counter["queries"] += 1
+		return original_sql(*args, **kwargs)
+
+	frappe.db.sql = counting_sql
+	try:
+		yield counter
+	finally:
+		frappe.db.sql = original_sql
+
+
+def _make_orders(order_count, items_per_order, company, customer, item_code, warehouse):
+	names = []
+	for _ in range(order_count):
+		order = frappe.get_doc(
+			{
+				"doctype": "Sales Order",
+				"company": company,
+				"customer": customer,
+				"transaction_date": nowdate(),
+				"delivery_date": nowdate(),
+				"items": [
+					{"item_code": item_code, "qty": 1, "rate": 10, "warehouse": warehouse, "delivery_date": nowdate()}
+					for _ in range(items_per_order)
+				],
+			}
+		)
+		order.flags.ignore_permissions = True
+		order.insert()
+		names.append(order.name)
+	return names
+
+
+def run(order_count=20, items_per_order=3, company=None, customer=None, item_code=None, warehouse=None, pos_profile=None):
+	"""Time ``create_invoice_from_multiple_orders`` for a tab of ``order_count`` orders."""
+	from posawesome.posawesome.api.restaurant_orders import create_invoice_from_multiple_orders
+
+	company = company or frappe.defaults.get_defaults().get("company")
+	customer = customer or frappe.db.get_value("Customer", {"disabled": 0}, "name")
+	item_code = item_code or frappe.db.get_value("Item", {"disabled": 0, "is_sales_item": 1, "has_variants": 0}, "name")
+	warehouse = warehouse or frappe.db.get_value("Warehouse", {"company": company, "is_group": 0}, "name")
+
+	try:
+		order_names = _make_orders(int(order_count), int(items_per_order), company, customer, item_code, warehouse)
+
+		with count_queries() as counter:
+			start = time.perf_counter()
+			invoice = create_invoice_from_multiple_orders(order_names, pos_profile)
+			elapsed = time.perf_counter() - start
+
+		result = {
+			"scenario": "create_invoice_from_multiple_orders",
+			"orders": len(order_names),
+			"invoice_items": len(invoice.items),
+			"time_ms": round(elapsed * 1000, 2),
+			"queries": counter["queries"],
+		}
+	finally:
+		frappe.db.rollback()
+
+	print(frappe.as_json(result))
+	return result
@@ -0,0 +1,279 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Synthetic POS data for the benchmark suite.
+
+Everything is created inside the current transaction and named with the
+``POSA-BENCH`` prefix, so the suite can roll it back when it is done. The
+generator is seeded, so the same arguments always give the same catalogue,
+carts and orders.
+"""
+
+from __future__ import annotations
+
+import random
+
+import frappe
+from frappe.utils import flt, get_datetime, nowdate
+
+PREFIX = "POSA-BENCH"
+ORDER_TYPE = f"{PREFIX} Dine In"
+
+# Every n-th generated item is batched or serialized
+BATCH_EVERY = 10
+SERIAL_EVERY = 10
+BATCHES_PER_ITEM = 3
+SERIALS_PER_ITEM = 5
+
+
+def _insert(doc):
+	doc = frappe.get_doc(doc)
+	doc.flags.ignore_permissions = True
+	doc.flags.ignore_mandatory = True
+	doc.insert()
+	return doc
+
+
+def _submit(doc):
+	doc = _insert(doc)
+	doc.submit()
+	return doc
+
+
+def _get_extra_uom(stock_uom):
+	return frappe.db.get_value("UOM", {"name": ["!=", stock_uom], "enabled": 1}, "name")
+
+
+def make_items(rng, count, profile):
+	"""Create ``count`` items with a price, a barcode and a second UOM.
+
+	Every ``BATCH_EVERY``-th item is batched and every ``SERIAL_EVERY``-th
+	(offset by half) is serialized, with a few batches or serial numbers.
+	Only plain items are returned in ``plain`` and used in carts.
+	"""
+	item_group = frappe.db.get_value("Item Group", {"is_group": 0}, "name")
+	stock_uom = "Nos"
+	extra_uom = _get_extra_uom(stock_uom)
+	items = []
+	plain = []
+	for index in range(count):
+		item_code = f"{PREFIX}-ITEM-{index:05d}"
+		has_batch_no = index % BATCH_EVERY == 0
+		has_serial_no = not has_batch_no and index % SERIAL_EVERY == SERIAL_EVERY // 2
+		rate = flt(rng.randint(100, 10000) / 100, 2)
+		item = {
+			"doctype": "Item",
+			"item_code": item_code,
+			"item_name": f"Bench Item {index}",
+			"item_group": item_group,
+			"stock_uom": stock_uom,
+			"is_stock_item": 1,
+			"is_sales_item": 1,
+			"has_batch_no": int(has_batch_no),
+			"has_serial_no": int(has_serial_no),
+			"barcodes": [{"barcode": f"20{index:011d}"}],
+			"uoms": [{"uom": stock_uom, "conversion_factor": 1}],
+		}
+		if extra_uom:
+			item["uoms"].append({"uom": extra_uom, "conversion_factor": 12})
+		_insert(item)
+		_insert(
+			{
+				"doctype": "Item Price",
+				"item_code": item_code,
+				"price_list": profile.selling_price_list,
+				"price_list_rate": rate,
+				"uom": stock_uom,
+			}
+		)
+		if has_batch_no:
+			for batch in range(BATCHES_PER_ITEM):
+				_insert({"doctype": "Batch", "batch_id": f"{item_code}-B{batch}", "item": item_code})
+		if has_serial_no:
+			for serial in range(SERIALS_PER_ITEM):
+				_insert({"doctype": "Serial No", "serial_no": f"{item_code}-S{serial}", "item_code": item_code})
+		items.append(item_code)
+		if not has_batch_no and not has_serial_no:
+			plain.append(frappe._dict(item_code=item_code, rate=rate))
+	return items, plain
+
+
+def receive_stock(items, profile, qty):
+	"""Put ``qty`` of each plain item into the profile's warehouse."""
+	if not items:
+		return None
+	return _submit(
+		{
+			"doctype": "Stock Entry",
+			"stock_entry_type": "Material Receipt",
+			"company": profile.company,
+			"items": [
+				{
+					"item_code": item.item_code,
+					"qty": qty,
+					"t_warehouse": profile.warehouse,
+					"basic_rate": item.rate,
+					"conversion_factor": 1,
+				}
+				for item in items
+			],
+		}
+	)
+
+
+def make_customers(count):
+	customers = []
+	for index in range(count):
+		customer = _insert(
+			{
+				"doctype": "Customer",
+				"customer_name": f"{PREFIX} Customer {index:05d}",
+				"customer_type": "Individual",
+				"mobile_no": f"07{index:08d}",
+			}
+		)
+		customers.append(customer.name)
+	return customers
+
+
+def make_opening_shift(profile):
+	return _submit(
+		{
+			"doctype": "POS Opening Shift",
+			"period_start_date": get_datetime(),
+			"posting_date": nowdate(),
+			"company": profile.company,
+			"pos_profile": profile.name,
+			"user": frappe.session.user,
+			"balance_details": [
+				{"mode_of_payment": payment.mode_of_payment, "amount": 0} for payment in profile.payments
+			],
+		}
+	)
+
+
+def make_cart(rng, plain_items, lines):
+	return [
+		{"item_code": item.item_code, "qty": rng.randint(1, 5), "rate": item.rate}
+		for item in rng.sample(plain_items, min(lines, len(plain_items)))
+	]
+
+
+def make_invoices(rng, count, profile, shift, customers, plain_items, lines, is_pos=True):
+	"""Create and submit ``count`` invoices, paid in full when ``is_pos``."""
+	invoices = []
+	mode_of_payment = profile.payments[0].mode_of_payment if profile.payments else None
+	for _ in range(count):
+		invoice = frappe.get_doc(
+			{
+				"doctype": "Sales Invoice",
+				"company": profile.company,
+				"customer": rng.choice(customers),
+				"pos_profile": profile.name,
+				"posa_pos_opening_shift": shift.name,
+				"is_pos": int(is_pos),
+				"update_stock": int(is_pos),
+				"set_warehouse": profile.warehouse,
+				"selling_price_list": profile.selling_price_list,
+				"items": make_cart(rng, plain_items, lines),
+			}
+		)
+		invoice.flags.ignore_permissions = True
+		invoice.set_missing_values()
+		invoice.calculate_taxes_and_totals()
+		if is_pos and mode_of_payment:
+			invoice.set("payments", [{"mode_of_payment": mode_of_payment, "amount": invoice.rounded_total or invoice.grand_total}])
+		invoice.insert()
+		invoice.submit()
+		invoices.append(invoice.name)
+	return invoices
+
+
+def make_tables(count):
+	tables = []
+	for index in range(count):
+		table = _insert(
+			{
+				"doctype": "Restaurant Table",
+				"table_number": f"{PREFIX}-T{index:03d}",
+				"table_name": f"Bench Table {index}",
+				"capacity": 4,
+				"status": "Available",
+				"enabled": 1,
+			}
+		)
+		tables.append(table.name)
+	return tables
+
+
+def make_restaurant_orders(rng, count, profile, shift, customers, tables, plain_items, lines):
+	if not frappe.db.exists("Restaurant Order Type", ORDER_TYPE):
+		_insert({"doctype": "Restaurant Order Type", "order_type_name": ORDER_TYPE, "requires_table": 1, "enabled": 1})
+
+	orders = []
+	for _ in range(count):
+		order = _insert(
+			{
+				"doctype": "Sales Order",
+				"company": profile.company,
+				"customer": rng.choice(customers),
+				"transaction_date": nowdate(),
+				"delivery_date": nowdate(),
+				"restaurant_order_type": ORDER_TYPE,
+				"table_number": rng.choice(tables) if tables else None,
+				"pos_profile": profile.name,
+				"posa_pos_opening_shift": shift.name,
+				"set_warehouse": profile.warehouse,
+				"items": [dict(line, delivery_date=nowdate()) for line in make_cart(rng, plain_items, lines)],
+			}
+		)
+		orders.append(order.name)
+	return orders
+
+
+def generate(
+	pos_profile,
+	items=200,
+	customers=50,
+	invoices=100,
+	credit_invoices=20,
+	tables=10,
+	orders=30,
+	lines=4,
+	seed=42,
+):
+	"""Create a benchmark dataset for ``pos_profile`` and describe it.
+
+	``invoices`` paid POS invoices go into a new opening shift,
+	``credit_invoices`` unpaid ones are raised for the first customer so
+	the payment scenario has something to allocate.
+	"""
+	rng = random.Random(seed)
+	profile = frappe.get_doc("POS Profile", pos_profile)
+
+	item_codes, plain_items = make_items(rng, int(items), profile)
+	receive_stock(plain_items, profile, qty=10000)
+	customer_names = make_customers(int(customers))
+	shift = make_opening_shift(profile)
+	invoice_names = make_invoices(rng, int(invoices), profile, shift, customer_names, plain_items, int(lines))
+	credit_names = make_invoices(
+		rng, int(credit_invoices), profile, shift, customer_names[:1], plain_items, int(lines), is_pos=False
+	)
+	table_names = make_tables(int(tables))
+	order_names = make_restaurant_orders(
+		rng, int(orders), profile, shift, customer_names, table_names, plain_items, int(lines)
+	)
+
+	return frappe._dict(
+		rng=rng,
+		profile=profile,
+		items=item_codes,
+		plain_items=plain_items,
+		customers=customer_names,
+		shift=shift,
+		invoices=invoice_names,
+		credit_invoices=credit_names,
+		tables=table_names,
+		orders=order_names,
+		lines=int(lines),
+	)
@@ -0,0 +1,165 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Timed POS scenarios run by :mod:`posawesome.benchmarks.suite`.
+
+A scenario takes the generated dataset and returns a callable doing the
+work to time. The callable is run ``repeat`` times; the median wall time,
+the SQL statements of the first run and the peak Python memory of the
+last run are reported.
+"""
+
+from __future__ import annotations
+
+import json
+import statistics
+import time
+import tracemalloc
+
+import frappe
+from frappe.utils import flt
+
+from posawesome.benchmarks.consolidation import count_queries
+
+
+def measure(name, call, repeat=3):
+	"""Run ``call`` ``repeat`` times and return its timing, queries and memory."""
+	repeat = max(int(repeat), 1)
+	times = []
+	queries = None
+	peak_memory = None
+	for run in range(repeat):
+		last = run == repeat - 1
+		if last:
+			tracemalloc.start()
+		with count_queries() as counter:
+			start = time.perf_counter()
+			call()
+			times.append((time.perf_counter() - start) * 1000)
+		if queries is None:
+			queries = counter["queries"]
+		if last:
+			peak_memory = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+
+	return {
+		"scenario": name,
+		"runs": repeat,
+		"time_ms": round(statistics.median(times), 2),
+		"first_ms": round(times[0], 2),
+		"queries": queries,
+		"peak_memory_kb": round(peak_memory / 1024, 1),
+	}
+
+
+def _profile_json(dataset):
+	return frappe.as_json(dataset.profile.as_dict())
+
+
+def get_items(dataset):
+	from posawesome.posawesome.api.items import get_items as _get_items
+
+	pos_profile = _profile_json(dataset)
+	return lambda: _get_items(pos_profile, dataset.profile.selling_price_list)
+
+
+def get_items_details(dataset):
+	from posawesome.posawesome.api.items import get_items_details as _get_items_details
+
+	pos_profile = _profile_json(dataset)
+	items_data = json.dumps([{"item_code": item_code} for item_code in dataset.items])
+	return lambda: _get_items_details(pos_profile, items_data, dataset.profile.selling_price_list)
+
+
+def submit_invoice(dataset):
+	from posawesome.benchmarks.data import make_cart
+	from posawesome.posawesome.api.invoices import submit_invoice as _submit_invoice
+
+	profile = dataset.profile
+	mode_of_payment = profile.payments[0].mode_of_payment if profile.payments else None
+
+	def call():
+		items = make_cart(dataset.rng, dataset.plain_items, dataset.lines)
+		total = sum(flt(item["qty"]) * flt(item["rate"]) for item in items)
+		invoice = {
+			"doctype": "Sales Invoice",
+			"company": profile.company,
+			"customer": dataset.rng.choice(dataset.customers),
+			"pos_profile": profile.name,
+			"posa_pos_opening_shift": dataset.shift.name,
+			"is_pos": 1,
+			"update_stock": 1,
+			"set_warehouse": profile.warehouse,
+			"selling_price_list": profile.selling_price_list,
+			"items": items,
+			"payments": [{"mode_of_payment": mode_of_payment, "amount": total}] if mode_of_payment else [],
+		}
+		_submit_invoice(json.dumps(invoice), json.dumps({}))
+
+	return call
+
+
+def get_restaurant_orders(dataset):
+	from posawesome.posawesome.api.restaurant_orders import get_restaurant_orders as _get_restaurant_orders
+
+	return lambda: _get_restaurant_orders(
+		pos_opening_shift=dataset.shift.name, pos_profile_name=dataset.profile.name
+	)
+
+
+def process_pos_payment(dataset):
+	from posawesome.posawesome.api.payment_entry import process_pos_payment as _process_pos_payment
+
+	profile = dataset.profile
+	pos_profile = dict(
+		profile.as_dict(),
+		posa_use_pos_awesome_payments=1,
+		posa_allow_make_new_payments=1,
+		posa_allow_reconcile_payments=0,
+		posa_allow_mpesa_reconcile_payments=0,
+	)
+	customer = dataset.customers[0]
+	mode_of_payment = profile.payments[0].mode_of_payment if profile.payments else None
+
+	def call():
+		invoices = frappe.get_all(
+			"Sales Invoice",
+			filters={"name": ["in", dataset.credit_invoices], "outstanding_amount": [">", 0]},
+			fields=["name as voucher_no", "outstanding_amount"],
+		)
+		# Pay half of what is open, so every repeat still has invoices to allocate
+		amount = flt(sum(flt(invoice.outstanding_amount) for invoice in invoices) / 2, 2)
+		payload = {
+			"customer": customer,
+			"company": profile.company,
+			"currency": profile.currency,
+			"pos_profile": pos_profile,
+			"pos_profile_name": profile.name,
+			"pos_opening_shift_name": dataset.shift.name,
+			"selected_invoices": invoices,
+			"payment_methods": [{"mode_of_payment": mode_of_payment, "amount": amount}],
+			"total_payment_methods": amount,
+		}
+		_process_pos_payment(frappe.as_json(payload))
+
+	return call
+
+
+def make_closing_shift_from_opening(dataset):
+	from posawesome.posawesome.doctype.pos_closing_shift.pos_closing_shift import (
+		make_closing_shift_from_opening as _make_closing_shift_from_opening,
+	)
+
+	opening_shift = frappe.as_json(dataset.shift.as_dict())
+	return lambda: _make_closing_shift_from_opening(opening_shift)
+
+
+# Run order matters: checkout adds invoices the closing shift then covers
+SCENARIOS = {
+	"get_items": get_items,
+	"get_items_details": get_items_details,
+	"get_restaurant_orders": get_restaurant_orders,
+	"submit_invoice": submit_invoice,
+	"process_pos_payment": process_pos_payment,
+	"make_closing_shift_from_opening": make_closing_shift_from_opening,
+}
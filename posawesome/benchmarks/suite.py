@@ -0,0 +1,162 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Run the POS benchmark suite and compare it with the stored baseline.
+
+Run against a local site (all data is rolled back afterwards)::
+
+	bench --site mysite execute posawesome.benchmarks.suite.run \
+		--kwargs "{'pos_profile': 'Main POS', 'items': 500, 'invoices': 200}"
+
+Pass ``update_baseline=1`` to store the results as the new baseline in
+``posawesome/benchmarks/baseline.json``. A scenario regresses when its
+median time exceeds the baseline by more than ``tolerance`` or when it
+runs more queries than the baseline; ``fail_on_regression=1`` then raises
+so CI jobs fail.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+
+import frappe
+from frappe import _
+from frappe.utils import flt, now
+
+from posawesome.benchmarks import data
+from posawesome.benchmarks.scenarios import SCENARIOS, measure
+
+DEFAULT_TOLERANCE = 0.25
+
+
+def get_baseline_path():
+	return frappe.get_app_path("posawesome", "benchmarks", "baseline.json")
+
+
+def load_baseline(path=None):
+	path = path or get_baseline_path()
+	if not os.path.exists(path):
+		return {}
+	with open(path) as f:
+		return json.load(f)
+
+
+def save_results(results, path):
+	with open(path, "w") as f:
+		json.dump(results, f, indent=1, sort_keys=True)
+		f.write("\n")
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+	"""Return the scenarios of ``results`` that regressed against ``baseline``.
+
+	Baselines are only comparable for the same dataset sizes, a mismatch is
+	reported as a single ``dataset`` entry.
+	"""
+	if not baseline:
+		return []
+	if baseline.get("dataset") != results["dataset"]:
+		return [{"scenario": "dataset", "reason": _("Dataset differs from the baseline, results not compared")}]
+
+	previous = {row["scenario"]: row for row in baseline.get("scenarios", [])}
+	regressions = []
+	for row in results["scenarios"]:
+		base = previous.get(row["scenario"])
+		if not base or "error" in row or "error" in base:
+			continue
+		if row["time_ms"] > base["time_ms"] * (1 + flt(tolerance)):
+			regressions.append(
+				{"scenario": row["scenario"], "metric": "time_ms", "baseline": base["time_ms"], "current": row["time_ms"]}
+			)
+		if row["queries"] > base["queries"]:
+			regressions.append(
+				{"scenario": row["scenario"], "metric": "queries", "baseline": base["queries"], "current": row["queries"]}
+			)
+	return regressions
+
+
+def run(
+	pos_profile,
+	scenarios=None,
+	repeat=3,
+	items=200,
+	customers=50,
+	invoices=100,
+	credit_invoices=20,
+	tables=10,
+	orders=30,
+	lines=4,
+	seed=42,
+	output=None,
+	baseline=None,
+	update_baseline=0,
+	tolerance=DEFAULT_TOLERANCE,
+	fail_on_regression=0,
+):
+	"""Generate a dataset, time the scenarios and compare them with the baseline."""
+	names = scenarios or list(SCENARIOS)
+	if isinstance(names, str):
+		names = [name.strip() for name in names.split(",") if name.strip()]
+	unknown = [name for name in names if name not in SCENARIOS]
+	if unknown:
+		frappe.throw(_("Unknown benchmark scenarios: {0}").format(", ".join(unknown)))
+
+	dataset_args = {
+		"items": int(items),
+		"customers": int(customers),
+		"invoices": int(invoices),
+		"credit_invoices": int(credit_invoices),
+		"tables": int(tables),
+		"orders": int(orders),
+		"lines": int(lines),
+		"seed": int(seed),
+	}
+
+	# Scenarios commit in places, which would leave benchmark data behind
+	original_commit = frappe.db.commit
+	frappe.db.commit = lambda *args, **kwargs: None
+	try:
+		dataset = data.generate(pos_profile, **dataset_args)
+		rows = []
+		for name in names:
+			frappe.db.savepoint("posa_benchmark")
+			try:
+				rows.append(measure(name, SCENARIOS[name](dataset), repeat=repeat))
+			except Exception as e:
+				# A failed scenario leaves the data as it was for the next ones
+				frappe.db.rollback(save_point="posa_benchmark")
+				frappe.log_error(frappe.get_traceback(), f"POS benchmark {name}")
+				rows.append({"scenario": name, "error": str(e)})
+	finally:
+		frappe.db.commit = original_commit
+		frappe.db.rollback()
+
+	results = {
+		"dataset": dataset_args,
+		"repeat": int(repeat),
+		"recorded_at": now(),
+		"python": platform.python_version(),
+		"frappe": frappe.__version__,
+		"scenarios": rows,
+	}
+
+	if int(update_baseline):
+		save_results(results, baseline or get_baseline_path())
+		results["regressions"] = []
+	else:
+		results["regressions"] = compare(results, load_baseline(baseline), tolerance)
+
+	if output:
+		save_results(results, output)
+	print(frappe.as_json(results))
+
+	if int(fail_on_regression) and results["regressions"]:
+		frappe.throw(
+			_("Benchmark regressions: {0}").format(
+				", ".join(f"{row['scenario']} ({row.get('metric', row.get('reason'))})" for row in results["regressions"])
+			),
+			title=_("POS Benchmark"),
+		)
+	return results
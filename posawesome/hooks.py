@@ -70,9 +70,13 @@ doctype_js = {
 # ------------
 
 # before_install = "posawesome.install.before_install"
-# after_install = "posawesome.install.after_install"
+after_install = "posawesome.posawesome.api.customers.ensure_customer_search_indexes"
 # before_uninstall = "posawesome.uninstall.before_uninstall"
 after_uninstall = "posawesome.uninstall.after_uninstall"
+after_migrate = [
+    "posawesome.posawesome.api.translations.build_translation_bundles",
+    "posawesome.posawesome.api.customers.ensure_customer_search_indexes",
+]
 
 # Desk Notifications
 # ------------------
@@ -101,16 +105,91 @@ doc_events = {
         "validate": "posawesome.posawesome.api.invoice.validate",
         "before_submit": "posawesome.posawesome.api.invoice.before_submit",
         "before_cancel": "posawesome.posawesome.api.invoice.before_cancel",
+        "on_cancel": "posawesome.posawesome.api.loyalty.update_balance_for_invoice",
     },
     "Customer": {
         "validate": "posawesome.posawesome.api.customer.validate",
         "after_insert": "posawesome.posawesome.api.customer.after_insert",
     },
+    "Customer Group": {
+        "on_update": "posawesome.posawesome.api.customers.clear_customer_group_scope",
+        "on_trash": "posawesome.posawesome.api.customers.clear_customer_group_scope",
+        "after_rename": "posawesome.posawesome.api.customers.clear_customer_group_scope",
+    },
+    "Delivery Charges": {
+        "on_update": "posawesome.posawesome.doctype.delivery_charges.delivery_charges.clear_delivery_charges_cache",
+        "on_trash": "posawesome.posawesome.doctype.delivery_charges.delivery_charges.clear_delivery_charges_cache",
+        "after_rename": "posawesome.posawesome.doctype.delivery_charges.delivery_charges.clear_delivery_charges_cache",
+    },
+    "Address": {
+        "on_update": "posawesome.posawesome.doctype.delivery_charges.delivery_charges.clear_delivery_charges_cache",
+        "on_trash": "posawesome.posawesome.doctype.delivery_charges.delivery_charges.clear_delivery_charges_cache",
+        "after_rename": "posawesome.posawesome.doctype.delivery_charges.delivery_charges.clear_delivery_charges_cache",
+    },
+    "Translation": {
+        "on_update": "posawesome.posawesome.api.translations.clear_translation_bundle",
+        "on_trash": "posawesome.posawesome.api.translations.clear_translation_bundle",
+    },
+    "Loyalty Point Entry": {
+        "after_insert": "posawesome.posawesome.api.loyalty.update_balance_for_entry",
+        "after_delete": "posawesome.posawesome.api.loyalty.update_balance_for_entry",
+    },
+    "POS Offer": {
+        "on_update": "posawesome.posawesome.api.offers.clear_offers_cache",
+        "on_trash": "posawesome.posawesome.api.offers.clear_offers_cache",
+        "after_rename": "posawesome.posawesome.api.offers.clear_offers_cache",
+    },
+    "POS Profile": {
+        "on_update": [
+            "posawesome.posawesome.api.offers.clear_offers_cache",
+            "posawesome.posawesome.api.utils.clear_item_groups_cache",
+            "posawesome.posawesome.api.utils.clear_pos_settings_cache",
+        ],
+        "on_trash": [
+            "posawesome.posawesome.api.utils.clear_item_groups_cache",
+            "posawesome.posawesome.api.utils.clear_pos_settings_cache",
+        ],
+        "after_rename": "posawesome.posawesome.api.utils.clear_pos_settings_cache",
+    },
+    "Item": {
+        "on_update": "posawesome.posawesome.api.variant_matrix.refresh_variant_matrix",
+        "on_trash": "posawesome.posawesome.api.variant_matrix.refresh_variant_matrix",
+        "after_rename": "posawesome.posawesome.api.variant_matrix.refresh_variant_matrix",
+    },
+    "Item Price": {
+        "on_update": "posawesome.posawesome.api.utils.bump_price_version",
+        "on_trash": "posawesome.posawesome.api.utils.bump_price_version",
+    },
+    "Item Attribute": {
+        "on_update": "posawesome.posawesome.api.variant_matrix.clear_variant_matrices",
+        "on_trash": "posawesome.posawesome.api.variant_matrix.clear_variant_matrices",
+        "after_rename": "posawesome.posawesome.api.variant_matrix.clear_variant_matrices",
+    },
+    "Item Group": {
+        "on_update": "posawesome.posawesome.api.utils.clear_item_groups_cache",
+        "on_trash": "posawesome.posawesome.api.utils.clear_item_groups_cache",
+        "after_rename": "posawesome.posawesome.api.utils.clear_item_groups_cache",
+    },
 }
 
+# Request Events
+# --------------
+# Adds response sizes to the POS endpoint performance stats
+
+after_request = ["posawesome.posawesome.api.perf.record_response_size"]
+
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+    "all": [
+        "posawesome.posawesome.api.m_pesa.enqueue_c2b_ingest",
+    ],
+    "daily_long": [
+        "posawesome.posawesome.api.order_archive.archive_fully_billed_orders",
+    ],
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"posawesome.tasks.all"
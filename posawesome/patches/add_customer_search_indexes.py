@@ -0,0 +1,5 @@
+from posawesome.posawesome.api.customers import ensure_customer_search_indexes
+
+
+def execute():
+    ensure_customer_search_indexes()
@@ -0,0 +1,27 @@
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+def execute():
+	"""Add KOT Sequence field to Sales Order"""
+	
+	custom_fields = {
+		"Sales Order": [
+			{
+				"fieldname": "posa_kot_sequence",
+				"label": "KOT Sequence",
+				"fieldtype": "Int",
+				"default": "0",
+				"insert_after": "expected_preparation_time",
+				"depends_on": "eval:doc.restaurant_order_type",
+				"read_only": 1,
+				"no_copy": 1,
+				"allow_on_submit": 1,
+				"print_hide": 1,
+				"description": "Number of Kitchen Order Tickets (KOT) sent to the kitchen for this order"
+			}
+		]
+	}
+	
+	create_custom_fields(custom_fields, update=True)
+	
+	print("KOT Sequence field added to Sales Order successfully")
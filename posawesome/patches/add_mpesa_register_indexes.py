@@ -0,0 +1,52 @@
+import frappe
+
+from posawesome.posawesome.api.m_pesa import normalize_msisdn
+
+
+def execute():
+    frappe.reload_doc("posawesome", "doctype", "mpesa_payment_register")
+
+    registers = frappe.get_all(
+        "Mpesa Payment Register",
+        filters={"phone_key": ["is", "not set"], "msisdn": ["is", "set"]},
+        fields=["name", "msisdn"],
+    )
+    for register in registers:
+        frappe.db.set_value(
+            "Mpesa Payment Register",
+            register.name,
+            "phone_key",
+            normalize_msisdn(register.msisdn),
+            update_modified=False,
+        )
+
+    indexes = [
+        (["company", "docstatus", "phone_key"], "company_docstatus_phone_key"),
+        (["company", "docstatus", "full_name"], "company_docstatus_full_name"),
+    ]
+    for fields, index_name in indexes:
+        try:
+            frappe.db.add_index("Mpesa Payment Register", fields, index_name=index_name)
+        except Exception as e:
+            frappe.log_error(str(e), "Add M-Pesa register indexes")
+
+    duplicates = frappe.db.sql(
+        """
+        SELECT transid
+        FROM `tabMpesa Payment Register`
+        WHERE IFNULL(transid, '') != ''
+        GROUP BY transid
+        HAVING COUNT(*) > 1
+        LIMIT 1
+        """
+    )
+    if duplicates:
+        frappe.log_error(
+            "Duplicate transactions exist, the unique transid index was not added",
+            "Add M-Pesa register indexes",
+        )
+        return
+    try:
+        frappe.db.add_unique("Mpesa Payment Register", ["transid"], constraint_name="unique_transid")
+    except Exception as e:
+        frappe.log_error(str(e), "Add M-Pesa register indexes")
@@ -0,0 +1,22 @@
+import frappe
+
+
+def execute():
+    indexes = [
+        (
+            "Sales Invoice",
+            ["customer", "company", "docstatus", "outstanding_amount"],
+            "customer_company_docstatus_outstanding",
+        ),
+        (
+            "Payment Entry",
+            ["party_type", "party", "company", "docstatus", "unallocated_amount"],
+            "party_company_docstatus_unallocated",
+        ),
+    ]
+
+    for doctype, fields, index_name in indexes:
+        try:
+            frappe.db.add_index(doctype, fields, index_name=index_name)
+        except Exception as e:
+            frappe.log_error(str(e), "Add receivable indexes")
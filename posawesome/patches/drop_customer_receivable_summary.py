@@ -0,0 +1,6 @@
+import frappe
+
+
+def execute():
+    if frappe.db.exists("DocType", "Customer Receivable Summary"):
+        frappe.delete_doc("DocType", "Customer Receivable Summary", force=True, ignore_missing=True)
@@ -1,14 +1,17 @@
 """Expose API functions for POS Awesome."""
 
+from .bootstrap import get_pos_bootstrap
 from .bundles import get_bundle_components
 from .customers import (
 	create_customer,
 	get_customer_addresses,
+        get_customer_changes,
         get_customer_info,
         get_customer_names,
         get_customers_count,
         get_sales_person_names,
         make_address,
+        search_customers,
         set_customer_info,
 )
 from .invoices import (
@@ -19,25 +22,30 @@ from .invoices import (
 	update_invoice,
 	validate_return_items,
 )
+from .item_prices import update_price_list_rates
 from .items import (
 	get_item_attributes,
 	get_item_detail,
+	get_item_group_tree,
 	get_items,
 	get_items_count,
 	get_items_details,
 	get_items_from_barcode,
 	get_items_groups,
 )
+from .offer_engine import apply_offers
 from .offers import (
 	get_active_gift_coupons,
 	get_applicable_delivery_charges,
 	get_offers,
+	get_offers_if_changed,
 	get_pos_coupon,
 )
 from .payments import (
 	create_payment_request,
 	get_available_credit,
 )
+from .perf import get_pos_perf_stats
 from .sales_orders import (
 	search_orders,
 	submit_sales_order,
@@ -57,4 +65,5 @@ from .utilities import (
 	get_translation_dict,
 	get_version,
 )
-from .utils import get_active_pos_profile, get_default_warehouse
+from .utils import get_active_pos_profile, get_default_warehouse, get_pos_profile_settings
+from .variant_matrix import get_variant_matrix
@@ -0,0 +1,148 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Everything the POS needs at startup in one round trip.
+
+The bootstrap is split into sections (profile, shift, company, offers,
+item groups, translations ...). Every section carries a hash of its
+content and the whole payload an ETag derived from those hashes. A
+terminal sends back the hashes it holds and only receives the sections
+that changed; when the ETag matches nothing but the ETag is returned.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+import frappe
+
+from posawesome.posawesome.api.perf import track_perf
+from posawesome.posawesome.api.utils import POS_COMPANY_FIELDS, get_pos_settings, validate_profile_access
+
+
+def hash_section(data) -> str:
+	return hashlib.sha1(
+		json.dumps(data, sort_keys=True, default=str, separators=(",", ":")).encode()
+	).hexdigest()
+
+
+def make_etag(hashes: dict) -> str:
+	return hashlib.sha1(
+		"\n".join(f"{section}:{hashes[section]}" for section in sorted(hashes)).encode()
+	).hexdigest()
+
+
+def get_open_shift(user: str, pos_profile: str | None = None):
+	filters = {
+		"user": user,
+		"pos_closing_shift": ["in", ["", None]],
+		"docstatus": 1,
+		"status": "Open",
+	}
+	if pos_profile:
+		filters["pos_profile"] = pos_profile
+	shifts = frappe.get_all(
+		"POS Opening Shift",
+		filters=filters,
+		fields=["name", "pos_profile"],
+		order_by="period_start_date desc",
+		limit=1,
+	)
+	return shifts[0] if shifts else None
+
+
+def _parse_hashes(hashes) -> dict:
+	if isinstance(hashes, str):
+		try:
+			hashes = json.loads(hashes)
+		except ValueError:
+			hashes = None
+	return hashes if isinstance(hashes, dict) else {}
+
+
+def get_translations_section():
+	"""Return the bundle of the user's language, ``None`` when it has no translations."""
+	from posawesome.posawesome.api.translations import get_bundle, get_languages, normalize_language
+
+	lang = frappe.local.lang or "en"
+	# Languages like en-GB have no bundle, the POS then shows source strings
+	if normalize_language(lang) not in get_languages():
+		return None
+	return get_bundle(lang)
+
+
+def build_sections(settings, shift) -> dict:
+	"""Return the bootstrap sections of a profile as ``{section: (hash, data)}``."""
+	from posawesome.posawesome.api.customers import get_customers_count
+	from posawesome.posawesome.api.items import get_items_count, get_items_groups
+	from posawesome.posawesome.api.offers import get_active_offer_set
+	from posawesome.posawesome.api.translations import get_languages
+
+	profile_ref = json.dumps({"name": settings.name})
+	offer_set = get_active_offer_set(settings.name)
+
+	data = {
+		"pos_opening_shift": frappe.get_doc("POS Opening Shift", shift.name).as_dict() if shift else None,
+		"company": frappe.db.get_value("Company", settings.company, POS_COMPANY_FIELDS, as_dict=True),
+		"stock_settings": {
+			"allow_negative_stock": frappe.db.get_single_value("Stock Settings", "allow_negative_stock"),
+		},
+		"item_groups": [row.name for row in get_items_groups()],
+		"counts": {
+			"items": get_items_count(profile_ref),
+			"customers": get_customers_count(profile_ref),
+		},
+		"languages": get_languages(),
+		"translations": get_translations_section(),
+	}
+
+	sections = {section: (hash_section(value), value) for section, value in data.items()}
+	# Profile and offers already carry a content hash, no need to hash them again
+	sections["pos_profile"] = (settings.posa_settings_version, settings)
+	sections["offers"] = (offer_set["etag"], offer_set["offers"])
+	return sections
+
+
+@frappe.whitelist()
+@track_perf
+def get_pos_bootstrap(pos_profile: str | None = None, hashes=None, etag: str | None = None):
+	"""Return the startup payload of the POS.
+
+	``pos_profile`` defaults to the profile of the user's open shift. Pass
+	the ``hashes`` of the sections already held to receive only the changed
+	ones, and the last ``etag`` (or send it as ``If-None-Match``) to get
+	``{"etag", "changed": 0}`` when nothing changed at all.
+	"""
+	shift = get_open_shift(frappe.session.user, pos_profile)
+	pos_profile = pos_profile or (shift and shift.pos_profile)
+	if not pos_profile:
+		# No open shift, the terminal shows the opening dialog
+		return {"etag": None, "changed": 1, "hashes": {}, "sections": {"pos_opening_shift": None}}
+
+	validate_profile_access(pos_profile, has_open_shift=bool(shift))
+	settings = get_pos_settings(pos_profile)
+	if settings.get("posa_language"):
+		frappe.local.lang = settings.posa_language
+
+	sections = build_sections(settings, shift)
+	section_hashes = {section: value[0] for section, value in sections.items()}
+	current_etag = make_etag(section_hashes)
+
+	response_headers = getattr(frappe.local, "response_headers", None)
+	if response_headers is not None:
+		response_headers["ETag"] = f'"{current_etag}"'
+
+	etag = etag or (frappe.get_request_header("If-None-Match") or "").strip('W/"')
+	if etag == current_etag:
+		return {"etag": current_etag, "changed": 0}
+
+	held = _parse_hashes(hashes)
+	return {
+		"etag": current_etag,
+		"changed": 1,
+		"hashes": section_hashes,
+		"sections": {
+			section: value[1] for section, value in sections.items() if held.get(section) != value[0]
+		},
+	}
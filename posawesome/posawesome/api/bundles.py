@@ -2,9 +2,11 @@ import json
 
 import frappe
 from frappe import _
+from posawesome.posawesome.api.perf import track_perf
 
 
 @frappe.whitelist()
+@track_perf
 def get_bundle_components(bundles):
 	"""Return component items for Product Bundles.
 
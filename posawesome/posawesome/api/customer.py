@@ -11,6 +11,7 @@ from posawesome.posawesome.doctype.referral_code.referral_code import (
 )
 
 from . import customers
+from posawesome.posawesome.api.perf import track_perf
 
 
 def after_insert(doc, method):
@@ -56,6 +57,7 @@ def validate_referral_code(doc):
 
 
 @frappe.whitelist()
+@track_perf
 def get_customer_balance(customer):
     if not customer:
         return {"balance": 0, "customer_name": None}
@@ -85,6 +87,7 @@ def get_customer_balance(customer):
 
 
 @frappe.whitelist()
+@track_perf
 def create_customer(*args, **kwargs):
     """Backward compatible wrapper for ``api.customers.create_customer``."""
     return customers.create_customer(*args, **kwargs)
@@ -3,31 +3,69 @@
 # For license information, please see license.txt
 
 from __future__ import unicode_literals
+import hashlib
 import json
+import re
 import frappe
-from frappe.utils import nowdate, flt, cstr, get_datetime
+from frappe.utils import nowdate, flt, cint, cstr, get_datetime
 from frappe import _
-from erpnext.accounts.doctype.loyalty_program.loyalty_program import (
-    get_loyalty_program_details_with_points,
-)
+from posawesome.posawesome.api.loyalty import is_balance_stale, refresh_loyalty_balance
 from frappe.utils.caching import redis_cache
+from posawesome.posawesome.api.perf import track_perf
+from posawesome.posawesome.api.utils import load_pos_profile
+
+# Shorter words are not in the FULLTEXT index (innodb_ft_min_token_size)
+CUSTOMER_FULLTEXT_MIN_LENGTH = 3
+CUSTOMER_FULLTEXT_INDEX = "customer_name_ft"
+CUSTOMER_FULLTEXT_CACHE_KEY = "posa_customer_fulltext_index"
+CUSTOMER_GROUP_SCOPE_KEY = "posa_customer_group_scope"
+CUSTOMER_FEED_FIELDS = [
+    "name",
+    "mobile_no",
+    "email_id",
+    "tax_id",
+    "customer_name",
+    "primary_address",
+]
 
 
 def get_customer_groups(pos_profile):
-    customer_groups = []
-    if pos_profile.get("customer_groups"):
-        # Get items based on the item groups defined in the POS profile
-        for data in pos_profile.get("customer_groups"):
-            customer_groups.extend(
-                [
-                    "%s" % frappe.db.escape(d.get("name"))
-                    for d in get_child_nodes(
-                        "Customer Group", data.get("customer_group")
-                    )
-                ]
-            )
+    """Return the Customer Groups in scope of a POS Profile, subgroups included.
+
+    The scope is resolved with one nested set query per set of root groups
+    and memoized in redis until the Customer Group tree changes.
+    """
+    roots = sorted(
+        {
+            data.get("customer_group")
+            for data in pos_profile.get("customer_groups") or []
+            if data.get("customer_group")
+        }
+    )
+    if not roots:
+        return []
+
+    key = "\n".join(roots)
+    customer_groups = frappe.cache().hget(CUSTOMER_GROUP_SCOPE_KEY, key)
+    if customer_groups is None:
+        customer_groups = frappe.db.sql_list(
+            """
+            SELECT DISTINCT child.name
+            FROM `tabCustomer Group` child
+            INNER JOIN `tabCustomer Group` root
+                ON child.lft >= root.lft AND child.rgt <= root.rgt
+            WHERE root.name IN %(roots)s
+            ORDER BY child.name
+            """,
+            {"roots": tuple(roots)},
+        )
+        frappe.cache().hset(CUSTOMER_GROUP_SCOPE_KEY, key, customer_groups)
+
+    return list(customer_groups)
 
-    return list(set(customer_groups))
+
+def clear_customer_group_scope(doc=None, method=None):
+    frappe.cache().delete_value(CUSTOMER_GROUP_SCOPE_KEY)
 
 
 def get_child_nodes(group_type, root):
@@ -44,16 +82,19 @@ def get_customer_group_condition(pos_profile):
     cond = "disabled = 0"
     customer_groups = get_customer_groups(pos_profile)
     if customer_groups:
-        cond = " customer_group in (%s)" % (", ".join(["%s"] * len(customer_groups)))
+        cond = " customer_group in (%s)" % (
+            ", ".join(frappe.db.escape(group) for group in customer_groups)
+        )
 
-    return cond % tuple(customer_groups)
+    return cond
 
 
 @frappe.whitelist()
+@track_perf
 def get_customer_names(
     pos_profile, limit=None, offset=None, start_after=None, modified_after=None
 ):
-    _pos_profile = json.loads(pos_profile)
+    _pos_profile = load_pos_profile(pos_profile)
     ttl = _pos_profile.get("posa_server_cache_duration")
     if ttl:
         ttl = int(ttl) * 60
@@ -69,7 +110,7 @@ def get_customer_names(
     def _get_customer_names(
         pos_profile, limit=None, offset=None, start_after=None, modified_after=None
     ):
-        pos_profile = json.loads(pos_profile)
+        pos_profile = load_pos_profile(pos_profile)
         filters = {"disabled": 0}
 
         customer_groups = get_customer_groups(pos_profile)
@@ -115,9 +156,251 @@ def get_customer_names(
         )
 
 
+def has_customer_fulltext_index():
+    """Return whether the customer name FULLTEXT index exists, cached."""
+    exists = frappe.cache().get_value(CUSTOMER_FULLTEXT_CACHE_KEY)
+    if exists is None:
+        exists = cint(
+            bool(
+                frappe.db.sql(
+                    "SHOW INDEX FROM `tabCustomer` WHERE Key_name = %s",
+                    (CUSTOMER_FULLTEXT_INDEX,),
+                )
+            )
+        )
+        frappe.cache().set_value(CUSTOMER_FULLTEXT_CACHE_KEY, exists)
+    return bool(exists)
+
+
+def ensure_customer_search_indexes():
+    """Create the customer search indexes when missing.
+
+    Runs after install and after every migrate, since patches are not run
+    on new sites.
+    """
+    for fieldname in ("mobile_no", "tax_id", "customer_name"):
+        frappe.db.add_index("Customer", [fieldname], index_name=fieldname)
+
+    frappe.cache().delete_value(CUSTOMER_FULLTEXT_CACHE_KEY)
+    if not has_customer_fulltext_index():
+        frappe.db.sql_ddl(
+            "ALTER TABLE `tabCustomer` ADD FULLTEXT INDEX {0} (customer_name)".format(
+                CUSTOMER_FULLTEXT_INDEX
+            )
+        )
+        frappe.cache().delete_value(CUSTOMER_FULLTEXT_CACHE_KEY)
+
+
+def _fulltext_query(search_term):
+    """Build a boolean mode FULLTEXT query matching every word as a prefix.
+
+    Returns an empty query when the FULLTEXT index is missing, so callers use
+    their ``LIKE`` branch instead.
+    """
+    if not has_customer_fulltext_index():
+        return ""
+    words = re.sub(r"[^\w\s]", " ", search_term).split()
+    words = [word for word in words if len(word) >= CUSTOMER_FULLTEXT_MIN_LENGTH]
+    return " ".join(f"+{word}*" for word in words)
+
+
+def _prefix(value):
+    return cstr(value).strip().replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def find_customers_by_identity(
+    customer_name=None, customer_id=None, mobile_no=None, tax_id=None, limit=100
+):
+    """Return customer IDs matching any of the given fields.
+
+    ID, mobile number and tax ID match by prefix and the name through the
+    FULLTEXT index, each as its own indexed branch of a UNION.
+    """
+    branches = []
+    values = {"limit": cint(limit)}
+    for fieldname, value in (
+        ("name", customer_id),
+        ("mobile_no", mobile_no),
+        ("tax_id", tax_id),
+    ):
+        if value:
+            branches.append(
+                f"SELECT name FROM `tabCustomer` WHERE `{fieldname}` LIKE %({fieldname})s"
+            )
+            values[fieldname] = _prefix(value)
+
+    if customer_name:
+        values["fulltext"] = _fulltext_query(customer_name)
+        if values["fulltext"]:
+            branches.append(
+                "SELECT name FROM `tabCustomer` WHERE MATCH(customer_name) AGAINST (%(fulltext)s IN BOOLEAN MODE)"
+            )
+        else:
+            branches.append(
+                "SELECT name FROM `tabCustomer` WHERE customer_name LIKE %(customer_name)s"
+            )
+            values["customer_name"] = _prefix(customer_name)
+
+    if not branches:
+        return []
+    return frappe.db.sql_list(
+        "SELECT DISTINCT name FROM ({0}) c LIMIT %(limit)s".format(
+            " UNION ".join(branches)
+        ),
+        values,
+    )
+
+
 @frappe.whitelist()
+@track_perf
+def search_customers(pos_profile, search_term, limit=20, offset=0):
+    """Search the customers of a POS Profile on the server.
+
+    Customer ID, mobile number and tax ID are matched by prefix and the
+    customer name through its FULLTEXT index, so every branch is an index
+    lookup. Exact matches rank first, then prefix matches, then name
+    matches by relevance.
+    """
+    pos_profile = load_pos_profile(pos_profile)
+    search_term = cstr(search_term).strip()
+    if not search_term:
+        return []
+
+    limit = min(cint(limit) or 20, 100)
+    offset = max(cint(offset), 0)
+    values = {
+        "exact": search_term,
+        "prefix": _prefix(search_term),
+        "limit": limit,
+        "offset": offset,
+    }
+
+    branches = [
+        "SELECT name, IF(name = %(exact)s, 100, 60) AS score FROM `tabCustomer` WHERE name LIKE %(prefix)s",
+        "SELECT name, IF(mobile_no = %(exact)s, 100, 50) AS score FROM `tabCustomer` WHERE mobile_no LIKE %(prefix)s",
+        "SELECT name, IF(tax_id = %(exact)s, 100, 50) AS score FROM `tabCustomer` WHERE tax_id LIKE %(prefix)s",
+        "SELECT name, IF(customer_name = %(exact)s, 90, 40) AS score FROM `tabCustomer` WHERE customer_name LIKE %(prefix)s",
+    ]
+    values["fulltext"] = _fulltext_query(search_term)
+    if values["fulltext"]:
+        branches.append(
+            """SELECT name, 10 + LEAST(MATCH(customer_name) AGAINST (%(fulltext)s IN BOOLEAN MODE), 29) AS score
+            FROM `tabCustomer` WHERE MATCH(customer_name) AGAINST (%(fulltext)s IN BOOLEAN MODE)"""
+        )
+
+    conditions = ["c.disabled = 0"]
+    customer_groups = get_customer_groups(pos_profile)
+    if customer_groups:
+        conditions.append("c.customer_group IN %(customer_groups)s")
+        values["customer_groups"] = tuple(customer_groups)
+
+    return frappe.db.sql(
+        """
+        SELECT
+            c.name, c.mobile_no, c.email_id, c.tax_id, c.customer_name,
+            c.primary_address, MAX(m.score) AS score
+        FROM ({branches}) m
+        INNER JOIN `tabCustomer` c ON c.name = m.name
+        WHERE {conditions}
+        GROUP BY c.name
+        ORDER BY score DESC, c.customer_name ASC
+        LIMIT %(limit)s OFFSET %(offset)s
+        """.format(
+            branches=" UNION ALL ".join(branches),
+            conditions=" AND ".join(conditions),
+        ),
+        values=values,
+        as_dict=True,
+    )
+
+
+def _get_scope_hash(customer_groups):
+    return hashlib.sha1("\n".join(sorted(customer_groups)).encode()).hexdigest()[:16]
+
+
+@frappe.whitelist()
+@track_perf
+def get_customer_changes(
+    pos_profile, cursor=None, modified_after=None, scope=None, limit=500
+):
+    """Return a page of the customer change feed of a POS Profile.
+
+    Customers modified after ``cursor`` are returned as ``upserts`` when they
+    are enabled and inside the profile's group scope, and as ``tombstones``
+    when they were disabled, moved out of scope or deleted. ``cursor`` is an
+    opaque token from a previous page; a first sync can start from
+    ``modified_after`` instead. When ``scope`` differs from the profile's
+    current group scope, ``reset`` tells the terminal to reload everything.
+    """
+    pos_profile = load_pos_profile(pos_profile)
+    limit = min(cint(limit) or 500, 5000)
+    customer_groups = get_customer_groups(pos_profile)
+    scope_hash = _get_scope_hash(customer_groups)
+
+    if scope and scope != scope_hash:
+        return {"reset": 1, "scope": scope_hash}
+
+    if cursor:
+        position = frappe._dict(json.loads(cursor))
+    else:
+        start = modified_after and get_datetime(modified_after).isoformat()
+        position = frappe._dict(modified=start or "1900-01-01", name="", deleted=start or "1900-01-01")
+
+    customers = frappe.db.sql(
+        """
+        SELECT {fields}, disabled, customer_group, modified
+        FROM `tabCustomer`
+        WHERE modified > %(modified)s OR (modified = %(modified)s AND name > %(name)s)
+        ORDER BY modified, name
+        LIMIT %(limit)s
+        """.format(fields=", ".join(CUSTOMER_FEED_FIELDS)),
+        {"modified": position.modified, "name": position.name, "limit": limit + 1},
+        as_dict=True,
+    )
+    deleted = frappe.db.sql(
+        """
+        SELECT deleted_name, creation
+        FROM `tabDeleted Document`
+        WHERE deleted_doctype = 'Customer' AND creation > %(deleted)s
+        ORDER BY creation
+        LIMIT %(limit)s
+        """,
+        {"deleted": position.deleted, "limit": limit + 1},
+        as_dict=True,
+    )
+    has_more = len(customers) > limit or len(deleted) > limit
+    customers = customers[:limit]
+    deleted = deleted[:limit]
+
+    in_scope = set(customer_groups)
+    upserts = []
+    tombstones = [row.deleted_name for row in deleted]
+    for customer in customers:
+        if customer.disabled or (in_scope and customer.customer_group not in in_scope):
+            tombstones.append(customer.name)
+        else:
+            upserts.append({field: customer[field] for field in CUSTOMER_FEED_FIELDS})
+
+    if customers:
+        position.modified = str(customers[-1].modified)
+        position.name = customers[-1].name
+    if deleted:
+        position.deleted = str(deleted[-1].creation)
+
+    return {
+        "upserts": upserts,
+        "tombstones": tombstones,
+        "cursor": json.dumps(position),
+        "has_more": has_more,
+        "scope": scope_hash,
+        "reset": 0,
+    }
+
+
+@frappe.whitelist()
+@track_perf
 def get_customers_count(pos_profile):
-    pos_profile = json.loads(pos_profile)
+    pos_profile = load_pos_profile(pos_profile)
     filters = {"disabled": 0}
     customer_groups = get_customer_groups(pos_profile)
     if customer_groups:
@@ -126,76 +409,72 @@ def get_customers_count(pos_profile):
 
 
 @frappe.whitelist()
+@track_perf
 def get_customer_info(customer):
-    customer = frappe.get_doc("Customer", customer)
-
-    res = {"loyalty_points": None, "conversion_factor": None}
-
-    res["email_id"] = customer.email_id
-    res["mobile_no"] = customer.mobile_no
-    res["image"] = customer.image
-    res["loyalty_program"] = customer.loyalty_program
-    res["customer_price_list"] = customer.default_price_list
-    res["customer_group"] = customer.customer_group
-    res["customer_type"] = customer.customer_type
-    res["territory"] = customer.territory
-    res["birthday"] = customer.posa_birthday
-    res["gender"] = customer.gender
-    res["tax_id"] = customer.tax_id
-    res["posa_discount"] = customer.posa_discount
-    res["name"] = customer.name
-    res["customer_name"] = customer.customer_name
-    res["customer_group_price_list"] = frappe.get_value(
-        "Customer Group", customer.customer_group, "default_price_list"
-    )
+    """Return the customer profile shown on the POS in one query.
 
-    if customer.loyalty_program:
-        lp_details = get_loyalty_program_details_with_points(
-            customer.name,
-            customer.loyalty_program,
-            silent=True,
-            include_expired_entry=False,
-        )
-        res["loyalty_points"] = lp_details.get("loyalty_points")
-        res["conversion_factor"] = lp_details.get("conversion_factor")
-
-    addresses = frappe.db.sql(
+    The customer group price list, the loyalty balance projection and the
+    latest shipping address are joined in, so selecting a customer does not
+    load the full document or aggregate the loyalty ledger.
+    """
+    info = frappe.db.sql(
         """
-	SELECT
-	    address.name as address_name,
-	    address.address_line1,
-	    address.address_line2,
-	    address.city,
-	    address.state,
-	    address.country,
-	    address.address_type
-	FROM `tabAddress` address
-	INNER JOIN `tabDynamic Link` link
-	    ON (address.name = link.parent)
-	WHERE
-	    link.link_doctype = 'Customer'
-	    AND link.link_name = %s
-	    AND address.disabled = 0
-	    AND address.address_type = 'Shipping'
-	ORDER BY address.creation DESC
-	LIMIT 1
-	""",
-        (customer.name,),
+        SELECT
+            c.name, c.customer_name, c.email_id, c.mobile_no, c.image,
+            c.loyalty_program, c.default_price_list AS customer_price_list,
+            c.customer_group, c.customer_type, c.territory,
+            c.posa_birthday AS birthday, c.gender, c.tax_id, c.posa_discount,
+            cg.default_price_list AS customer_group_price_list,
+            lp.conversion_factor,
+            lb.loyalty_points, lb.expires_on,
+            address.name AS address_name, address.address_line1,
+            address.address_line2, address.city, address.state, address.country
+        FROM `tabCustomer` c
+        LEFT JOIN `tabCustomer Group` cg ON cg.name = c.customer_group
+        LEFT JOIN `tabLoyalty Program` lp ON lp.name = c.loyalty_program
+        LEFT JOIN `tabCustomer Loyalty Balance` lb
+            ON lb.customer = c.name AND lb.loyalty_program = c.loyalty_program
+        LEFT JOIN `tabAddress` address ON address.name = (
+            SELECT a.name
+            FROM `tabAddress` a
+            INNER JOIN `tabDynamic Link` link ON a.name = link.parent
+            WHERE link.link_doctype = 'Customer'
+                AND link.link_name = c.name
+                AND a.disabled = 0
+                AND a.address_type = 'Shipping'
+            ORDER BY a.creation DESC
+            LIMIT 1
+        )
+        WHERE c.name = %s
+        """,
+        (customer,),
         as_dict=True,
     )
-
-    if addresses:
-        addr = addresses[0]
-        res["address_line1"] = addr.address_line1 or ""
-        res["address_line2"] = addr.address_line2 or ""
-        res["city"] = addr.city or ""
-        res["state"] = addr.state or ""
-        res["country"] = addr.country or ""
+    if not info:
+        frappe.throw(_("Customer {0} not found").format(customer), frappe.DoesNotExistError)
+    res = info[0]
+
+    if res.loyalty_program:
+        if res.loyalty_points is None or is_balance_stale(res.expires_on):
+            balance = refresh_loyalty_balance(res.name, res.loyalty_program)
+            res.loyalty_points = balance.loyalty_points
+    else:
+        res.loyalty_points = None
+        res.conversion_factor = None
+    res.pop("expires_on")
+
+    has_address = res.pop("address_name")
+    for fieldname in ("address_line1", "address_line2", "city", "state", "country"):
+        if has_address:
+            res[fieldname] = res[fieldname] or ""
+        else:
+            res.pop(fieldname)
 
     return res
 
 
 @frappe.whitelist()
+@track_perf
 def create_customer(
     customer_name,
     company,
@@ -215,7 +494,7 @@ def create_customer(
     city=None,
     country=None,
 ):
-    pos_profile = json.loads(pos_profile_doc)
+    pos_profile = load_pos_profile(pos_profile_doc)
 
     # Format birthday to MySQL compatible format (YYYY-MM-DD) if provided
     formatted_birthday = None
@@ -332,6 +611,7 @@ def create_customer(
 
 
 @frappe.whitelist()
+@track_perf
 def set_customer_info(customer, fieldname, value=""):
     if fieldname == "loyalty_program":
         frappe.db.set_value("Customer", customer, "loyalty_program", value)
@@ -371,6 +651,7 @@ def set_customer_info(customer, fieldname, value=""):
 
 
 @frappe.whitelist()
+@track_perf
 def get_customer_addresses(customer):
     return frappe.db.sql(
         """
@@ -398,6 +679,7 @@ def get_customer_addresses(customer):
 
 
 @frappe.whitelist()
+@track_perf
 def make_address(args):
     args = json.loads(args)
     address = frappe.get_doc(
@@ -421,6 +703,7 @@ def make_address(args):
 
 
 @frappe.whitelist()
+@track_perf
 def get_sales_person_names():
     import json
 
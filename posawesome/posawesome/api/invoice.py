@@ -9,6 +9,7 @@ from frappe import _
 from frappe.model.mapper import get_mapped_doc
 from frappe.utils import flt, add_days
 from posawesome.posawesome.doctype.pos_coupon.pos_coupon import update_coupon_code_count
+from posawesome.posawesome.api.offer_engine import validate_invoice_offers
 from posawesome.posawesome.api.utilities import get_company_domain  # Updated import
 from posawesome.posawesome.doctype.delivery_charges.delivery_charges import (
     get_applicable_delivery_charges,
@@ -24,6 +25,7 @@ def validate(doc, method):
 
 
 def before_submit(doc, method):
+    validate_invoice_offers(doc)
     add_loyalty_point(doc)
     create_sales_order(doc)
     update_coupon(doc, "used")
@@ -23,7 +23,9 @@ from posawesome.posawesome.api.utilities import (
     set_batch_nos_for_bundels,
 )  # Updated imports
 
+from .customers import find_customers_by_identity
 from .items import get_stock_availability
+from posawesome.posawesome.api.perf import track_perf
 
 
 def _sanitize_item_name(name: str) -> str:
@@ -266,6 +268,7 @@ def _auto_set_return_batches(invoice_doc):
 
 
 @frappe.whitelist()
+@track_perf
 def validate_cart_items(items, pos_profile=None):
     """Validate cart items for available stock.
 
@@ -316,6 +319,7 @@ def get_latest_rate(from_currency: str, to_currency: str):
 
 
 @frappe.whitelist()
+@track_perf
 def validate_return_items(original_invoice_name, return_items, doctype="Sales Invoice"):
     """
     Ensure that return items do not exceed the quantity from the original invoice.
@@ -357,6 +361,7 @@ def validate_return_items(original_invoice_name, return_items, doctype="Sales In
 
 
 @frappe.whitelist()
+@track_perf
 def update_invoice(data):
     data = json.loads(data)
     
@@ -829,6 +834,7 @@ def update_invoice(data):
 
 
 @frappe.whitelist()
+@track_perf
 def submit_invoice(invoice, data):
     data = json.loads(data)
     invoice = json.loads(invoice)
@@ -1106,6 +1112,7 @@ def submit_in_background_job(kwargs):
 
 
 @frappe.whitelist()
+@track_perf
 def delete_invoice(invoice):
     doctype = "Sales Invoice"
     if frappe.db.exists("POS Invoice", invoice):
@@ -1123,6 +1130,7 @@ def delete_invoice(invoice):
 
 
 @frappe.whitelist()
+@track_perf
 def get_draft_invoices(pos_opening_shift, doctype="Sales Invoice"):
     filters = {
         "posa_pos_opening_shift": pos_opening_shift,
@@ -1145,6 +1153,7 @@ def get_draft_invoices(pos_opening_shift, doctype="Sales Invoice"):
 
 
 @frappe.whitelist()
+@track_perf
 def search_invoices_for_return(
     invoice_name,
     company,
@@ -1225,36 +1234,12 @@ def search_invoices_for_return(
     # If any customer search criteria is provided, find matching customers
     customer_ids = []
     if customer_name or customer_id or mobile_no or tax_id:
-        conditions = []
-        params = {}
-
-        if customer_name:
-            conditions.append("customer_name LIKE %(customer_name)s")
-            params["customer_name"] = f"%{customer_name}%"
-
-        if customer_id:
-            conditions.append("name LIKE %(customer_id)s")
-            params["customer_id"] = f"%{customer_id}%"
-
-        if mobile_no:
-            conditions.append("mobile_no LIKE %(mobile_no)s")
-            params["mobile_no"] = f"%{mobile_no}%"
-
-        if tax_id:
-            conditions.append("tax_id LIKE %(tax_id)s")
-            params["tax_id"] = f"%{tax_id}%"
-
-        # Build the WHERE clause for the query
-        where_clause = " OR ".join(conditions)
-        customer_query = f"""
-        SELECT name
-        FROM `tabCustomer`
-        WHERE {where_clause}
-        LIMIT 100
-    """
-
-        customers = frappe.db.sql(customer_query, params, as_dict=True)
-        customer_ids = [c.name for c in customers]
+        customer_ids = find_customers_by_identity(
+            customer_name=customer_name,
+            customer_id=customer_id,
+            mobile_no=mobile_no,
+            tax_id=tax_id,
+        )
 
         # If we found matching customers, add them to the filter
         if customer_ids:
@@ -1333,6 +1318,7 @@ def search_invoices_for_return(
 
 
 @frappe.whitelist()
+@track_perf
 def create_sales_invoice_from_order(sales_order):
     sales_invoice = make_sales_invoice(sales_order, ignore_permissions=True)
     sales_invoice.save()
@@ -1340,11 +1326,13 @@ def create_sales_invoice_from_order(sales_order):
 
 
 @frappe.whitelist()
+@track_perf
 def delete_sales_invoice(sales_invoice):
     frappe.delete_doc("Sales Invoice", sales_invoice)
 
 
 @frappe.whitelist()
+@track_perf
 def get_sales_invoice_child_table(sales_invoice, sales_invoice_item):
     parent_doc = frappe.get_doc("Sales Invoice", sales_invoice)
     child_doc = frappe.get_doc("Sales Invoice Item", {"parent": parent_doc.name, "name": sales_invoice_item})
@@ -1352,6 +1340,7 @@ def get_sales_invoice_child_table(sales_invoice, sales_invoice_item):
 
 
 @frappe.whitelist()
+@track_perf
 def update_invoice_from_order(data):
     data = json.loads(data)
     invoice_doc = frappe.get_doc("Sales Invoice", data.get("name"))
@@ -1361,6 +1350,7 @@ def update_invoice_from_order(data):
 
 
 @frappe.whitelist()
+@track_perf
 def get_available_currencies():
     """Get list of available currencies from ERPNext"""
     return frappe.get_all(
@@ -1372,6 +1362,7 @@ def get_available_currencies():
 
 
 @frappe.whitelist()
+@track_perf
 def fetch_exchange_rate(
     currency: str, company: str, posting_date: str | None = None
 ):
@@ -1382,6 +1373,7 @@ def fetch_exchange_rate(
 
 
 @frappe.whitelist()
+@track_perf
 def fetch_exchange_rate_pair(
     from_currency: str, to_currency: str, posting_date: str | None = None
 ):
@@ -1391,6 +1383,7 @@ def fetch_exchange_rate_pair(
 
 
 @frappe.whitelist()
+@track_perf
 def get_price_list_currency(price_list: str) -> str:
     """Return the currency of the given Price List."""
     if not price_list:
@@ -1399,6 +1392,7 @@ def get_price_list_currency(price_list: str) -> str:
 
 
 @frappe.whitelist()
+@track_perf
 def debug_so_to_si_query(sales_order_name="SO00013"):
     """Debug function to test our SO to SI query"""
     si_items = frappe.get_all("Sales Invoice Item", 
@@ -1426,6 +1420,7 @@ def debug_so_to_si_query(sales_order_name="SO00013"):
 
 
 @frappe.whitelist()
+@track_perf
 def check_invoice_modification_status(invoice_name):
     """
     Check if an invoice has been modified and return its current state.
@@ -1526,6 +1521,7 @@ def check_invoice_modification_status(invoice_name):
 
 
 @frappe.whitelist()
+@track_perf
 def safe_update_invoice(data):
     """Wrapper for update_invoice that handles SO to SI conversion properly"""
     data = json.loads(data) if isinstance(data, str) else data
@@ -1573,6 +1569,7 @@ def safe_update_invoice(data):
 
 
 @frappe.whitelist()
+@track_perf
 def pay_invoice_safely(invoice_name, payment_data=None):
     """
     Safely handle invoice payment with proper document locking and state management.
@@ -0,0 +1,263 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Bulk maintenance of Item Prices from the POS.
+
+Price rows are upserted with batched SQL in the current transaction:
+existing prices are updated with one ``CASE`` statement per batch and new
+ones bulk inserted. The catalogue price version is bumped once, and a
+``posa_price_update`` realtime event carries the changed prices so
+terminals only refresh those. Large lists run as a background job.
+"""
+
+from __future__ import annotations
+
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import cstr, flt, now, nowdate
+
+from posawesome.posawesome.api.perf import track_perf
+from posawesome.posawesome.api.utils import bump_price_version, get_pos_settings, validate_profile_access
+
+PRICE_UPDATE_EVENT = "posa_price_update"
+PRICE_BATCH_SIZE = 500
+
+# Larger lists are applied by a background job
+SYNC_PRICE_ROWS = 500
+
+ITEM_PRICE_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"docstatus",
+	"item_code",
+	"item_name",
+	"item_description",
+	"brand",
+	"price_list",
+	"uom",
+	"price_list_rate",
+	"currency",
+	"selling",
+	"buying",
+	"valid_from",
+]
+
+
+def parse_price_rows(rows) -> list[dict]:
+	"""Return the rows as ``{item_code, price_list, uom, rate}``, last one per key wins."""
+	if isinstance(rows, str):
+		rows = json.loads(rows)
+	if isinstance(rows, dict):
+		rows = [rows]
+
+	prices = {}
+	for row in rows or []:
+		item_code = cstr(row.get("item_code")).strip()
+		price_list = cstr(row.get("price_list")).strip()
+		if not item_code or not price_list:
+			frappe.throw(_("Item Code and Price List are required"))
+		uom = cstr(row.get("uom")).strip()
+		prices[(item_code, price_list, uom)] = {
+			"item_code": item_code,
+			"price_list": price_list,
+			"uom": uom or None,
+			"rate": flt(row.get("rate", row.get("price_list_rate"))),
+		}
+	return list(prices.values())
+
+
+def validate_price_permission(pos_profile=None):
+	"""Throw unless the user may write Item Prices or use a profile allowing rate changes."""
+	if frappe.has_permission("Item Price", "write"):
+		return
+	if pos_profile:
+		from posawesome.posawesome.api.bootstrap import get_open_shift
+
+		validate_profile_access(
+			pos_profile, has_open_shift=bool(get_open_shift(frappe.session.user, pos_profile))
+		)
+		if get_pos_settings(pos_profile).get("posa_allow_price_list_rate_change"):
+			return
+	frappe.throw(_("You are not allowed to update Item Prices"), frappe.PermissionError)
+
+
+def _get_existing_prices(rows) -> dict:
+	"""Return the general Item Price names keyed by ``(item_code, price_list, uom)``.
+
+	Only prices valid today and not tied to a customer, supplier or batch are
+	matched, so those specific prices are never overwritten.
+	"""
+	existing = {}
+	for row in frappe.db.sql(
+		"""
+		SELECT name, item_code, price_list, IFNULL(uom, '') AS uom
+		FROM `tabItem Price`
+		WHERE item_code IN %(item_codes)s AND price_list IN %(price_lists)s
+			AND IFNULL(customer, '') = '' AND IFNULL(supplier, '') = ''
+			AND IFNULL(batch_no, '') = ''
+			AND (valid_from IS NULL OR valid_from <= %(today)s)
+			AND (valid_upto IS NULL OR valid_upto >= %(today)s)
+		ORDER BY creation
+		""",
+		{
+			"item_codes": tuple({row["item_code"] for row in rows}),
+			"price_lists": tuple({row["price_list"] for row in rows}),
+			"today": nowdate(),
+		},
+		as_dict=1,
+	):
+		existing.setdefault((row.item_code, row.price_list, row.uom), row.name)
+	return existing
+
+
+def _update_prices(updates):
+	"""Set the rates of existing Item Prices, ``updates`` maps names to rates."""
+	names = list(updates)
+	timestamp = now()
+	for start in range(0, len(names), PRICE_BATCH_SIZE):
+		batch = names[start : start + PRICE_BATCH_SIZE]
+		values = {"modified": timestamp, "modified_by": frappe.session.user, "names": tuple(batch)}
+		cases = []
+		for index, name in enumerate(batch):
+			values[f"n{index}"] = name
+			values[f"r{index}"] = updates[name]
+			cases.append(f"WHEN %(n{index})s THEN %(r{index})s")
+		frappe.db.sql(
+			f"""
+			UPDATE `tabItem Price`
+			SET price_list_rate = CASE name {" ".join(cases)} END,
+				modified = %(modified)s, modified_by = %(modified_by)s
+			WHERE name IN %(names)s
+			""",
+			values,
+		)
+
+
+def _insert_prices(rows):
+	"""Bulk insert new Item Prices with the details Item Price would set."""
+	items = {
+		item.name: item
+		for item in frappe.get_all(
+			"Item",
+			filters={"name": ["in", list({row["item_code"] for row in rows})]},
+			fields=["name", "item_name", "description", "brand"],
+		)
+	}
+	price_lists = {
+		price_list.name: price_list
+		for price_list in frappe.get_all(
+			"Price List",
+			filters={"name": ["in", list({row["price_list"] for row in rows})], "enabled": 1},
+			fields=["name", "currency", "selling", "buying"],
+		)
+	}
+
+	missing = sorted(
+		{row["item_code"] for row in rows if row["item_code"] not in items}
+		| {row["price_list"] for row in rows if row["price_list"] not in price_lists}
+	)
+	if missing:
+		frappe.throw(_("Items or enabled Price Lists not found: {0}").format(", ".join(missing)))
+
+	timestamp = now()
+	today = nowdate()
+	user = frappe.session.user
+	values = []
+	for row in rows:
+		item = items[row["item_code"]]
+		price_list = price_lists[row["price_list"]]
+		values.append(
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				0,
+				row["item_code"],
+				item.item_name,
+				item.description,
+				item.brand,
+				row["price_list"],
+				row["uom"],
+				row["rate"],
+				price_list.currency,
+				price_list.selling,
+				price_list.buying,
+				today,
+			)
+		)
+	for start in range(0, len(values), PRICE_BATCH_SIZE):
+		frappe.db.bulk_insert("Item Price", ITEM_PRICE_FIELDS, values[start : start + PRICE_BATCH_SIZE])
+
+
+def apply_price_updates(rows, user=None) -> dict:
+	"""Upsert the price ``rows`` in the current transaction and announce them.
+
+	Runs inline for small lists and as a background job for large ones, in
+	which case ``user`` is notified with the summary.
+	"""
+	rows = parse_price_rows(rows)
+	if not rows:
+		return {"updated": 0, "inserted": 0}
+
+	existing = _get_existing_prices(rows)
+	updates = {}
+	inserts = []
+	for row in rows:
+		name = existing.get((row["item_code"], row["price_list"], row["uom"] or ""))
+		if name:
+			updates[name] = row["rate"]
+		else:
+			inserts.append(row)
+
+	if updates:
+		_update_prices(updates)
+	if inserts:
+		_insert_prices(inserts)
+
+	version = bump_price_version()
+	result = {"updated": len(updates), "inserted": len(inserts), "version": version}
+	frappe.publish_realtime(
+		PRICE_UPDATE_EVENT,
+		{"version": version, "prices": rows},
+		after_commit=True,
+	)
+	if user:
+		frappe.publish_realtime(
+			"msgprint",
+			_("{0} Item Prices updated").format(len(rows)),
+			user=user,
+			after_commit=True,
+		)
+	return result
+
+
+@frappe.whitelist()
+@track_perf
+def update_price_list_rates(rows, pos_profile=None):
+	"""Create or update many Item Prices at once.
+
+	``rows`` is a list of ``{item_code, price_list, uom, rate}``. Up to
+	``SYNC_PRICE_ROWS`` rows are applied right away and their summary
+	returned; longer lists are queued and ``{"queued": 1}`` is returned.
+	Needs write access to Item Price, or a ``pos_profile`` allowing price
+	list rate changes.
+	"""
+	validate_price_permission(pos_profile)
+	rows = parse_price_rows(rows)
+	if len(rows) <= SYNC_PRICE_ROWS:
+		return apply_price_updates(rows)
+
+	frappe.enqueue(
+		"posawesome.posawesome.api.item_prices.apply_price_updates",
+		queue="long",
+		rows=rows,
+		user=frappe.session.user,
+	)
+	return {"queued": 1, "rows": len(rows)}
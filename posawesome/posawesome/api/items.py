@@ -14,7 +14,15 @@ from frappe.utils import cstr, flt, get_datetime, nowdate
 from frappe.utils.background_jobs import enqueue
 from frappe.utils.caching import redis_cache
 
-from .utils import HAS_VARIANTS_EXCLUSION, get_item_groups
+from .utils import (
+	HAS_VARIANTS_EXCLUSION,
+	get_item_groups,
+	get_item_groups_version,
+	get_price_version,
+	load_pos_profile,
+)
+from .variant_matrix import get_matrix
+from posawesome.posawesome.api.perf import track_perf
 
 
 def get_stock_availability(item_code, warehouse):
@@ -43,6 +51,7 @@ def get_stock_availability(item_code, warehouse):
 
 
 @frappe.whitelist()
+@track_perf
 def get_available_qty(items):
 	"""Return available stock quantity for given items.
 
@@ -84,6 +93,7 @@ def get_available_qty(items):
 
 
 @frappe.whitelist()
+@track_perf
 def get_items(
 		pos_profile,
 		price_list=None,
@@ -98,7 +108,7 @@ def get_items(
 		include_image=False,
 		item_groups=None,
 ):
-		_pos_profile = json.loads(pos_profile)
+		_pos_profile = load_pos_profile(pos_profile)
 		use_price_list = _pos_profile.get("posa_use_server_cache")
 		pos_profile_name = _pos_profile.get("name")
 		warehouse = _pos_profile.get("warehouse")
@@ -129,6 +139,7 @@ def get_items(
 				include_description,
 				include_image,
 				item_groups_tuple,
+				_price_version,
 		):
 				return _get_items(
 						pos_profile,
@@ -159,7 +170,7 @@ def get_items(
 				include_image=False,
 				item_groups=None,
 		):
-				pos_profile = json.loads(pos_profile)
+				pos_profile = load_pos_profile(pos_profile)
 
 				use_limit_search = pos_profile.get("posa_use_limit_search")
 				search_serial_no = pos_profile.get("posa_search_serial_no")
@@ -375,6 +386,7 @@ def get_items(
 						include_description,
 						include_image,
 						item_groups_tuple,
+						get_price_version(),
 				)
 		else:
 				return _get_items(
@@ -394,6 +406,7 @@ def get_items(
 
 
 @frappe.whitelist()
+@track_perf
 def get_items_groups():
 	return frappe.db.sql(
 		"""select name from `tabItem Group`
@@ -402,9 +415,89 @@ def get_items_groups():
 	)
 
 
+ITEM_GROUP_TREE_CACHE_KEY = "posa_item_group_tree"
+
+
+def _load_item_group_tree(item_groups):
+	"""Return the Item Groups in scope in tree order with their sellable item counts.
+
+	``item_count`` counts the items of the group itself and ``total_count``
+	those of its whole subtree, both from one nested set join.
+	"""
+	scope = "AND g.name IN %(groups)s" if item_groups else ""
+	rows = frappe.db.sql(
+		f"""
+		SELECT
+			g.name, g.parent_item_group, g.is_group, g.lft, g.rgt,
+			COUNT(CASE WHEN i.item_group = g.name THEN i.name END) AS item_count,
+			COUNT(i.name) AS total_count
+		FROM `tabItem Group` g
+		INNER JOIN `tabItem Group` d ON d.lft >= g.lft AND d.rgt <= g.rgt
+		LEFT JOIN `tabItem` i
+			ON i.item_group = d.name
+			AND i.disabled = 0 AND i.is_sales_item = 1 AND i.is_fixed_asset = 0
+		WHERE 1 = 1 {scope}
+		GROUP BY g.name, g.parent_item_group, g.is_group, g.lft, g.rgt
+		ORDER BY g.lft
+		""",
+		{"groups": tuple(item_groups)},
+		as_dict=1,
+	)
+
+	# Groups whose parent is out of scope become roots of the tree
+	names = {row.name for row in rows}
+	stack = []
+	for row in rows:
+		while stack and stack[-1].rgt < row.lft:
+			stack.pop()
+		row.parent = row.parent_item_group if row.parent_item_group in names else None
+		row.depth = len(stack)
+		stack.append(row)
+	return [
+		{
+			"name": row.name,
+			"parent": row.parent,
+			"depth": row.depth,
+			"is_group": row.is_group,
+			"item_count": row.item_count,
+			"total_count": row.total_count,
+		}
+		for row in rows
+	]
+
+
 @frappe.whitelist()
+@track_perf
+def get_item_group_tree(pos_profile):
+	"""Return the Item Group tree of a POS Profile with sellable item counts.
+
+	Groups are listed in tree order with their ``parent`` and ``depth``, so
+	the POS can render categories before the catalogue is downloaded and
+	then load each group's items page by page through ``get_items``. The
+	tree is cached per profile and item group version for the profile's
+	server cache duration.
+	"""
+	pos_profile = load_pos_profile(pos_profile)
+	profile_name = pos_profile.get("name")
+	ttl = pos_profile.get("posa_server_cache_duration")
+	ttl = int(ttl) * 60 if ttl else 300
+
+	key = f"{ITEM_GROUP_TREE_CACHE_KEY}:{get_item_groups_version()}:{profile_name}"
+	tree = frappe.cache().get_value(key)
+	if tree is None:
+		groups = _load_item_group_tree(get_item_groups(profile_name))
+		tree = {
+			"groups": groups,
+			"total": sum(group["total_count"] for group in groups if not group["parent"]),
+		}
+		frappe.cache().set_value(key, tree, expires_in_sec=ttl)
+	return tree
+
+
+@frappe.whitelist()
+@track_perf
 def get_items_count(pos_profile, item_groups=None):
-		pos_profile = json.loads(pos_profile)
+		pos_profile = load_pos_profile(pos_profile)
 		if isinstance(item_groups, str):
 			try:
 				item_groups = json.loads(item_groups)
@@ -418,9 +511,10 @@ def get_items_count(pos_profile, item_groups=None):
 
 
 @frappe.whitelist()
+@track_perf
 def get_item_variants(pos_profile, parent_item_code, price_list=None, customer=None):
-	"""Return variants of an item along with attribute metadata."""
-	pos_profile = json.loads(pos_profile)
+	"""Return variants of an item along with attribute metadata and matrix."""
+	pos_profile = load_pos_profile(pos_profile)
 	price_list = price_list or pos_profile.get("selling_price_list")
 
 	fields = [
@@ -467,34 +561,21 @@ def get_item_variants(pos_profile, parent_item_code, price_list=None, customer=N
 			item.setdefault("item_barcode", [])
 		result.append(item)
 
-	# --------------------------
-	# Build attributes meta *and* per-item attribute list
-	# --------------------------
-	attr_rows = frappe.get_all(
-		"Item Variant Attribute",
-		filters={"parent": ["in", [d["item_code"] for d in items_data]]},
-		fields=["parent", "attribute", "attribute_value"],
-	)
-
-	from collections import defaultdict
-
-	attributes_meta: dict[str, set] = defaultdict(set)
-	item_attr_map: dict[str, list] = defaultdict(list)
-
-	for row in attr_rows:
-		attributes_meta[row.attribute].add(row.attribute_value)
-		item_attr_map[row.parent].append({"attribute": row.attribute, "attribute_value": row.attribute_value})
-
-	attributes_meta = {k: sorted(v) for k, v in attributes_meta.items()}
-
+	# Attribute values come from the template's precomputed matrix
+	matrix = get_matrix(parent_item_code)
 	for item in result:
-		item["item_attributes"] = item_attr_map.get(item["item_code"], [])
+		item["item_attributes"] = [
+			{"attribute": attribute, "attribute_value": value}
+			for attribute, value in matrix["item_attributes"].get(item["item_code"], {}).items()
+		]
+	attributes_meta = {attribute: values for attribute, values in matrix["values"].items() if values}
 
 	# Ensure attributes_meta is always a dictionary
-	return {"variants": result, "attributes_meta": attributes_meta or {}}
+	return {"variants": result, "attributes_meta": attributes_meta or {}, "matrix": matrix}
 
 
 @frappe.whitelist()
+@track_perf
 def get_items_details(pos_profile, items_data, price_list=None, customer=None):
 	"""Bulk fetch item details for a list of items.
 
@@ -505,7 +586,7 @@ def get_items_details(pos_profile, items_data, price_list=None, customer=None):
 	for offline selection without additional round trips per item.
 	"""
 
-	pos_profile = json.loads(pos_profile)
+	pos_profile = load_pos_profile(pos_profile)
 	items_data = json.loads(items_data)
 
 	warehouse = pos_profile.get("warehouse")
@@ -520,7 +601,7 @@ def get_items_details(pos_profile, items_data, price_list=None, customer=None):
 		return tuple(sorted(data))
 
 	@redis_cache(ttl=ttl or 300)
-	def _get_item_prices(price_list, currency, item_codes, customer):
+	def _get_item_prices(price_list, currency, item_codes, customer, _price_version):
 		if not item_codes:
 			return []
 		today = nowdate()
@@ -706,7 +787,7 @@ def get_items_details(pos_profile, items_data, price_list=None, customer=None):
 	item_codes = [d.get("item_code") for d in items_data if d.get("item_code") and not d.get("has_variants")]
 	item_codes_tuple = _to_tuple(item_codes)
 
-	price_rows = _get_item_prices(price_list, price_list_currency, item_codes_tuple, customer)
+	price_rows = _get_item_prices(price_list, price_list_currency, item_codes_tuple, customer, get_price_version())
 	stock_rows = _get_bin_qty(warehouse, item_codes_tuple)
 	meta_rows = _get_item_meta(item_codes_tuple)
 	uom_rows = _get_uoms(item_codes_tuple)
@@ -794,6 +875,7 @@ def get_items_details(pos_profile, items_data, price_list=None, customer=None):
 
 
 @frappe.whitelist()
+@track_perf
 def get_item_detail(item, doc=None, warehouse=None, price_list=None, company=None):
 	item = json.loads(item)
 	today = nowdate()
@@ -934,6 +1016,7 @@ def get_item_detail(item, doc=None, warehouse=None, price_list=None, company=Non
 
 
 @frappe.whitelist()
+@track_perf
 def get_items_from_barcode(selling_price_list, currency, barcode):
 	search_item = frappe.db.get_value(
 		"Item Barcode",
@@ -980,6 +1063,7 @@ def get_item_optional_attributes(item_code):
 
 
 @frappe.whitelist()
+@track_perf
 def get_item_attributes(item_code):
 	"""Get item attributes."""
 	return frappe.get_all(
@@ -1002,6 +1086,7 @@ def get_item_attributes(item_code):
 
 
 @frappe.whitelist()
+@track_perf
 def search_serial_or_batch_or_barcode_number(search_value, search_serial_no=None, search_batch_no=None):
 	"""Search for items by serial number, batch number, or barcode."""
 	# Search by barcode
@@ -1046,41 +1131,21 @@ def search_serial_or_batch_or_barcode_number(search_value, search_serial_no=None
 
 
 @frappe.whitelist()
-def update_price_list_rate(item_code, price_list, rate, uom=None):
+@track_perf
+def update_price_list_rate(item_code, price_list, rate, uom=None, pos_profile=None):
 	"""Create or update Item Price for the given item and price list."""
+	from posawesome.posawesome.api.item_prices import apply_price_updates, validate_price_permission
+
+	validate_price_permission(pos_profile)
 	if not item_code or not price_list:
 		frappe.throw(_("Item Code and Price List are required"))
 
-	rate = flt(rate)
-	filters = {"item_code": item_code, "price_list": price_list}
-	if uom:
-		filters["uom"] = uom
-	else:
-		filters["uom"] = ["in", ["", None]]
-
-	name = frappe.db.exists("Item Price", filters)
-	if name:
-		doc = frappe.get_doc("Item Price", name)
-		doc.price_list_rate = rate
-		doc.save(ignore_permissions=True)
-	else:
-		doc = frappe.get_doc(
-			{
-				"doctype": "Item Price",
-				"item_code": item_code,
-				"price_list": price_list,
-				"uom": uom,
-				"price_list_rate": rate,
-				"selling": 1,
-			}
-		)
-		doc.insert(ignore_permissions=True)
-
-	frappe.db.commit()
+	apply_price_updates([{"item_code": item_code, "price_list": price_list, "uom": uom, "rate": rate}])
 	return _("Item Price has been added or updated")
 
 
 @frappe.whitelist()
+@track_perf
 def get_price_for_uom(item_code, price_list, uom):
 	"""Return Item Price for the given item, price list and UOM if it exists."""
 	if not (item_code and price_list and uom):
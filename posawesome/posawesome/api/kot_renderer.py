@@ -0,0 +1,173 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Render Kitchen Order Tickets (KOT) as HTML or raw ESC/POS bytes."""
+
+from __future__ import annotations
+
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+DEFAULT_KOT_WIDTH = "58mm"
+KOT_TEMPLATE = "posawesome/templates/kot/kot_print.html"
+
+# Per paper width styling for the HTML template and character columns for ESC/POS
+KOT_LAYOUTS = {
+	"58mm": {
+		"width": "58mm",
+		"padding": "5px",
+		"print_padding": "2px",
+		"font_size": "10px",
+		"line_height": "1.2",
+		"title_size": "12px",
+		"info_size": "9px",
+		"header_size": "8px",
+		"columns": 32,
+	},
+	"80mm": {
+		"width": "80mm",
+		"padding": "8px",
+		"print_padding": "4px",
+		"font_size": "12px",
+		"line_height": "1.3",
+		"title_size": "14px",
+		"info_size": "11px",
+		"header_size": "10px",
+		"columns": 48,
+	},
+}
+
+# ESC/POS control sequences
+ESC_INIT = b"\x1b@"
+ESC_ALIGN_LEFT = b"\x1ba\x00"
+ESC_ALIGN_CENTER = b"\x1ba\x01"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+ESC_DOUBLE_SIZE = b"\x1d!\x11"
+ESC_NORMAL_SIZE = b"\x1d!\x00"
+ESC_FEED_AND_CUT = b"\x1dVB\x03"
+
+# Compiled templates keyed by print width, built once per process
+_compiled_templates = {}
+
+
+def get_kot_layout(print_width=None):
+	"""Return the layout settings for a print width, defaulting to 58mm."""
+	return KOT_LAYOUTS.get(print_width) or KOT_LAYOUTS[DEFAULT_KOT_WIDTH]
+
+
+def get_kot_print_width(pos_profile=None):
+	"""Return the KOT print width configured on the POS Profile."""
+	if not pos_profile:
+		return DEFAULT_KOT_WIDTH
+	try:
+		width = frappe.get_cached_value("POS Profile", pos_profile, "posa_kot_print_width")
+	except Exception:
+		width = None
+	return width if width in KOT_LAYOUTS else DEFAULT_KOT_WIDTH
+
+
+def get_order_type_name(order_type=None):
+	"""Return the display name of a Restaurant Order Type from the document cache."""
+	if not order_type:
+		return ""
+	try:
+		return frappe.get_cached_value("Restaurant Order Type", order_type, "order_type_name") or order_type
+	except Exception:
+		return order_type
+
+
+def get_kot_template(print_width=None):
+	"""Return the compiled KOT template for a print width.
+
+	The width specific layout is bound as template globals so each width is
+	compiled exactly once per worker and rendering only evaluates the body.
+	"""
+	layout = get_kot_layout(print_width)
+	template = _compiled_templates.get(layout["width"])
+	if template is None:
+		jenv = frappe.get_jenv()
+		source = jenv.loader.get_source(jenv, KOT_TEMPLATE)[0]
+		template = jenv.from_string(source, globals=layout)
+		_compiled_templates[layout["width"]] = template
+	return template
+
+
+def render_kot_html(kot_data):
+	"""Render KOT data (as produced by ``generate_kot_print``) to an HTML document."""
+	kot = frappe._dict(kot_data)
+	return get_kot_template(kot.print_width).render(kot=kot)
+
+
+def _format_qty(qty):
+	qty = flt(qty)
+	return str(int(qty)) if qty.is_integer() else str(qty)
+
+
+def _columns(left, right, width):
+	"""Lay out ``left`` and ``right`` on one line, wrapping long item names."""
+	lines = []
+	left_width = max(width - len(right) - 1, 1)
+	while len(left) > left_width:
+		lines.append(left[:left_width])
+		left = left[left_width:]
+	lines.append(left.ljust(left_width) + " " + right)
+	return "\n".join(lines)
+
+
+def render_kot_escpos(kot_data, encoding="cp437"):
+	"""Render KOT data to an ESC/POS byte stream for raw network printers.
+
+	Characters that the printer code page cannot represent are replaced so a
+	ticket is always produced.
+	"""
+	kot = frappe._dict(kot_data)
+	width = get_kot_layout(kot.print_width)["columns"]
+	separator = "-" * width
+	items = kot.get("voided_items") if kot.is_void else kot.get("items")
+
+	def text(value):
+		return (str(value) + "\n").encode(encoding, errors="replace")
+
+	if kot.is_void:
+		title = _("VOID KOT")
+	elif kot.is_additional:
+		title = _("ADDITIONAL ORDER")
+	else:
+		title = _("KITCHEN ORDER")
+
+	out = bytearray(ESC_INIT)
+	out += ESC_ALIGN_CENTER + ESC_BOLD_ON + ESC_DOUBLE_SIZE
+	out += text(title)
+	out += ESC_NORMAL_SIZE + ESC_BOLD_OFF
+	out += text(kot.kot_number)
+	out += ESC_ALIGN_LEFT
+	out += text(separator)
+	if kot.order_number:
+		out += text(f"{_('Order')}: {kot.order_number}")
+	out += text(f"{_('Type')}: {kot.order_type}")
+	if kot.table_number:
+		out += ESC_BOLD_ON + text(f"{_('Table')}: {kot.table_number}") + ESC_BOLD_OFF
+	out += text(f"{_('Customer')}: {kot.customer_name}")
+	out += text(kot.datetime)
+	out += text(separator)
+
+	for item in items or []:
+		item = frappe._dict(item)
+		qty = _format_qty(item.qty)
+		right = f"{qty} VOID" if kot.is_void else f"{qty} {item.uom or ''}".strip()
+		out += ESC_BOLD_ON + text(_columns(item.item_name or item.item_code or "", right, width)) + ESC_BOLD_OFF
+		if item.special_instructions:
+			out += text(f"  * {item.special_instructions}")
+
+	out += text(separator)
+	total = kot.total_voided_items if kot.is_void else kot.total_items
+	out += text(f"{_('Total Items')}: {total}")
+	if kot.special_notes:
+		out += text(kot.special_notes)
+	if kot.void_reason:
+		out += text(f"{_('Reason')}: {kot.void_reason}")
+	out += ESC_FEED_AND_CUT
+
+	return bytes(out)
@@ -0,0 +1,101 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Maintain the ``Customer Loyalty Balance`` projection.
+
+One row per (customer, loyalty program) holds the unexpired point balance
+as ERPNext computes it in ``get_loyalty_details``. It is refreshed whenever
+Loyalty Point Entries are written or removed, so reading a balance is a
+single indexed lookup instead of an aggregate over the ledger.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+import frappe
+from frappe.utils import cint, flt, getdate, now, today
+
+BALANCE_DOCTYPE = "Customer Loyalty Balance"
+
+
+def get_balance_name(customer, loyalty_program):
+	"""Return the deterministic name of the balance row for a pair."""
+	return hashlib.sha1(f"{customer}\n{loyalty_program}".encode()).hexdigest()[:20]
+
+
+def is_balance_stale(expires_on):
+	"""Return whether points counted in a balance have expired since."""
+	return bool(expires_on) and getdate(expires_on) < getdate(today())
+
+
+def refresh_loyalty_balance(customer, loyalty_program):
+	"""Recompute the balance of a (customer, loyalty program) pair from the ledger."""
+	if not customer or not loyalty_program:
+		return None
+
+	date = today()
+	totals = frappe.db.sql(
+		"""
+		SELECT
+			SUM(loyalty_points) AS loyalty_points,
+			SUM(purchase_amount) AS total_spent,
+			MIN(expiry_date) AS expires_on
+		FROM `tabLoyalty Point Entry`
+		WHERE customer = %(customer)s
+			AND loyalty_program = %(loyalty_program)s
+			AND posting_date <= %(date)s
+			AND expiry_date >= %(date)s
+		""",
+		{"customer": customer, "loyalty_program": loyalty_program, "date": date},
+		as_dict=True,
+	)[0]
+
+	balance = frappe._dict(
+		loyalty_points=cint(totals.loyalty_points),
+		total_spent=flt(totals.total_spent),
+		expires_on=totals.expires_on,
+	)
+	timestamp = now()
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tab{BALANCE_DOCTYPE}`
+			(name, creation, modified, owner, modified_by, docstatus,
+			customer, loyalty_program, loyalty_points, total_spent, expires_on)
+		VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, 0,
+			%(customer)s, %(loyalty_program)s, %(loyalty_points)s, %(total_spent)s, %(expires_on)s)
+		ON DUPLICATE KEY UPDATE
+			loyalty_points = VALUES(loyalty_points),
+			total_spent = VALUES(total_spent),
+			expires_on = VALUES(expires_on),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+		""",
+		{
+			"name": get_balance_name(customer, loyalty_program),
+			"now": timestamp,
+			"user": frappe.session.user,
+			"customer": customer,
+			"loyalty_program": loyalty_program,
+			**balance,
+		},
+	)
+	return balance
+
+
+def update_balance_for_entry(doc, method=None):
+	"""Loyalty Point Entry hook keeping the projection in step with the ledger."""
+	refresh_loyalty_balance(doc.customer, doc.loyalty_program)
+
+
+def update_balance_for_invoice(doc, method=None):
+	"""Sales Invoice cancel hook.
+
+	ERPNext removes the invoice's Loyalty Point Entries with a plain delete,
+	which skips document hooks, so the balance is refreshed from here.
+	"""
+	loyalty_program = doc.get("loyalty_program") or frappe.db.get_value(
+		"Customer", doc.customer, "loyalty_program"
+	)
+	if loyalty_program:
+		refresh_loyalty_balance(doc.customer, loyalty_program)
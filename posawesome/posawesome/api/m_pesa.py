@@ -6,6 +6,8 @@ import frappe, requests
 from frappe import _
 from requests.auth import HTTPBasicAuth
 import json
+from frappe.utils import cint, flt, now, nowdate, nowtime
+from posawesome.posawesome.api.perf import track_perf
 
 
 def get_token(app_key, app_secret, base_url):
@@ -17,41 +19,250 @@ def get_token(app_key, app_secret, base_url):
     return r.json()["access_token"]
 
 
+# Redis list holding raw C2B confirmations until the ingest job writes them
+C2B_QUEUE_KEY = "posa_mpesa_c2b_queue"
+C2B_INGEST_JOB_ID = "posawesome_mpesa_c2b_ingest"
+C2B_INGEST_BATCH_SIZE = 500
+# Only one ingest run drains the queue at a time
+C2B_INGEST_LOCK_KEY = "posa_mpesa_c2b_ingest_lock"
+C2B_INGEST_LOCK_TIMEOUT = 300
+
+# C2B payload key -> Mpesa Payment Register field
+C2B_FIELDS = {
+    "TransactionType": "transactiontype",
+    "TransID": "transid",
+    "TransTime": "transtime",
+    "TransAmount": "transamount",
+    "BusinessShortCode": "businessshortcode",
+    "BillRefNumber": "billrefnumber",
+    "InvoiceNumber": "invoicenumber",
+    "OrgAccountBalance": "orgaccountbalance",
+    "ThirdPartyTransID": "thirdpartytransid",
+    "MSISDN": "msisdn",
+    "FirstName": "firstname",
+    "MiddleName": "middlename",
+    "LastName": "lastname",
+}
+
+REGISTER_FIELDS = [
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "docstatus",
+    "full_name",
+    *C2B_FIELDS.values(),
+    "phone_key",
+    "posting_date",
+    "posting_time",
+    "company",
+    "customer",
+    "mode_of_payment",
+    "currency",
+    "submit_payment",
+]
+
+
+def normalize_msisdn(msisdn):
+    """Return the national part of a Kenyan phone number, e.g. ``712345678``.
+
+    ``254712345678``, ``+254 712 345 678`` and ``0712345678`` all give the
+    same key, which is what registers and customers are matched on.
+    """
+    digits = "".join(ch for ch in str(msisdn or "") if ch.isdigit())
+    if digits.startswith("254") and len(digits) > 9:
+        digits = digits[3:]
+    return digits.lstrip("0")
+
+
+def get_phone_variants(phone_key):
+    """Return the ways a customer's mobile number may be stored for a key."""
+    return [phone_key, "0" + phone_key, "254" + phone_key, "+254" + phone_key]
+
+
+def get_full_name(firstname, middlename, lastname):
+    return " ".join(name for name in (firstname, middlename, lastname) if name)
+
+
 @frappe.whitelist(allow_guest=True)
+@track_perf
 def confirmation(**kwargs):
+    """Queue a C2B confirmation and acknowledge it right away.
+
+    The register is written by :func:`ingest_c2b_queue` in the background,
+    so bursts of callbacks never wait on document inserts.
+    """
+    payload = {key: kwargs.get(key) for key in C2B_FIELDS}
+    if not payload.get("TransID"):
+        return {"ResultCode": 1, "ResultDesc": "Rejected"}
     try:
-        args = frappe._dict(kwargs)
-        doc = frappe.new_doc("Mpesa Payment Register")
-        doc.transactiontype = args.get("TransactionType")
-        doc.transid = args.get("TransID")
-        doc.transtime = args.get("TransTime")
-        doc.transamount = args.get("TransAmount")
-        doc.businessshortcode = args.get("BusinessShortCode")
-        doc.billrefnumber = args.get("BillRefNumber")
-        doc.invoicenumber = args.get("InvoiceNumber")
-        doc.orgaccountbalance = args.get("OrgAccountBalance")
-        doc.thirdpartytransid = args.get("ThirdPartyTransID")
-        doc.msisdn = args.get("MSISDN")
-        doc.firstname = args.get("FirstName")
-        doc.middlename = args.get("MiddleName")
-        doc.lastname = args.get("LastName")
-        doc.insert(ignore_permissions=True)
-        frappe.db.commit()
-        context = {"ResultCode": 0, "ResultDesc": "Accepted"}
-        return dict(context)
+        frappe.cache().rpush(C2B_QUEUE_KEY, json.dumps(payload))
+        enqueue_c2b_ingest()
     except Exception as e:
+        # Without the queue, fall back to writing the register inline
         frappe.log_error(frappe.get_traceback(), str(e)[:140])
-        context = {"ResultCode": 1, "ResultDesc": "Rejected"}
-        return dict(context)
+        try:
+            insert_registers([payload])
+            frappe.db.commit()
+        except Exception as e:
+            frappe.log_error(frappe.get_traceback(), str(e)[:140])
+            return {"ResultCode": 1, "ResultDesc": "Rejected"}
+    return {"ResultCode": 0, "ResultDesc": "Accepted"}
+
+
+def get_register_urls(shortcodes):
+    """Return ``{business_shortcode: (company, mode_of_payment)}``."""
+    urls = {}
+    if not shortcodes:
+        return urls
+    for url in frappe.get_all(
+        "Mpesa C2B Register URL",
+        filters={"business_shortcode": ["in", list(shortcodes)], "register_status": "Success"},
+        fields=["business_shortcode", "company", "mode_of_payment"],
+        order_by="creation asc",
+    ):
+        urls.setdefault(url.business_shortcode, (url.company, url.mode_of_payment))
+    return urls
+
+
+def match_customers(phone_keys):
+    """Return ``{phone_key: customer}`` for keys owned by exactly one customer."""
+    phone_keys = [key for key in set(phone_keys) if len(key) == 9]
+    if not phone_keys:
+        return {}
+    variants = [variant for key in phone_keys for variant in get_phone_variants(key)]
+    owners = {}
+    for customer in frappe.get_all(
+        "Customer",
+        filters={"mobile_no": ["in", variants], "disabled": 0},
+        fields=["name", "mobile_no"],
+    ):
+        owners.setdefault(normalize_msisdn(customer.mobile_no), set()).add(customer.name)
+    return {key: customers.pop() for key, customers in owners.items() if len(customers) == 1}
+
+
+def insert_registers(payloads):
+    """Write C2B payloads as draft Mpesa Payment Registers in one insert.
+
+    Payloads whose ``TransID`` is already registered, or repeated in the
+    batch, are dropped. Returns the number of registers written.
+    """
+    from frappe.model.naming import make_autoname
+
+    payloads = list({payload["TransID"]: payload for payload in payloads if payload.get("TransID")}.values())
+    if not payloads:
+        return 0
+
+    existing = set(
+        frappe.get_all(
+            "Mpesa Payment Register",
+            filters={"transid": ["in", [payload["TransID"] for payload in payloads]]},
+            pluck="transid",
+        )
+    )
+    payloads = [payload for payload in payloads if payload["TransID"] not in existing]
+    if not payloads:
+        return 0
+
+    urls = get_register_urls({payload.get("BusinessShortCode") for payload in payloads})
+    customers = match_customers(normalize_msisdn(payload.get("MSISDN")) for payload in payloads)
+    autoname = frappe.get_meta("Mpesa Payment Register").autoname
+    timestamp = now()
+    user = frappe.session.user
+
+    values = []
+    for payload in payloads:
+        phone_key = normalize_msisdn(payload.get("MSISDN"))
+        company, mode_of_payment = urls.get(payload.get("BusinessShortCode"), (None, None))
+        values.append(
+            (
+                make_autoname(autoname, "Mpesa Payment Register"),
+                timestamp,
+                timestamp,
+                user,
+                user,
+                0,
+                get_full_name(payload.get("FirstName"), payload.get("MiddleName"), payload.get("LastName")),
+                *(
+                    flt(payload.get(key)) if field == "transamount" else payload.get(key)
+                    for key, field in C2B_FIELDS.items()
+                ),
+                phone_key,
+                nowdate(),
+                nowtime(),
+                company,
+                customers.get(phone_key),
+                mode_of_payment,
+                "KES",
+                0,
+            )
+        )
+    # The unique index on transid guards against a concurrent insert
+    frappe.db.bulk_insert("Mpesa Payment Register", REGISTER_FIELDS, values, ignore_duplicates=True)
+    return len(values)
+
+
+def enqueue_c2b_ingest():
+    """Queue the ingest job, at most one is waiting at any time.
+
+    Also run by the scheduler to pick up confirmations left in the queue.
+    """
+    frappe.enqueue(
+        "posawesome.posawesome.api.m_pesa.ingest_c2b_queue",
+        queue="short",
+        job_id=C2B_INGEST_JOB_ID,
+        deduplicate=True,
+    )
+
+
+def ingest_c2b_queue(batch_size=C2B_INGEST_BATCH_SIZE):
+    """Drain the C2B queue into Mpesa Payment Registers in committed batches.
+
+    Runs under a Redis lock so a single consumer reads and trims the queue;
+    a batch is only removed once it is committed and replays after a
+    failure are absorbed by the ``transid`` deduplication. When another run
+    holds the lock this one returns right away, that run drains the queue.
+    """
+    cache = frappe.cache()
+    batch_size = cint(batch_size) or C2B_INGEST_BATCH_SIZE
+    lock = cache.lock(cache.make_key(C2B_INGEST_LOCK_KEY), timeout=C2B_INGEST_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+
+    inserted = 0
+    try:
+        while True:
+            batch = cache.lrange(C2B_QUEUE_KEY, 0, batch_size - 1)
+            if not batch:
+                break
+            payloads = []
+            for raw in batch:
+                try:
+                    payloads.append(json.loads(raw))
+                except ValueError:
+                    frappe.log_error(frappe.safe_decode(raw), "Invalid M-Pesa C2B payload")
+            inserted += insert_registers(payloads)
+            frappe.db.commit()
+            # Callbacks only append, so the committed batch is still the head
+            cache.ltrim(C2B_QUEUE_KEY, len(batch), -1)
+            lock.reacquire()
+            if len(batch) < batch_size:
+                break
+    finally:
+        lock.release()
+    return inserted
 
 
 @frappe.whitelist(allow_guest=True)
+@track_perf
 def validation(**kwargs):
     context = {"ResultCode": 0, "ResultDesc": "Accepted"}
     return dict(context)
 
 
 @frappe.whitelist()
+@track_perf
 def get_mpesa_mode_of_payment(company):
     modes = frappe.get_all(
         "Mpesa C2B Register URL",
@@ -66,6 +277,7 @@ def get_mpesa_mode_of_payment(company):
 
 
 @frappe.whitelist()
+@track_perf
 def get_mpesa_draft_payments(
     company,
     mode_of_payment=None,
@@ -76,10 +288,11 @@ def get_mpesa_draft_payments(
     filters = {"company": company, "docstatus": 0}
     if mode_of_payment:
         filters["mode_of_payment"] = mode_of_payment
-    if mobile_no:
-        filters["msisdn"] = ["like", f"%{mobile_no}%"]
+    if mobile_no and normalize_msisdn(mobile_no):
+        # Indexed prefix match on the normalized number
+        filters["phone_key"] = ["like", f"{normalize_msisdn(mobile_no)}%"]
     if full_name:
-        filters["full_name"] = ["like", f"%{full_name}%"]
+        filters["full_name"] = ["like", f"{full_name}%"]
     if payment_methods_list:
         filters["mode_of_payment"] = ["in", json.loads(payment_methods_list)]
 
@@ -103,6 +316,7 @@ def get_mpesa_draft_payments(
 
 
 @frappe.whitelist()
+@track_perf
 def submit_mpesa_payment(mpesa_payment, customer):
     doc = frappe.get_doc("Mpesa Payment Register", mpesa_payment)
     doc.customer = customer
@@ -0,0 +1,300 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Server side POS Offer evaluation.
+
+Active offers of a POS Profile are compiled once into lookup tables keyed by
+item code, item group and brand, plus a list of transaction offers. A cart is
+then evaluated by walking its lines once and only checking the offers those
+lines hit, instead of testing every offer against every line.
+
+The rules follow the POS frontend (``invoiceOfferMethods.js``): quantities
+use ``stock_qty``, amounts use the original price list rate, lines added by
+an offer are ignored and coupon based offers need a matching coupon.
+"""
+
+from __future__ import annotations
+
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import flt, getdate
+from posawesome.posawesome.api.perf import track_perf
+
+# Offer fields needed to evaluate and apply an offer on the POS
+OFFER_FIELDS = [
+	"name",
+	"title",
+	"description",
+	"apply_on",
+	"item",
+	"item_group",
+	"brand",
+	"offer",
+	"apply_type",
+	"apply_item_code",
+	"apply_item_group",
+	"min_qty",
+	"max_qty",
+	"min_amt",
+	"max_amt",
+	"discount_type",
+	"rate",
+	"discount_amount",
+	"discount_percentage",
+	"given_qty",
+	"loyalty_program",
+	"loyalty_points",
+	"auto",
+	"replace_item",
+	"replace_cheapest_item",
+	"less_then",
+	"coupon_based",
+	"valid_from",
+	"valid_upto",
+	"pos_profile",
+	"warehouse",
+]
+
+# Compiled indexes keyed by POS Profile, as (etag, OfferIndex)
+_compiled_indexes = {}
+
+# apply_on value -> (cart line field, index key)
+LINE_OFFER_KEYS = {
+	"Item Code": ("item_code", "item"),
+	"Item Group": ("item_group", "item_group"),
+	"Brand": ("brand", "brand"),
+}
+
+
+class OfferIndex:
+	"""Active offers of a profile compiled into per key lookup tables."""
+
+	def __init__(self, offers):
+		self.offers = {}
+		self.by_key = {apply_on: {} for apply_on in LINE_OFFER_KEYS}
+		self.transaction = []
+
+		for offer in offers:
+			offer = frappe._dict(offer)
+			self.offers[offer.name] = offer
+			if offer.apply_on == "Transaction":
+				self.transaction.append(offer)
+			elif offer.apply_on in LINE_OFFER_KEYS:
+				key = offer.get(LINE_OFFER_KEYS[offer.apply_on][1])
+				if key:
+					self.by_key[offer.apply_on].setdefault(key, []).append(offer)
+
+	def __len__(self):
+		return len(self.offers)
+
+	def get(self, offer_name):
+		return self.offers.get(offer_name)
+
+	def match_line(self, line):
+		"""Yield the item code, item group and brand offers hit by a cart line."""
+		for apply_on, (line_field, _key) in LINE_OFFER_KEYS.items():
+			value = line.get(line_field)
+			if value:
+				yield from self.by_key[apply_on].get(value, ())
+
+
+def compile_offers(offers):
+	"""Return an :class:`OfferIndex` for a list of POS Offer rows."""
+	return OfferIndex(offers)
+
+
+def get_offer_index(pos_profile):
+	"""Return the compiled index of the offers active for ``pos_profile``.
+
+	The index is kept per worker and rebuilt only when the ETag of the cached
+	active offer set changes.
+	"""
+	from posawesome.posawesome.api.offers import get_active_offer_set
+
+	offer_set = get_active_offer_set(pos_profile)
+	cached = _compiled_indexes.get(pos_profile)
+	if cached and cached[0] == offer_set["etag"]:
+		return cached[1]
+	index = compile_offers(offer_set["offers"])
+	_compiled_indexes[pos_profile] = (offer_set["etag"], index)
+	return index
+
+
+def check_qty_amount(offer, qty, amount):
+	"""Return whether ``qty`` and ``amount`` satisfy the offer's limits."""
+	if qty < flt(offer.min_qty):
+		return False
+	if flt(offer.max_qty) > 0 and qty > flt(offer.max_qty):
+		return False
+	if flt(offer.min_amt) > 0 and amount < flt(offer.min_amt):
+		return False
+	if flt(offer.max_amt) > 0 and amount > flt(offer.max_amt):
+		return False
+	return True
+
+
+def _prepare_lines(items):
+	lines = []
+	for idx, item in enumerate(items or [], 1):
+		item = frappe._dict(item.as_dict() if hasattr(item, "as_dict") else item)
+		if item.posa_is_offer:
+			continue
+		qty = flt(item.stock_qty) or flt(item.qty) * (flt(item.conversion_factor) or 1)
+		rate = flt(item.original_price_list_rate) or flt(item.price_list_rate) or flt(item.rate)
+		item.row_id = item.posa_row_id or item.row_id or str(idx)
+		item.eval_qty = qty
+		item.eval_amount = qty * rate
+		item.eval_rate = rate
+		lines.append(item)
+	return lines
+
+
+def _applied_offer(offer, lines, coupon):
+	applied = frappe._dict(offer)
+	applied.offer_name = offer.name
+	applied.items = [line.row_id for line in lines]
+	applied.coupon = coupon
+	if offer.offer == "Give Product":
+		if offer.apply_on == "Item Code" and offer.apply_type == "Item Code" and offer.replace_item:
+			applied.give_item = applied.apply_item_code = offer.item
+		elif offer.apply_on == "Item Group" and offer.apply_type == "Item Group" and offer.replace_cheapest_item:
+			candidates = [line for line in lines if not line.posa_is_replace]
+			if candidates:
+				cheapest = min(candidates, key=lambda line: line.eval_rate)
+				applied.give_item = applied.apply_item_code = cheapest.item_code
+	return applied
+
+
+def evaluate_cart(index, items, coupons=None, check_limits=True):
+	"""Return the offers of ``index`` that apply to the cart ``items``.
+
+	``coupons`` is a list of ``{"pos_offer", "coupon"}`` rows for coupon based
+	offers. Each returned offer carries the ``items`` (row ids) it covers.
+	Without ``check_limits`` only the matching lines and coupons count, the
+	quantity and amount limits are ignored.
+	"""
+	limits_met = check_qty_amount if check_limits else lambda offer, qty, amount: True
+	coupon_by_offer = {}
+	for row in coupons or []:
+		row = frappe._dict(row)
+		if row.pos_offer:
+			coupon_by_offer[row.pos_offer] = row.coupon
+
+	def coupon_for(offer):
+		if not offer.coupon_based:
+			return None, True
+		coupon = coupon_by_offer.get(offer.name)
+		return coupon, bool(coupon)
+
+	lines = _prepare_lines(items)
+
+	# One pass over the lines collects the lines each hit offer covers
+	hits = {}
+	for line in lines:
+		for offer in index.match_line(line):
+			hits.setdefault(offer.name, (offer, []))[1].append(line)
+
+	applied = []
+	for offer, offer_lines in hits.values():
+		coupon, allowed = coupon_for(offer)
+		if not allowed:
+			continue
+		if offer.apply_on == "Item Code":
+			# Item code offers are checked line by line
+			offer_lines = [line for line in offer_lines if limits_met(offer, line.eval_qty, line.eval_amount)]
+			if offer_lines:
+				applied.append(_applied_offer(offer, offer_lines, coupon))
+			continue
+		qty = sum(line.eval_qty for line in offer_lines)
+		amount = sum(line.eval_amount for line in offer_lines)
+		if (qty or amount) and limits_met(offer, qty, amount):
+			applied.append(_applied_offer(offer, offer_lines, coupon))
+
+	if index.transaction:
+		transaction_lines = [line for line in lines if not line.posa_is_replace]
+		qty = sum(line.eval_qty for line in transaction_lines)
+		amount = sum(line.eval_amount for line in transaction_lines)
+		if qty or amount:
+			for offer in index.transaction:
+				coupon, allowed = coupon_for(offer)
+				if allowed and limits_met(offer, qty, amount):
+					applied.append(_applied_offer(offer, transaction_lines, coupon))
+
+	return applied
+
+
+@frappe.whitelist()
+@track_perf
+def apply_offers(cart):
+	"""Evaluate a POS cart against the active offers of its POS Profile.
+
+	``cart`` is a JSON object with ``pos_profile``, ``items`` and optionally
+	``packed_items`` and ``posa_coupons``. Returns the applicable offers.
+	"""
+	if isinstance(cart, str):
+		cart = json.loads(cart)
+	cart = frappe._dict(cart)
+	if not cart.pos_profile:
+		frappe.throw(_("POS Profile is required to apply offers"))
+
+	index = get_offer_index(cart.pos_profile)
+	if not len(index):
+		return []
+	items = list(cart.get("items") or []) + list(cart.get("packed_items") or [])
+	return evaluate_cart(index, items, cart.get("posa_coupons"))
+
+
+def validate_invoice_offers(doc):
+	"""Throw if an offer recorded on ``doc`` does not apply to its items.
+
+	Only offers flagged as applied are checked, so offers the cashier saw but
+	did not use never block a submission. Validity is checked against the
+	posting date, so invoices synced later from offline tills still pass.
+
+	Submission is only blocked on the offer's items, groups, brands, coupon
+	and dates. Once applied, an offer rewrites ``price_list_rate`` and the
+	pre-discount amounts are not saved, so quantity and amount limits cannot
+	be re-checked reliably; mismatches there are logged instead.
+	"""
+	applied_rows = [row for row in doc.get("posa_offers") or [] if row.offer_applied]
+	if not applied_rows:
+		return
+
+	posting_date = getdate(doc.get("posting_date"))
+	offers = [
+		offer
+		for offer in frappe.get_all(
+			"POS Offer",
+			filters={
+				"name": ["in", list({row.offer_name for row in applied_rows})],
+				"disable": 0,
+				"company": doc.company,
+			},
+			fields=OFFER_FIELDS,
+		)
+		if (not offer.valid_from or getdate(offer.valid_from) <= posting_date)
+		and (not offer.valid_upto or getdate(offer.valid_upto) >= posting_date)
+	]
+	coupons = [{"pos_offer": row.pos_offer, "coupon": row.coupon} for row in doc.get("posa_coupons") or []]
+	items = list(doc.get("items") or []) + list(doc.get("packed_items") or [])
+	index = compile_offers(offers)
+	eligible = {offer.offer_name for offer in evaluate_cart(index, items, coupons, check_limits=False)}
+
+	for row in applied_rows:
+		if row.offer_name not in eligible:
+			frappe.throw(
+				_("Row #{0}: Offer {1} does not apply to this invoice").format(row.idx, frappe.bold(row.offer_name)),
+				title=_("Invalid Offer"),
+			)
+
+	within_limits = {offer.offer_name for offer in evaluate_cart(index, items, coupons)}
+	outside_limits = sorted({row.offer_name for row in applied_rows} - within_limits)
+	if outside_limits:
+		frappe.log_error(
+			_("Offers {0} on {1} are outside their quantity or amount limits").format(
+				", ".join(outside_limits), doc.name
+			),
+			"POS Offer limits",
+		)
@@ -3,22 +3,29 @@
 # For license information, please see license.txt
 
 from __future__ import unicode_literals
+import hashlib
 import json
 import frappe
-from frappe.utils import nowdate
+from frappe.utils import add_days, get_datetime, now_datetime, nowdate
+from posawesome.posawesome.api.offer_engine import OFFER_FIELDS
 from posawesome.posawesome.doctype.pos_coupon.pos_coupon import check_coupon_code
 from posawesome.posawesome.doctype.delivery_charges.delivery_charges import (
     get_applicable_delivery_charges as _get_applicable_delivery_charges,
 )
+from posawesome.posawesome.api.perf import track_perf
+
+OFFERS_CACHE_KEY = "posa_active_offers"
 
 
 @frappe.whitelist()
+@track_perf
 def get_pos_coupon(coupon, customer, company):
     res = check_coupon_code(coupon, customer, company)
     return res
 
 
 @frappe.whitelist()
+@track_perf
 def get_active_gift_coupons(customer, company):
     coupons = []
     coupons_data = frappe.get_all(
@@ -36,39 +43,83 @@ def get_active_gift_coupons(customer, company):
     return coupons
 
 
-@frappe.whitelist()
-def get_offers(profile):
-    pos_profile = frappe.get_doc("POS Profile", profile)
-    company = pos_profile.company
-    warehouse = pos_profile.warehouse
-    date = nowdate()
+def _load_active_offers(profile, date):
+    pos_profile = frappe.get_cached_value(
+        "POS Profile", profile, ["company", "warehouse"], as_dict=True
+    )
+    if not pos_profile:
+        return []
 
     values = {
-        "company": company,
+        "company": pos_profile.company,
         "pos_profile": profile,
-        "warehouse": warehouse,
-        "valid_from": date,
-        "valid_upto": date,
+        "warehouse": pos_profile.warehouse,
+        "date": date,
     }
-    data = frappe.db.sql(
+    return frappe.db.sql(
         """
-        SELECT *
+        SELECT {fields}
         FROM `tabPOS Offer`
-        WHERE 
+        WHERE
         disable = 0 AND
         company = %(company)s AND
         (pos_profile is NULL OR pos_profile  = '' OR  pos_profile = %(pos_profile)s) AND
         (warehouse is NULL OR warehouse  = '' OR  warehouse = %(warehouse)s) AND
-        (valid_from is NULL OR valid_from  = '' OR  valid_from <= %(valid_from)s) AND
-        (valid_upto is NULL OR valid_from  = '' OR  valid_upto >= %(valid_upto)s)
-    """,
+        (valid_from is NULL OR valid_from <= %(date)s) AND
+        (valid_upto is NULL OR valid_upto >= %(date)s)
+        ORDER BY name
+    """.format(
+            fields=", ".join(f"`{field}`" for field in OFFER_FIELDS)
+        ),
         values=values,
         as_dict=1,
     )
-    return data
+
+
+def get_active_offer_set(profile):
+    """Return the offers active today for a POS Profile with their ETag.
+
+    Offer windows are whole days, so the set is cached per profile and date
+    and expires at midnight. Any change to a POS Offer or POS Profile clears
+    it. The ETag is a hash of the offers and only changes with them.
+    """
+    date = nowdate()
+    key = f"{OFFERS_CACHE_KEY}:{profile}:{date}"
+    offer_set = frappe.cache().get_value(key)
+    if offer_set is None:
+        offers = _load_active_offers(profile, date)
+        etag = hashlib.sha1(
+            json.dumps(offers, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        offer_set = {"etag": etag, "offers": offers}
+        midnight = get_datetime(add_days(date, 1))
+        expires_in = max(int((midnight - now_datetime()).total_seconds()), 1)
+        frappe.cache().set_value(key, offer_set, expires_in_sec=expires_in)
+    return offer_set
+
+
+def clear_offers_cache(doc=None, method=None):
+    frappe.cache().delete_keys(OFFERS_CACHE_KEY)
+
+
+@frappe.whitelist()
+@track_perf
+def get_offers(profile):
+    return get_active_offer_set(profile)["offers"]
+
+
+@frappe.whitelist()
+@track_perf
+def get_offers_if_changed(profile, etag=None):
+    """Return the active offers unless the terminal already holds ``etag``."""
+    offer_set = get_active_offer_set(profile)
+    if etag and etag == offer_set["etag"]:
+        return {"etag": etag, "changed": 0}
+    return {"etag": offer_set["etag"], "changed": 1, "offers": offer_set["offers"]}
 
 
 @frappe.whitelist()
+@track_perf
 def get_applicable_delivery_charges(
     company, pos_profile, customer, shipping_address_name=None
 ):
@@ -0,0 +1,175 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Archive fully billed restaurant orders into ``Restaurant Order Archive``.
+
+Runs as a scheduled background job. Candidates are found with one anti-join
+against the archive and processed in bounded batches. Every batch is
+committed on its own, so an interrupted run resumes where it stopped.
+"""
+
+from __future__ import annotations
+
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt, now_datetime
+
+ARCHIVE_DOCTYPE = "Restaurant Order Archive"
+ARCHIVE_FIELDS = [
+	"name",
+	"sales_order",
+	"customer",
+	"customer_name",
+	"company",
+	"transaction_date",
+	"restaurant_order_type",
+	"table_number",
+	"pos_profile",
+	"currency",
+	"grand_total",
+	"order_docstatus",
+	"sales_invoices",
+	"items",
+	"archived_on",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"docstatus",
+]
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_BATCHES = 50
+
+
+def get_archivable_orders(limit):
+	"""Return up to ``limit`` fully billed restaurant orders not yet archived.
+
+	Orders without a submitted invoice line are skipped, as they were not
+	really billed through a Sales Invoice.
+	"""
+	return frappe.db.sql(
+		"""
+		SELECT
+			so.name, so.customer, so.customer_name, so.company, so.transaction_date,
+			so.restaurant_order_type, so.table_number, so.pos_profile, so.currency,
+			so.grand_total, so.docstatus,
+			GROUP_CONCAT(DISTINCT sii.parent ORDER BY sii.parent SEPARATOR ', ') AS sales_invoices
+		FROM `tabSales Order` so
+		INNER JOIN `tabSales Invoice Item` sii
+			ON sii.sales_order = so.name AND sii.docstatus = 1
+		LEFT JOIN `tabRestaurant Order Archive` roa
+			ON roa.name = so.name
+		WHERE so.per_billed >= 100
+			AND so.docstatus < 2
+			AND IFNULL(so.restaurant_order_type, '') != ''
+			AND roa.name IS NULL
+		GROUP BY so.name
+		ORDER BY so.creation
+		LIMIT %s
+		""",
+		(cint(limit),),
+		as_dict=True,
+	)
+
+
+def get_item_snapshots(order_names):
+	"""Return a compact ``[item_code, qty, uom, rate, amount]`` list per order."""
+	snapshots = {name: [] for name in order_names}
+	if not order_names:
+		return snapshots
+
+	for item in frappe.get_all(
+		"Sales Order Item",
+		filters={"parent": ["in", order_names], "parenttype": "Sales Order"},
+		fields=["parent", "item_code", "qty", "uom", "rate", "amount"],
+		order_by="parent asc, idx asc",
+	):
+		snapshots[item.parent].append([item.item_code, flt(item.qty), item.uom, flt(item.rate), flt(item.amount)])
+	return snapshots
+
+
+def archive_orders(orders):
+	"""Write archive rows for ``orders`` and remove the draft ones.
+
+	Submitted orders stay in place because their invoices link to them, only
+	draft orders left behind by a failed consolidation are deleted. Returns
+	the names of the deleted drafts.
+	"""
+	order_names = [order.name for order in orders]
+	snapshots = get_item_snapshots(order_names)
+	now = now_datetime()
+	user = frappe.session.user
+
+	values = [
+		(
+			order.name,
+			order.name,
+			order.customer,
+			order.customer_name,
+			order.company,
+			order.transaction_date,
+			order.restaurant_order_type,
+			order.table_number,
+			order.pos_profile,
+			order.currency,
+			flt(order.grand_total),
+			cint(order.docstatus),
+			order.sales_invoices,
+			json.dumps(snapshots[order.name], separators=(",", ":"), default=str),
+			now,
+			now,
+			now,
+			user,
+			user,
+			0,
+		)
+		for order in orders
+	]
+	frappe.db.bulk_insert(ARCHIVE_DOCTYPE, ARCHIVE_FIELDS, values, ignore_duplicates=True)
+
+	drafts = [order.name for order in orders if cint(order.docstatus) == 0]
+	for order_name in drafts:
+		frappe.delete_doc("Sales Order", order_name, force=1, ignore_permissions=True)
+	return drafts
+
+
+def archive_fully_billed_orders(batch_size=DEFAULT_BATCH_SIZE, max_batches=DEFAULT_MAX_BATCHES):
+	"""Archive fully billed restaurant orders in committed batches.
+
+	Scheduled daily; ``max_batches`` bounds a single run and the remaining
+	orders are picked up by the next one.
+	"""
+	batch_size = cint(batch_size) or DEFAULT_BATCH_SIZE
+	max_batches = cint(max_batches) or DEFAULT_MAX_BATCHES
+	archived = 0
+	deleted = []
+	errors = []
+
+	for batch in range(max_batches):
+		orders = get_archivable_orders(batch_size)
+		if not orders:
+			break
+
+		try:
+			deleted.extend(archive_orders(orders))
+			frappe.db.commit()
+			archived += len(orders)
+		except Exception:
+			frappe.db.rollback()
+			errors.append(", ".join(order.name for order in orders))
+			frappe.log_error(frappe.get_traceback(), "Restaurant Order Archive")
+			break
+
+		frappe.publish_progress(
+			flt(batch + 1) * 100 / max_batches,
+			title=_("Archiving billed restaurant orders"),
+			description=_("{0} orders archived").format(archived),
+		)
+
+		if len(orders) < batch_size:
+			break
+
+	return {"archived": archived, "deleted_drafts": deleted, "errors": errors}
@@ -0,0 +1,292 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Shared engine for consolidating several restaurant orders into one bill.
+
+Used by ``create_invoice_from_multiple_orders``,
+``submit_multiple_orders_and_create_invoice`` and
+``finalize_multi_order_payment``. Orders and their lines are loaded with one
+query each, and table release and delivery tracking are written with bulk
+statements. Nothing here commits, so a consolidation either fully succeeds
+or is rolled back with the request.
+"""
+
+from __future__ import annotations
+
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+ORDER_FIELDS = [
+	"name",
+	"customer",
+	"customer_name",
+	"company",
+	"currency",
+	"docstatus",
+	"status",
+	"per_billed",
+	"grand_total",
+	"delivery_date",
+	"selling_price_list",
+	"restaurant_order_type",
+	"table_number",
+	"pos_profile",
+]
+
+ORDER_ITEM_FIELDS = [
+	"name",
+	"parent",
+	"idx",
+	"item_code",
+	"item_name",
+	"item_group",
+	"description",
+	"qty",
+	"stock_qty",
+	"uom",
+	"stock_uom",
+	"conversion_factor",
+	"rate",
+	"amount",
+	"warehouse",
+]
+
+
+def load_orders(order_names, skip_missing=False):
+	"""Return the Sales Orders with their lines, in the order requested.
+
+	Each order is a ``frappe._dict`` of :data:`ORDER_FIELDS` with an ``items``
+	list of :data:`ORDER_ITEM_FIELDS`. Throws if any order does not exist,
+	unless ``skip_missing`` is set.
+	"""
+	order_names = list(dict.fromkeys(order_names or []))
+	if not order_names:
+		frappe.throw(_("No sales orders provided"))
+
+	orders = {
+		order.name: order
+		for order in frappe.get_all(
+			"Sales Order", filters={"name": ["in", order_names]}, fields=ORDER_FIELDS
+		)
+	}
+	missing = [name for name in order_names if name not in orders]
+	if missing and not skip_missing:
+		frappe.throw(_("Sales Order {0} not found").format(", ".join(missing)))
+	order_names = [name for name in order_names if name in orders]
+
+	for order in orders.values():
+		order["items"] = []
+	if not order_names:
+		return []
+	for item in frappe.get_all(
+		"Sales Order Item",
+		filters={"parent": ["in", order_names], "parenttype": "Sales Order"},
+		fields=ORDER_ITEM_FIELDS,
+		order_by="idx asc",
+	):
+		orders[item.parent]["items"].append(item)
+
+	return [orders[name] for name in order_names]
+
+
+def is_order_consolidatable(order, allow_submitted=True, unbilled_only=False):
+	"""Return whether an order can be added to a consolidated bill."""
+	if order.docstatus == 0:
+		return True
+	if order.docstatus != 1 or not allow_submitted:
+		return False
+	if unbilled_only:
+		return flt(order.per_billed) == 0
+	return flt(order.per_billed) < 100
+
+
+def validate_orders(orders, allow_submitted=True, unbilled_only=False, skip_invalid=False):
+	"""Validate orders for consolidation and return the usable ones.
+
+	Orders that cannot be consolidated raise an error, or are dropped when
+	``skip_invalid`` is set. All remaining orders must share one customer.
+	"""
+	valid_orders = []
+	for order in orders:
+		if is_order_consolidatable(order, allow_submitted, unbilled_only):
+			valid_orders.append(order)
+		elif not skip_invalid:
+			if order.docstatus == 1 and flt(order.per_billed) > 0:
+				frappe.throw(_("Order {0} is already {1}% billed").format(order.name, flt(order.per_billed)))
+			frappe.throw(_("Order {0} is not in Draft status").format(order.name))
+
+	if not valid_orders:
+		frappe.throw(_("No valid orders found for consolidation. All selected orders may have been already processed or billed."))
+
+	customers = {order.customer for order in valid_orders}
+	if len(customers) > 1:
+		frappe.throw(_("All orders must be from the same customer"))
+
+	return valid_orders
+
+
+def submit_draft_orders(orders):
+	"""Submit the draft orders in ``orders`` without intermediate commits."""
+	for order in orders:
+		if order.docstatus != 0:
+			continue
+		order_doc = frappe.get_doc("Sales Order", order.name)
+		order_doc.submit()
+		order.docstatus = order_doc.docstatus
+		order.status = order_doc.status
+
+
+def resolve_pos_profile(pos_profile_name=None, company=None):
+	"""Return the given POS Profile or the first enabled one for the company."""
+	if pos_profile_name:
+		return pos_profile_name
+	if company:
+		pos_profile_name = frappe.db.get_value("POS Profile", {"company": company, "disabled": 0}, "name")
+	return pos_profile_name or frappe.db.get_value("POS Profile", {"disabled": 0}, "name")
+
+
+def get_pos_profile_payments(pos_profile_name):
+	"""Return zero-amount payment rows for each payment method of a POS Profile."""
+	if not pos_profile_name:
+		return []
+
+	methods = frappe.get_all(
+		"POS Payment Method",
+		filters={"parent": pos_profile_name, "parenttype": "POS Profile"},
+		fields=["mode_of_payment", "default"],
+		order_by="idx asc",
+	)
+	return [
+		{
+			"mode_of_payment": method.mode_of_payment,
+			"amount": 0.0,
+			"base_amount": 0.0,
+			"default": method.default or 0,
+		}
+		for method in methods
+	]
+
+
+def set_pos_profile_payments(invoice_doc, pos_profile_name):
+	"""Replace the payments of ``invoice_doc`` with the POS Profile's methods."""
+	if not pos_profile_name:
+		return
+	invoice_doc.payments = []
+	for payment in get_pos_profile_payments(pos_profile_name):
+		invoice_doc.append("payments", payment)
+
+
+def build_linked_invoice(orders):
+	"""Build one Sales Invoice that bills every line of ``orders``.
+
+	The first (submitted) order is mapped with ERPNext's ``make_sales_invoice``
+	so taxes and terms are carried over. Lines from the other orders are added
+	from the already loaded rows as separate lines linked through
+	``sales_order``/``so_detail``.
+	"""
+	from erpnext.selling.doctype.sales_order.sales_order import make_sales_invoice
+
+	invoice_doc = make_sales_invoice(orders[0].name)
+	invoice_doc.is_pos = 1
+	# Restaurant orders never update stock from the POS invoice
+	invoice_doc.update_stock = 0
+
+	for order in orders[1:]:
+		for item in order["items"]:
+			invoice_doc.append(
+				"items",
+				{
+					"item_code": item.item_code,
+					"item_name": item.item_name,
+					"description": item.description,
+					"qty": item.qty,
+					"uom": item.uom,
+					"conversion_factor": item.conversion_factor,
+					"rate": item.rate,
+					"amount": flt(item.qty) * flt(item.rate),
+					"warehouse": item.warehouse,
+					"sales_order": order.name,
+					"so_detail": item.name,
+				},
+			)
+
+	if len(orders) > 1:
+		invoice_doc.calculate_taxes_and_totals()
+
+	return invoice_doc
+
+
+def aggregate_order_items(orders):
+	"""Merge the lines of ``orders`` by item code, remembering their source orders."""
+	aggregated = {}
+	for order in orders:
+		for item in order["items"]:
+			row = aggregated.get(item.item_code)
+			if not row:
+				row = aggregated[item.item_code] = {
+					"item_code": item.item_code,
+					"item_name": item.item_name,
+					"description": item.description,
+					"qty": 0,
+					"rate": item.rate,
+					"amount": 0,
+					"uom": item.uom,
+					"stock_qty": 0,
+					"conversion_factor": item.conversion_factor,
+					"warehouse": item.warehouse,
+					"source_orders": [],
+				}
+			row["qty"] += flt(item.qty)
+			row["amount"] += flt(item.amount)
+			row["stock_qty"] += flt(item.stock_qty)
+			if order.name not in row["source_orders"]:
+				row["source_orders"].append(order.name)
+
+	return list(aggregated.values())
+
+
+def set_delivered_qty(invoice_items):
+	"""Set ``delivered_qty`` on the linked Sales Order Items with one statement."""
+	rows = [(item.so_detail, flt(item.qty)) for item in invoice_items if item.get("so_detail")]
+	if not rows:
+		return
+
+	case = " ".join(["WHEN %s THEN %s"] * len(rows))
+	values = [value for row in rows for value in row]
+	names = [row[0] for row in rows]
+	frappe.db.sql(
+		f"""
+		UPDATE `tabSales Order Item`
+		SET delivered_qty = CASE name {case} ELSE delivered_qty END
+		WHERE name IN ({", ".join(["%s"] * len(names))})
+		""",
+		values + names,
+	)
+
+
+def release_tables(order_names):
+	"""Free every Restaurant Table currently held by one of ``order_names``.
+
+	Returns the released table numbers.
+	"""
+	order_names = list(order_names or [])
+	if not order_names:
+		return []
+
+	table_numbers = frappe.get_all(
+		"Restaurant Table",
+		filters={"current_order": ["in", order_names]},
+		pluck="table_number",
+	)
+	if table_numbers:
+		frappe.db.sql(
+			f"""
+			UPDATE `tabRestaurant Table`
+			SET status = 'Available', current_order = NULL, modified = %s, modified_by = %s
+			WHERE current_order IN ({", ".join(["%s"] * len(order_names))})
+			""",
+			[frappe.utils.now(), frappe.session.user, *order_names],
+		)
+
+	return table_numbers
@@ -0,0 +1,345 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Allocate POS payments against a customer's open invoices.
+
+The invoices are loaded with one query and every payment source (M-Pesa
+registers, existing unallocated Payment Entries and new payment modes) is
+allocated FIFO in memory first. The resulting plan is then written with one
+reconciliation call for the existing Payment Entries and one multi-reference
+Payment Entry per new payment mode. Large plans run as a background job.
+"""
+
+from __future__ import annotations
+
+import frappe
+from frappe import _
+from frappe.utils import flt, nowdate
+
+from posawesome.posawesome.api.payment_entry import create_payment_entry
+
+# Plans touching more invoices than this are processed in a background job
+BACKGROUND_ALLOCATION_THRESHOLD = 50
+
+
+def get_selected_invoice_names(selected_invoices):
+	names = []
+	for invoice in selected_invoices or []:
+		name = invoice.get("voucher_no") or invoice.get("name")
+		if name:
+			names.append(name)
+	return list(dict.fromkeys(names))
+
+
+def load_open_invoices(invoice_names, customer, company):
+	"""Return the open invoices among ``invoice_names``, oldest first."""
+	if not invoice_names:
+		return []
+	invoices = frappe.get_all(
+		"Sales Invoice",
+		filters={
+			"name": ["in", invoice_names],
+			"customer": customer,
+			"company": company,
+			"docstatus": 1,
+			"outstanding_amount": [">", 0],
+		},
+		fields=["name", "outstanding_amount", "grand_total", "posting_date", "due_date"],
+		order_by="posting_date asc, due_date asc, name asc",
+	)
+	for invoice in invoices:
+		invoice.outstanding_amount = flt(invoice.outstanding_amount)
+	return invoices
+
+
+def allocate(invoices, amount):
+	"""Allocate ``amount`` FIFO over ``invoices`` and return the allocations.
+
+	The invoices' ``outstanding_amount`` is reduced in place so consecutive
+	calls continue where the previous source stopped.
+	"""
+	allocations = []
+	remaining = flt(amount)
+	for invoice in invoices:
+		if remaining <= 0:
+			break
+		if invoice.outstanding_amount <= 0:
+			continue
+		allocation = min(remaining, invoice.outstanding_amount)
+		allocations.append(
+			frappe._dict(
+				invoice=invoice.name,
+				outstanding_before=invoice.outstanding_amount,
+				allocated_amount=allocation,
+			)
+		)
+		invoice.outstanding_amount -= allocation
+		remaining -= allocation
+	return allocations
+
+
+def run_in_savepoint(name, errors, fn, *args, **kwargs):
+	"""Return ``fn(*args, **kwargs)``, or ``None`` with its writes rolled back.
+
+	The error is added to ``errors`` so one failing step never leaves partial
+	writes behind nor hides the steps that did succeed.
+	"""
+	frappe.db.savepoint(name)
+	try:
+		result = fn(*args, **kwargs)
+	except Exception as e:
+		frappe.db.rollback(save_point=name)
+		errors.append(str(e))
+		frappe.log_error(frappe.get_traceback(), "POS Payment Error")
+		return None
+	frappe.db.release_savepoint(name)
+	return result
+
+
+def _submit_mpesa_register(register_name, customer):
+	doc = frappe.get_doc("Mpesa Payment Register", register_name)
+	doc.customer = customer
+	doc.submit_payment = 1
+	doc.submit()
+	return doc.payment_entry
+
+
+def submit_mpesa_registers(register_names, customer, errors):
+	"""Submit M-Pesa Payment Registers and return their Payment Entry names.
+
+	Each register is submitted on its own, a failing one is reported in
+	``errors`` and the others still go through.
+	"""
+	payment_entries = []
+	for register_name in register_names:
+		payment_entry = run_in_savepoint(
+			"posa_mpesa_register", errors, _submit_mpesa_register, register_name, customer
+		)
+		if payment_entry:
+			payment_entries.append(payment_entry)
+	return payment_entries
+
+
+def load_unallocated_payments(payment_names, customer):
+	"""Return the selected Payment Entries of ``customer`` in the given order."""
+	if not payment_names:
+		return []
+	payments = {
+		payment.name: payment
+		for payment in frappe.get_all(
+			"Payment Entry",
+			filters={
+				"name": ["in", payment_names],
+				"party_type": "Customer",
+				"party": customer,
+				"docstatus": 1,
+			},
+			fields=[
+				"name",
+				"unallocated_amount",
+				"paid_from",
+				"cost_center",
+				"paid_amount",
+				"mode_of_payment",
+				"source_exchange_rate",
+			],
+		)
+	}
+	return [payments[name] for name in payment_names if name in payments]
+
+
+def reconcile_payments(payments, invoices, customer, errors):
+	"""Allocate existing Payment Entries and reconcile them in one call."""
+	from erpnext.accounts.utils import reconcile_against_document
+
+	entries = []
+	reconciled = []
+	for payment in payments:
+		unallocated = flt(payment.unallocated_amount)
+		if unallocated <= 0:
+			errors.append(_("Payment {0} is already fully allocated").format(payment.name))
+			continue
+		allocations = allocate(invoices, unallocated)
+		if not allocations:
+			errors.append(
+				_("No outstanding invoices available for allocation of payment {0}").format(payment.name)
+			)
+			continue
+		for allocation in allocations:
+			entries.append(
+				frappe._dict(
+					{
+						"voucher_type": "Payment Entry",
+						"voucher_no": payment.name,
+						"voucher_detail_no": None,
+						"against_voucher_type": "Sales Invoice",
+						"against_voucher": allocation.invoice,
+						"account": payment.paid_from,
+						"party_type": "Customer",
+						"party": customer,
+						"dr_or_cr": "credit_in_account_currency",
+						"unreconciled_amount": unallocated,
+						"unadjusted_amount": unallocated,
+						"allocated_amount": allocation.allocated_amount,
+						"grand_total": allocation.outstanding_before,
+						"outstanding_amount": allocation.outstanding_before,
+						"exchange_rate": flt(payment.source_exchange_rate) or 1,
+						"is_advance": 0,
+						"difference_amount": 0,
+						"cost_center": payment.cost_center,
+					}
+				)
+			)
+		reconciled.append(
+			{
+				"payment_entry": payment.name,
+				"allocated_amount": sum(allocation.allocated_amount for allocation in allocations),
+			}
+		)
+
+	if entries:
+		# ERPNext groups the entries per Payment Entry and updates each once
+		reconcile_against_document(entries)
+	return reconciled
+
+
+def create_allocated_payment(data, payment_method, invoices):
+	"""Create and submit one Payment Entry referencing every invoice it pays."""
+	amount = flt(payment_method.get("amount"))
+	today = nowdate()
+	payment_entry = create_payment_entry(
+		company=data.company,
+		customer=data.customer,
+		currency=data.currency,
+		amount=amount,
+		mode_of_payment=payment_method.get("mode_of_payment"),
+		posting_date=today,
+		reference_no=data.pos_opening_shift_name,
+		reference_date=today,
+		cost_center=data.pos_profile.get("cost_center"),
+		submit=0,
+	)
+
+	allocated_amount = 0
+	for allocation in allocate(invoices, amount):
+		payment_entry.append(
+			"references",
+			{
+				"reference_doctype": "Sales Invoice",
+				"reference_name": allocation.invoice,
+				"total_amount": allocation.outstanding_before,
+				"outstanding_amount": allocation.outstanding_before,
+				"allocated_amount": allocation.allocated_amount,
+			},
+		)
+		allocated_amount += allocation.allocated_amount
+
+	payment_entry.total_allocated_amount = allocated_amount
+	payment_entry.unallocated_amount = payment_entry.paid_amount - allocated_amount
+	payment_entry.difference_amount = payment_entry.paid_amount - allocated_amount
+	payment_entry.save(ignore_permissions=True)
+	payment_entry.submit()
+	return payment_entry
+
+
+def _payment_summary(doc):
+	return {"name": doc.name, "paid_amount": flt(doc.paid_amount), "mode_of_payment": doc.mode_of_payment}
+
+
+def _restore_outstanding(invoices, outstanding):
+	# Allocations of a rolled back step are given back to the invoices
+	for invoice in invoices:
+		invoice.outstanding_amount = outstanding[invoice.name]
+
+
+def process_payment(data):
+	"""Run the allocation for a validated POS payment payload."""
+	pos_profile = data.pos_profile
+	invoices = load_open_invoices(
+		get_selected_invoice_names(data.selected_invoices), data.customer, data.company
+	)
+
+	new_payments_entry = []
+	all_payments_entry = []
+	reconciled_payments = []
+	errors = []
+
+	# M-Pesa payments become unallocated Payment Entries and are reconciled
+	# together with the selected ones
+	payment_names = []
+	if (
+		pos_profile.get("posa_allow_mpesa_reconcile_payments")
+		and data.selected_mpesa_payments
+		and flt(data.total_selected_mpesa_payments) > 0
+	):
+		payment_names.extend(
+			submit_mpesa_registers(
+				[payment.get("name") for payment in data.selected_mpesa_payments], data.customer, errors
+			)
+		)
+
+	if (
+		pos_profile.get("posa_allow_reconcile_payments")
+		and data.selected_payments
+		and flt(data.total_selected_payments) > 0
+	):
+		payment_names.extend(payment.get("name") for payment in data.selected_payments)
+
+	if payment_names:
+		mpesa_names = set(payment_names) - {payment.get("name") for payment in data.selected_payments or []}
+		payments = load_unallocated_payments(list(dict.fromkeys(payment_names)), data.customer)
+		outstanding = {invoice.name: invoice.outstanding_amount for invoice in invoices}
+		reconciled_payments = run_in_savepoint(
+			"posa_reconcile_payments", errors, reconcile_payments, payments, invoices, data.customer, errors
+		)
+		if reconciled_payments is None:
+			reconciled_payments = []
+			_restore_outstanding(invoices, outstanding)
+		reconciled_names = {payment["payment_entry"] for payment in reconciled_payments}
+		for payment in payments:
+			# Submitted M-Pesa entries exist even when their reconciliation failed
+			if payment.name in mpesa_names:
+				new_payments_entry.append(_payment_summary(payment))
+			if payment.name in reconciled_names or payment.name in mpesa_names:
+				all_payments_entry.append(_payment_summary(payment))
+
+	if (
+		pos_profile.get("posa_allow_make_new_payments")
+		and data.payment_methods
+		and flt(data.total_payment_methods) > 0
+	):
+		for payment_method in data.payment_methods:
+			if not flt(payment_method.get("amount")):
+				continue
+			outstanding = {invoice.name: invoice.outstanding_amount for invoice in invoices}
+			payment_entry = run_in_savepoint(
+				"posa_new_payment", errors, create_allocated_payment, data, payment_method, invoices
+			)
+			if not payment_entry:
+				_restore_outstanding(invoices, outstanding)
+				continue
+			new_payments_entry.append(_payment_summary(payment_entry))
+			all_payments_entry.append(_payment_summary(payment_entry))
+
+	return {
+		"new_payments_entry": new_payments_entry,
+		"all_payments_entry": all_payments_entry,
+		"reconciled_payments": reconciled_payments,
+		"errors": errors,
+	}
+
+
+def is_large_plan(data):
+	return len(get_selected_invoice_names(data.selected_invoices)) > BACKGROUND_ALLOCATION_THRESHOLD
+
+
+def process_payment_job(payload, user):
+	"""Background job entry point for large payment plans."""
+	from posawesome.posawesome.api.payment_entry import render_payment_summary
+
+	data = frappe._dict(payload)
+	result = process_payment(data)
+	frappe.db.commit()
+	frappe.publish_realtime("msgprint", render_payment_summary(result), user=user)
+	frappe.publish_realtime("posa_payment_processed", result, user=user)
+	return result
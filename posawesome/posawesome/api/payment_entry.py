@@ -18,6 +18,7 @@ from erpnext.accounts.utils import (
     reconcile_against_document,
 )
 from erpnext.accounts.doctype.payment_entry.payment_entry import get_payment_entry
+from posawesome.posawesome.api.perf import track_perf
 
 
 def create_payment_entry(
@@ -151,6 +152,7 @@ def set_paid_amount_and_received_amount(
 
 
 @frappe.whitelist()
+@track_perf
 def get_outstanding_invoices(
     customer=None, company=None, currency=None, pos_profile=None
 ):
@@ -211,6 +213,7 @@ def get_outstanding_invoices(
 
 
 @frappe.whitelist()
+@track_perf
 def get_unallocated_payments(customer, company, currency, mode_of_payment=None):
     filters = {
         "party": customer,
@@ -242,18 +245,15 @@ def get_unallocated_payments(customer, company, currency, mode_of_payment=None):
 
 
 @frappe.whitelist()
+@track_perf
 def process_pos_payment(payload):
+    from posawesome.posawesome.api import payment_allocation
+
     data = json.loads(payload)
     data = frappe._dict(data)
     if not data.pos_profile.get("posa_use_pos_awesome_payments"):
         frappe.throw(_("POS Awesome Payments is not enabled for this POS Profile"))
 
-    # Log short summary only to avoid truncation
-    frappe.log_error(
-        f"Payment request from {data.customer} for {data.total_payment_methods} amount with {len(data.selected_invoices)} invoices",
-        "POS Payment Debug",
-    )
-
     # validate data
     if not data.customer:
         frappe.throw(_("Customer is required"))
@@ -266,225 +266,42 @@ def process_pos_payment(payload):
     if not data.pos_opening_shift_name:
         frappe.throw(_("POS Opening Shift is required"))
 
-    company = data.company
-    currency = data.currency
-    customer = data.customer
-    pos_opening_shift_name = data.pos_opening_shift_name
-    allow_make_new_payments = data.pos_profile.get("posa_allow_make_new_payments")
-    allow_reconcile_payments = data.pos_profile.get("posa_allow_reconcile_payments")
-    allow_mpesa_reconcile_payments = data.pos_profile.get(
-        "posa_allow_mpesa_reconcile_payments"
-    )
-    today = nowdate()
-
-    # prepare invoice list once so allocations can update remaining amounts
-    remaining_invoices = []
-    for invoice in data.selected_invoices:
-        invoice_name = invoice.get("voucher_no") or invoice.get("name")
-        if not invoice_name:
-            continue
-        outstanding = flt(invoice.get("outstanding_amount"))
-        if outstanding <= 0:
-            try:
-                si = frappe.get_doc("Sales Invoice", invoice_name)
-                outstanding = flt(si.outstanding_amount)
-            except Exception:
-                outstanding = 0
-        remaining_invoices.append(
-            {"name": invoice_name, "outstanding_amount": outstanding}
+    # Large settlements run in the background to avoid request timeouts
+    if payment_allocation.is_large_plan(data):
+        job = frappe.enqueue(
+            "posawesome.posawesome.api.payment_allocation.process_payment_job",
+            queue="long",
+            timeout=3600,
+            payload=data,
+            user=frappe.session.user,
         )
+        frappe.msgprint(
+            _("Payment for {0} invoices is being processed in the background").format(
+                len(payment_allocation.get_selected_invoice_names(data.selected_invoices))
+            )
+        )
+        return {
+            "queued": 1,
+            "job_id": job.id if job else None,
+            "new_payments_entry": [],
+            "all_payments_entry": [],
+            "reconciled_payments": [],
+            "errors": [],
+        }
 
-    new_payments_entry = []
-    all_payments_entry = []
-    reconciled_payments = []
-    errors = []
-
-    # first process mpesa payments
-    if (
-        allow_mpesa_reconcile_payments
-        and len(data.selected_mpesa_payments) > 0
-        and data.total_selected_mpesa_payments > 0
-    ):
-        for mpesa_payment in data.selected_mpesa_payments:
-            try:
-                new_mpesa_payment = submit_mpesa_payment(
-                    mpesa_payment.get("name"), customer
-                )
-                new_payments_entry.append(new_mpesa_payment)
-                all_payments_entry.append(new_mpesa_payment)
-            except Exception as e:
-                errors.append(str(e))
-
-    # then reconcile selected payments with invoices
-    if (
-        allow_reconcile_payments
-        and len(data.selected_payments) > 0
-        and data.total_selected_payments > 0
-    ):
-        for pay in data.selected_payments:
-            try:
-                payment_name = pay.get("name")
-                pe_doc = frappe.get_doc("Payment Entry", payment_name)
-                unallocated = flt(pe_doc.unallocated_amount)
-                if unallocated <= 0:
-                    errors.append(
-                        _("Payment {0} is already fully allocated").format(payment_name)
-                    )
-                    continue
-
-                total_outstanding = sum(
-                    inv["outstanding_amount"] for inv in remaining_invoices
-                )
-                if total_outstanding <= 0:
-                    errors.append(
-                        _(
-                            "No outstanding invoices available for allocation of payment {0}"
-                        ).format(payment_name)
-                    )
-                    continue
-
-                if unallocated > total_outstanding:
-                    errors.append(
-                        _(
-                            "Allocation amount for payment {0} exceeds outstanding invoices"
-                        ).format(payment_name)
-                    )
-                    continue
-
-                entry_list = []
-                remaining_amount = unallocated
-                for inv in remaining_invoices:
-                    if remaining_amount <= 0:
-                        break
-                    if inv["outstanding_amount"] <= 0:
-                        continue
-                    allocation = min(remaining_amount, inv["outstanding_amount"])
-                    if allocation <= 0:
-                        continue
-                    outstanding_before = inv["outstanding_amount"]
-                    entry_list.append(
-                        frappe._dict(
-                            {
-                                "voucher_type": "Payment Entry",
-                                "voucher_no": payment_name,
-                                "voucher_detail_no": None,
-                                "against_voucher_type": "Sales Invoice",
-                                "against_voucher": inv["name"],
-                                "account": pe_doc.paid_from,
-                                "party_type": "Customer",
-                                "party": customer,
-                                "dr_or_cr": "credit_in_account_currency",
-                                "unreconciled_amount": unallocated,
-                                "unadjusted_amount": unallocated,
-                                "allocated_amount": allocation,
-                                "grand_total": outstanding_before,
-                                "outstanding_amount": outstanding_before,
-                                "exchange_rate": 1,
-                                "is_advance": 0,
-                                "difference_amount": 0,
-                                "cost_center": pe_doc.cost_center,
-                            }
-                        )
-                    )
-                    inv["outstanding_amount"] -= allocation
-                    remaining_amount -= allocation
-
-                total_allocated = unallocated - remaining_amount
-                if total_allocated <= 0:
-                    errors.append(
-                        _("No allocation made for payment {0}").format(payment_name)
-                    )
-                    continue
-
-                reconcile_against_document(entry_list)
-
-                pe_doc.reload()
-
-                allocated_after = unallocated - flt(pe_doc.unallocated_amount)
-                reconciled_payments.append(
-                    {
-                        "payment_entry": payment_name,
-                        "allocated_amount": allocated_after,
-                    }
-                )
-                all_payments_entry.append(pe_doc)
-            except Exception as e:
-                errors.append(str(e))
-                frappe.log_error(
-                    f"Error allocating payment {payment_name}: {str(e)}",
-                    "POS Payment Error",
-                )
-
-    # then process the new payments and allocate invoices
-    if (
-        allow_make_new_payments
-        and len(data.payment_methods) > 0
-        and data.total_payment_methods > 0
-    ):
-        for payment_method in data.payment_methods:
-            try:
-                amount = flt(payment_method.get("amount"))
-                if not amount:
-                    continue
-                mode_of_payment = payment_method.get("mode_of_payment")
-                payment_entry = create_payment_entry(
-                    company=company,
-                    customer=customer,
-                    currency=currency,
-                    amount=amount,
-                    mode_of_payment=mode_of_payment,
-                    posting_date=today,
-                    reference_no=pos_opening_shift_name,
-                    reference_date=today,
-                    cost_center=data.pos_profile.get("cost_center"),
-                    submit=0,
-                )
-
-                remaining_amount = amount
-                allocated_amount = 0
-                for inv in remaining_invoices:
-                    if remaining_amount <= 0:
-                        break
-                    if inv["outstanding_amount"] <= 0:
-                        continue
-                    allocation = min(remaining_amount, inv["outstanding_amount"])
-                    if allocation <= 0:
-                        continue
-                    payment_entry.append(
-                        "references",
-                        {
-                            "reference_doctype": "Sales Invoice",
-                            "reference_name": inv["name"],
-                            "total_amount": inv["outstanding_amount"],
-                            "outstanding_amount": inv["outstanding_amount"],
-                            "allocated_amount": allocation,
-                        },
-                    )
-                    inv["outstanding_amount"] -= allocation
-                    remaining_amount -= allocation
-                    allocated_amount += allocation
+    result = payment_allocation.process_payment(data)
+    msg = render_payment_summary(result)
+    if len(msg) > 0:
+        frappe.msgprint(msg)
 
-                payment_entry.total_allocated_amount = allocated_amount
-                payment_entry.unallocated_amount = (
-                    payment_entry.paid_amount - allocated_amount
-                )
-                payment_entry.difference_amount = (
-                    payment_entry.paid_amount - allocated_amount
-                )
+    return result
 
-                payment_entry.save(ignore_permissions=True)
-                payment_entry.submit()
 
-                new_payments_entry.append(payment_entry)
-                all_payments_entry.append(payment_entry)
-            except Exception as e:
-                errors.append(str(e))
-                frappe.log_error(
-                    f"Error creating payment entry: {str(e)}", "POS Payment Error"
-                )
+def render_payment_summary(result):
+    new_payments_entry = result.get("new_payments_entry") or []
+    reconciled_payments = result.get("reconciled_payments") or []
+    errors = result.get("errors") or []
 
-    # Old allocation logic disabled
-    # then show the results
     msg = ""
     if len(new_payments_entry) > 0:
         msg += "<h4>New Payments</h4>"
@@ -519,18 +336,11 @@ def process_pos_payment(payload):
             msg += "<tr><td>{0}</td></tr>".format(error)
         msg += "</tbody>"
         msg += "</table>"
-    if len(msg) > 0:
-        frappe.msgprint(msg)
-
-    return {
-        "new_payments_entry": new_payments_entry,
-        "all_payments_entry": all_payments_entry,
-        "reconciled_payments": reconciled_payments,
-        "errors": errors,
-    }
+    return msg
 
 
 @frappe.whitelist()
+@track_perf
 def get_available_pos_profiles(company, currency):
     pos_profiles_list = frappe.get_list(
         "POS Profile",
@@ -929,6 +739,7 @@ def setup_payment_entry_cancel_hook():
 
 
 @frappe.whitelist()
+@track_perf
 def manual_setup_payment_entry_cancel_hook():
     """Function to manually trigger the setup of payment entry cancel hook"""
     result = setup_payment_entry_cancel_hook()
@@ -943,6 +754,7 @@ def manual_setup_payment_entry_cancel_hook():
 
 
 @frappe.whitelist()
+@track_perf
 def fix_payment_entry_links():
     """Fix missing links between payment entries and journal entries"""
     try:
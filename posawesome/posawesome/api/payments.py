@@ -5,16 +5,19 @@
 from __future__ import unicode_literals
 import json
 import frappe
-from frappe.utils import nowdate
+from frappe.utils import flt, nowdate
 from frappe import _
 from erpnext.accounts.party import get_party_bank_account
+from posawesome.posawesome.api.utilities import ensure_child_doctype
 from erpnext.accounts.doctype.payment_request.payment_request import (
     get_dummy_message,
     get_existing_payment_request_amount,
 )
+from posawesome.posawesome.api.perf import track_perf
 
 
 @frappe.whitelist()
+@track_perf
 def create_payment_request(doc):
     doc = json.loads(doc)
     for pay in doc.get("payments"):
@@ -213,121 +216,154 @@ def get_amount(ref_doc, payment_account=None):
         )
 
 
+def get_credit_cost_center(invoice_doc):
+    cost_center = frappe.get_cached_value(
+        "POS Profile", invoice_doc.pos_profile, "cost_center"
+    ) or frappe.get_cached_value("Company", invoice_doc.company, "cost_center")
+    if not cost_center:
+        frappe.throw(
+            _("Cost Center is not set in pos profile {}").format(invoice_doc.pos_profile)
+        )
+    return cost_center
+
+
+def create_credit_journal_entry(invoice_doc, credits, cost_center, posting_date):
+    """Redeem ``credits`` against ``invoice_doc`` with one Journal Entry.
+
+    ``credits`` maps each source invoice to the amount redeemed from it. Every
+    source invoice gets a debit row and the redeemed total is credited to the
+    invoice in a single row.
+    """
+    debit_to = {
+        invoice.name: invoice.debit_to
+        for invoice in frappe.get_all(
+            "Sales Invoice",
+            filters={"name": ["in", list(credits)]},
+            fields=["name", "debit_to"],
+        )
+    }
+    missing = [name for name in credits if name not in debit_to]
+    if missing:
+        frappe.throw(
+            _("Sales Invoice {0} not found").format(", ".join(missing)),
+            frappe.DoesNotExistError,
+        )
+
+    jv_doc = frappe.get_doc(
+        {
+            "doctype": "Journal Entry",
+            "voucher_type": "Journal Entry",
+            "posting_date": posting_date,
+            "company": invoice_doc.company,
+        }
+    )
+    for credit_origin, amount in credits.items():
+        jv_doc.append(
+            "accounts",
+            {
+                "account": debit_to[credit_origin],
+                "party_type": "Customer",
+                "party": invoice_doc.customer,
+                "reference_type": "Sales Invoice",
+                "reference_name": credit_origin,
+                "debit_in_account_currency": amount,
+                "cost_center": cost_center,
+            },
+        )
+    jv_doc.append(
+        "accounts",
+        {
+            "account": invoice_doc.debit_to,
+            "party_type": "Customer",
+            "party": invoice_doc.customer,
+            "reference_type": "Sales Invoice",
+            "reference_name": invoice_doc.name,
+            "credit_in_account_currency": sum(credits.values()),
+            "cost_center": cost_center,
+        },
+    )
+    ensure_child_doctype(jv_doc, "accounts", "Journal Entry Account")
+
+    jv_doc.flags.ignore_permissions = True
+    frappe.flags.ignore_account_permission = True
+    jv_doc.set_missing_values()
+    try:
+        jv_doc.save()
+        jv_doc.submit()
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "POSAwesome JV Error")
+        frappe.throw(_("Unable to create Journal Entry for customer credit."))
+    return jv_doc
+
+
+def create_invoice_payment_entry(invoice_doc, mode_of_payment, account, amount, due_date, posting_date):
+    payment_entry_doc = frappe.get_doc(
+        {
+            "doctype": "Payment Entry",
+            "posting_date": posting_date,
+            "payment_type": "Receive",
+            "party_type": "Customer",
+            "party": invoice_doc.customer,
+            "paid_amount": amount,
+            "received_amount": amount,
+            "paid_from": invoice_doc.debit_to,
+            "paid_to": account,
+            "company": invoice_doc.company,
+            "mode_of_payment": mode_of_payment,
+            "reference_no": invoice_doc.posa_pos_opening_shift,
+            "reference_date": posting_date,
+        }
+    )
+    payment_entry_doc.append(
+        "references",
+        {
+            "allocated_amount": amount,
+            "due_date": due_date,
+            "reference_doctype": "Sales Invoice",
+            "reference_name": invoice_doc.name,
+        },
+    )
+    ensure_child_doctype(payment_entry_doc, "references", "Payment Entry Reference")
+    payment_entry_doc.flags.ignore_permissions = True
+    frappe.flags.ignore_account_permission = True
+    payment_entry_doc.save()
+    payment_entry_doc.submit()
+    return payment_entry_doc
+
+
 def redeeming_customer_credit(
     invoice_doc, data, is_payment_entry, total_cash, cash_account, payments
 ):
-    # redeeming customer credit with journal voucher
+    # redeeming customer credit with a single journal voucher
     today = nowdate()
     if data.get("redeemed_customer_credit"):
-        cost_center = frappe.get_value(
-            "POS Profile", invoice_doc.pos_profile, "cost_center"
-        )
-        if not cost_center:
-            cost_center = frappe.get_value(
-                "Company", invoice_doc.company, "cost_center"
-            )
-        if not cost_center:
-            frappe.throw(
-                _("Cost Center is not set in pos profile {}").format(
-                    invoice_doc.pos_profile
-                )
-            )
-        for row in data.get("customer_credit_dict"):
-            if row["type"] == "Invoice" and row["credit_to_redeem"]:
-                outstanding_invoice = frappe.get_doc(
-                    "Sales Invoice", row["credit_origin"]
-                )
-
-                jv_doc = frappe.get_doc(
-                    {
-                        "doctype": "Journal Entry",
-                        "voucher_type": "Journal Entry",
-                        "posting_date": today,
-                        "company": invoice_doc.company,
-                    }
+        cost_center = get_credit_cost_center(invoice_doc)
+        credits = {}
+        for row in data.get("customer_credit_dict") or []:
+            if row["type"] == "Invoice" and flt(row["credit_to_redeem"]):
+                credits[row["credit_origin"]] = credits.get(row["credit_origin"], 0) + flt(
+                    row["credit_to_redeem"]
                 )
-
-                debit_row = jv_doc.append("accounts", {})
-                debit_row.update(
-                    {
-                        "account": outstanding_invoice.debit_to,
-                        "party_type": "Customer",
-                        "party": invoice_doc.customer,
-                        "reference_type": "Sales Invoice",
-                        "reference_name": outstanding_invoice.name,
-                        "debit_in_account_currency": row["credit_to_redeem"],
-                        "cost_center": cost_center,
-                    }
-                )
-
-                credit_row = jv_doc.append("accounts", {})
-                credit_row.update(
-                    {
-                        "account": invoice_doc.debit_to,
-                        "party_type": "Customer",
-                        "party": invoice_doc.customer,
-                        "reference_type": "Sales Invoice",
-                        "reference_name": invoice_doc.name,
-                        "credit_in_account_currency": row["credit_to_redeem"],
-                        "cost_center": cost_center,
-                    }
-                )
-
-                ensure_child_doctype(jv_doc, "accounts", "Journal Entry Account")
-
-                jv_doc.flags.ignore_permissions = True
-                frappe.flags.ignore_account_permission = True
-                jv_doc.set_missing_values()
-                try:
-                    jv_doc.save()
-                    jv_doc.submit()
-                except Exception as e:
-                    frappe.log_error(frappe.get_traceback(), "POSAwesome JV Error")
-                    frappe.throw(
-                        _("Unable to create Journal Entry for customer credit.")
-                    )
+        if credits:
+            create_credit_journal_entry(invoice_doc, credits, cost_center, today)
 
     if is_payment_entry and total_cash > 0:
+        # A Payment Entry has a single paid to account and mode of payment, so
+        # rows sharing both are paid with one entry
+        amounts = {}
         for payment in payments:
             if not payment.amount:
                 continue
-            payment_entry_doc = frappe.get_doc(
-                {
-                    "doctype": "Payment Entry",
-                    "posting_date": today,
-                    "payment_type": "Receive",
-                    "party_type": "Customer",
-                    "party": invoice_doc.customer,
-                    "paid_amount": payment.amount,
-                    "received_amount": payment.amount,
-                    "paid_from": invoice_doc.debit_to,
-                    "paid_to": payment.account,
-                    "company": invoice_doc.company,
-                    "mode_of_payment": payment.mode_of_payment,
-                    "reference_no": invoice_doc.posa_pos_opening_shift,
-                    "reference_date": today,
-                }
-            )
-
-            payment_reference = {
-                "allocated_amount": payment.amount,
-                "due_date": data.get("due_date"),
-                "reference_doctype": "Sales Invoice",
-                "reference_name": invoice_doc.name,
-            }
-
-            ref_row = payment_entry_doc.append("references", {})
-            ref_row.update(payment_reference)
-            ensure_child_doctype(
-                payment_entry_doc, "references", "Payment Entry Reference"
+            key = (payment.mode_of_payment, payment.account)
+            amounts[key] = amounts.get(key, 0) + flt(payment.amount)
+        for (mode_of_payment, account), amount in amounts.items():
+            create_invoice_payment_entry(
+                invoice_doc, mode_of_payment, account, amount, data.get("due_date"), today
             )
-            payment_entry_doc.flags.ignore_permissions = True
-            frappe.flags.ignore_account_permission = True
-            payment_entry_doc.save()
-            payment_entry_doc.submit()
 
 
 @frappe.whitelist()
+@track_perf
 def get_available_credit(customer, company):
     total_credit = []
 
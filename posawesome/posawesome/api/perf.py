@@ -0,0 +1,230 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Latency and query instrumentation for the POS API.
+
+Every whitelisted POS endpoint is wrapped with :func:`track_perf`. A call
+records its wall time, the number and time of SQL statements it ran and
+its Redis cache hits and misses. The response size is added from the
+``after_request`` hook. Samples are added with one pipelined round trip
+to a per endpoint hash per ten minute window, holding the totals and a
+log scale latency histogram. Windows expire after a day, so the stats
+are rolling and bounded in size. Set ``posa_disable_perf_stats`` in the
+site config to switch recording off.
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+import time
+
+import frappe
+from frappe.utils import cint, flt
+
+PERF_KEY = "posa_perf"
+PERF_ENDPOINTS_KEY = "posa_perf_endpoints"
+PERF_WINDOW_SECONDS = 600
+PERF_RETENTION_SECONDS = 86400
+DEFAULT_STATS_MINUTES = 60
+
+# Histogram buckets are quarter octaves of milliseconds: bucket ``b`` holds
+# calls up to 2 ** (b / 4) ms, so percentiles are within about 19%
+BUCKETS_PER_OCTAVE = 4
+MAX_BUCKET = 100
+
+ENDPOINT_PREFIX = "posawesome.posawesome.api."
+
+
+def _window(timestamp=None):
+	return int((timestamp or time.time()) // PERF_WINDOW_SECONDS)
+
+
+def _window_key(endpoint, window):
+	return frappe.cache().make_key(f"{PERF_KEY}:{endpoint}:{window}")
+
+
+def _bucket(duration_ms):
+	if duration_ms <= 1:
+		return 0
+	return min(math.ceil(BUCKETS_PER_OCTAVE * math.log2(duration_ms)), MAX_BUCKET)
+
+
+def _bucket_bound(bucket):
+	return 2 ** (bucket / BUCKETS_PER_OCTAVE)
+
+
+def _is_enabled():
+	return not frappe.conf.get("posa_disable_perf_stats")
+
+
+def _install_cache_counters():
+	"""Count hits and misses of cache reads made during an instrumented call.
+
+	The cache client is shared by the threads of a worker, so it is wrapped
+	once and the counters live on ``frappe.local``.
+	"""
+	cache = frappe.cache()
+	if getattr(cache, "posa_perf_counters", False):
+		return
+
+	def counting(method):
+		@functools.wraps(method)
+		def wrapper(*args, **kwargs):
+			value = method(*args, **kwargs)
+			perf = getattr(frappe.local, "posa_perf", None)
+			if perf is not None:
+				perf["cache_hits" if value is not None else "cache_misses"] += 1
+			return value
+
+		return wrapper
+
+	cache.get_value = counting(cache.get_value)
+	cache.hget = counting(cache.hget)
+	cache.posa_perf_counters = True
+
+
+def record_sample(endpoint, duration_ms, queries=0, query_ms=0, cache_hits=0, cache_misses=0):
+	"""Add one call of ``endpoint`` to its current window."""
+	key = _window_key(endpoint, _window())
+	pipe = frappe.cache().pipeline()
+	pipe.hincrby(key, "calls", 1)
+	pipe.hincrbyfloat(key, "duration_ms", duration_ms)
+	pipe.hincrby(key, "queries", queries)
+	pipe.hincrbyfloat(key, "query_ms", query_ms)
+	pipe.hincrby(key, "cache_hits", cache_hits)
+	pipe.hincrby(key, "cache_misses", cache_misses)
+	pipe.hincrby(key, f"b{_bucket(duration_ms)}", 1)
+	pipe.expire(key, PERF_RETENTION_SECONDS)
+	pipe.sadd(frappe.cache().make_key(PERF_ENDPOINTS_KEY), endpoint)
+	pipe.execute()
+	return key
+
+
+def track_perf(fn):
+	"""Record latency, query and cache metrics of a whitelisted POS endpoint.
+
+	Apply it below ``@frappe.whitelist()``. Only the outermost instrumented
+	call is recorded, so endpoints calling each other are not counted twice.
+	"""
+	endpoint = f"{fn.__module__}.{fn.__qualname__}".removeprefix(ENDPOINT_PREFIX)
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		if getattr(frappe.local, "posa_perf", None) is not None or not getattr(frappe.local, "db", None):
+			return fn(*args, **kwargs)
+		if not _is_enabled():
+			return fn(*args, **kwargs)
+
+		_install_cache_counters()
+		perf = frappe.local.posa_perf = {"queries": 0, "query_ms": 0.0, "cache_hits": 0, "cache_misses": 0}
+		original_sql = frappe.db.sql
+
+		def timed_sql(*sql_args, **sql_kwargs):
+			started = time.perf_counter()
+			try:
+				return original_sql(*sql_args, **sql_kwargs)
+			finally:
+				perf["queries"] += 1
+				perf["query_ms"] += (time.perf_counter() - started) * 1000
+
+		frappe.db.sql = timed_sql
+		started = time.perf_counter()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			duration_ms = (time.perf_counter() - started) * 1000
+			frappe.db.sql = original_sql
+			frappe.local.posa_perf = None
+			try:
+				frappe.local.posa_perf_window = record_sample(endpoint, duration_ms, **perf)
+			except Exception:
+				# Metrics must never fail a POS request
+				frappe.local.posa_perf_window = None
+
+	return wrapper
+
+
+def record_response_size(response=None, request=None):
+	"""``after_request`` hook adding the response size to the endpoint's window."""
+	key = getattr(frappe.local, "posa_perf_window", None)
+	if not key or response is None:
+		return
+	frappe.local.posa_perf_window = None
+	try:
+		size = response.calculate_content_length()
+		if size is not None:
+			pipe = frappe.cache().pipeline()
+			pipe.hincrby(key, "response_bytes", size)
+			pipe.execute()
+	except Exception:
+		pass
+
+
+def _percentile(buckets, total, fraction):
+	threshold = total * fraction
+	seen = 0
+	for bucket in sorted(buckets):
+		seen += buckets[bucket]
+		if seen >= threshold:
+			return round(_bucket_bound(bucket), 2)
+	return None
+
+
+def summarize(endpoint, windows):
+	"""Merge the stored windows of an endpoint into one stats row."""
+	totals = {}
+	buckets = {}
+	for window in windows:
+		for field, value in window.items():
+			field = frappe.safe_decode(field)
+			if field.startswith("b") and field[1:].isdigit():
+				buckets[cint(field[1:])] = buckets.get(cint(field[1:]), 0) + cint(value)
+			else:
+				totals[field] = totals.get(field, 0) + flt(frappe.safe_decode(value))
+
+	calls = cint(totals.get("calls"))
+	if not calls:
+		return None
+	cache_reads = totals.get("cache_hits", 0) + totals.get("cache_misses", 0)
+	return frappe._dict(
+		endpoint=endpoint,
+		calls=calls,
+		total_ms=flt(totals.get("duration_ms"), 2),
+		avg_ms=flt(totals.get("duration_ms") / calls, 2),
+		p50_ms=_percentile(buckets, calls, 0.5),
+		p95_ms=_percentile(buckets, calls, 0.95),
+		p99_ms=_percentile(buckets, calls, 0.99),
+		avg_queries=flt(totals.get("queries", 0) / calls, 2),
+		avg_query_ms=flt(totals.get("query_ms", 0) / calls, 2),
+		avg_response_bytes=cint(totals.get("response_bytes", 0) / calls),
+		cache_hit_ratio=flt(totals.get("cache_hits", 0) / cache_reads, 4) if cache_reads else None,
+	)
+
+
+@frappe.whitelist()
+def get_pos_perf_stats(minutes=DEFAULT_STATS_MINUTES):
+	"""Return per endpoint latency percentiles and averages for the last ``minutes``."""
+	frappe.only_for("System Manager")
+
+	cache = frappe.cache()
+	minutes = min(max(cint(minutes) or DEFAULT_STATS_MINUTES, 1), PERF_RETENTION_SECONDS // 60)
+	current = _window()
+	windows = range(current - math.ceil(minutes * 60 / PERF_WINDOW_SECONDS) + 1, current + 1)
+	endpoints = sorted(frappe.safe_decode(endpoint) for endpoint in cache.smembers(PERF_ENDPOINTS_KEY))
+
+	# Raw pipelines do not prefix keys, _window_key already does
+	pipe = cache.pipeline()
+	for endpoint in endpoints:
+		for window in windows:
+			pipe.hgetall(_window_key(endpoint, window))
+	results = pipe.execute()
+
+	stats = []
+	per_endpoint = len(windows)
+	for index, endpoint in enumerate(endpoints):
+		row = summarize(endpoint, results[index * per_endpoint : (index + 1) * per_endpoint])
+		if row:
+			stats.append(row)
+	stats.sort(key=lambda row: row.total_ms, reverse=True)
+	return {"minutes": minutes, "window_seconds": PERF_WINDOW_SECONDS, "endpoints": stats}
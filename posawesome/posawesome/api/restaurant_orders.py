@@ -2,13 +2,23 @@
 # Copyright (c) 2025, Youssef Restom and contributors
 # For license information, please see license.txt
 
+import base64
 import json
 import frappe
 from frappe import _
-from frappe.utils import nowdate, now_datetime, getdate
+from frappe.utils import cint, flt, nowdate, now_datetime, getdate
+from posawesome.posawesome.api.kot_renderer import (
+	get_kot_print_width,
+	get_order_type_name,
+	render_kot_escpos,
+	render_kot_html,
+)
+from posawesome.posawesome.api import order_consolidation as consolidation
 from posawesome.posawesome.api.sales_orders import submit_sales_order, update_sales_order
+from posawesome.posawesome.api.perf import track_perf
 
 @frappe.whitelist()
+@track_perf
 def get_restaurant_order_types():
 	"""Get all enabled restaurant order types"""
 	return frappe.get_all(
@@ -19,6 +29,7 @@ def get_restaurant_order_types():
 	)
 
 @frappe.whitelist()
+@track_perf
 def get_available_tables():
 	"""Get all available tables for dine-in orders"""
 	return frappe.get_all(
@@ -29,6 +40,7 @@ def get_available_tables():
 	)
 
 @frappe.whitelist()
+@track_perf
 def get_pos_profiles():
 	"""Get all enabled POS profiles for counter filtering"""
 	return frappe.get_all(
@@ -39,6 +51,7 @@ def get_pos_profiles():
 	)
 
 @frappe.whitelist()
+@track_perf
 def create_restaurant_order(order_data):
 	"""Create a restaurant order (Sales Order) with order type and table info"""
 	if isinstance(order_data, str):
@@ -131,6 +144,12 @@ def create_restaurant_order(order_data):
 	if auto_print_kot and sales_order:
 		try:
 			kot_data = generate_kot_print(order_data)
+			kot_sequence = next_kot_sequence(sales_order.name)
+			kot_data.update({
+				"kot_number": format_kot_number(sales_order.name, kot_sequence),
+				"kot_sequence": kot_sequence,
+				"order_number": sales_order.name
+			})
 			result = {
 				"sales_order": sales_order,
 				"kot_data": kot_data,
@@ -143,6 +162,7 @@ def create_restaurant_order(order_data):
 	return result
 
 @frappe.whitelist()
+@track_perf
 def submit_restaurant_order(order_data):
 	"""Submit a restaurant order and handle table occupation"""
 	if isinstance(order_data, str):
@@ -188,6 +208,7 @@ def submit_restaurant_order(order_data):
 	return result
 
 @frappe.whitelist()
+@track_perf
 def debug_order_conversion_readiness(sales_order_name):
 	"""Debug function to check if an order is ready for single conversion"""
 	try:
@@ -261,6 +282,7 @@ def validate_single_order_for_conversion(sales_order_name):
 		return False, f"Error validating order {sales_order_name}: {str(e)}"
 
 @frappe.whitelist()
+@track_perf
 def convert_order_to_invoice(sales_order_name, pos_profile_name=None):
 	"""Convert a SINGLE Sales Order to Sales Invoice for payment - ENHANCED with direct safe conversion"""
 	try:
@@ -504,6 +526,7 @@ def convert_order_to_invoice(sales_order_name, pos_profile_name=None):
 
 
 @frappe.whitelist()
+@track_perf
 def get_restaurant_orders(pos_opening_shift=None, order_type=None, status=None, date_filter=None, pos_profile_name=None):
 	"""Get restaurant orders with filtering options"""
 	filters = {
@@ -614,6 +637,7 @@ def get_restaurant_orders(pos_opening_shift=None, order_type=None, status=None,
 	return valid_orders
 
 @frappe.whitelist()
+@track_perf
 def cancel_restaurant_order(sales_order_name):
 	"""Cancel restaurant order and free table if applicable"""
 	sales_order = frappe.get_doc("Sales Order", sales_order_name)
@@ -640,6 +664,7 @@ def cancel_restaurant_order(sales_order_name):
 	return {"success": True, "message": _("Order cancelled successfully")}
 
 @frappe.whitelist()
+@track_perf
 def delete_restaurant_order(sales_order_name):
 	"""Delete draft restaurant order and free table if applicable"""
 	sales_order = frappe.get_doc("Sales Order", sales_order_name)
@@ -670,6 +695,7 @@ def delete_restaurant_order(sales_order_name):
 	return {"success": True, "message": _("Order deleted successfully")}
 
 @frappe.whitelist()
+@track_perf
 def get_table_status():
 	"""Get current status of all tables"""
 	tables = frappe.get_all(
@@ -697,6 +723,7 @@ def get_table_status():
 	return tables
 
 @frappe.whitelist()
+@track_perf
 def setup_restaurant_data():
 	"""Setup default restaurant order types and sample tables"""
 	from posawesome.posawesome.doctype.restaurant_order_type.restaurant_order_type import create_default_order_types
@@ -712,6 +739,7 @@ def setup_restaurant_data():
 	}
 
 @frappe.whitelist()
+@track_perf
 def generate_kot_print(order_data):
 	"""Generate Kitchen Order Ticket (KOT) print data without creating Sales Order"""
 	if isinstance(order_data, str):
@@ -721,22 +749,9 @@ def generate_kot_print(order_data):
 	if not order_data.get("items"):
 		frappe.throw(_("No items found for KOT printing"))
 	
-	# Get print width from POS profile if available
-	print_width = "58mm"  # Default width
-	try:
-		pos_profile_name = order_data.get("pos_profile")
-		if pos_profile_name:
-			print_width = frappe.db.get_value("POS Profile", pos_profile_name, "posa_kot_print_width") or "58mm"
-	except:
-		pass  # Use default if profile not found
-	
-	order_type_name = ""
-	if order_data.get("restaurant_order_type"):
-		try:
-			order_type_doc = frappe.get_doc("Restaurant Order Type", order_data.get("restaurant_order_type"))
-			order_type_name = order_type_doc.order_type_name
-		except:
-			order_type_name = order_data.get("restaurant_order_type")
+	# Print width and order type name come from the document cache
+	print_width = get_kot_print_width(order_data.get("pos_profile"))
+	order_type_name = get_order_type_name(order_data.get("restaurant_order_type"))
 	
 	# Prepare KOT data
 	kot_data = {
@@ -768,29 +783,78 @@ def generate_kot_print(order_data):
 	
 	return kot_data
 
-def generate_void_kot_print(sales_order, voided_items):
+def next_kot_sequence(order_name):
+	"""Increment and return the KOT sequence of a restaurant order.
+	
+	The row is locked while reading so concurrent additions to the same table
+	never receive the same sequence number. Returns ``None`` when the
+	``posa_kot_sequence`` field has not been installed yet.
+	"""
+	if not frappe.db.has_column("Sales Order", "posa_kot_sequence"):
+		return None
+	
+	sequence = cint(frappe.db.get_value("Sales Order", order_name, "posa_kot_sequence", for_update=True)) + 1
+	frappe.db.set_value("Sales Order", order_name, "posa_kot_sequence", sequence, update_modified=False)
+	return sequence
+
+def format_kot_number(order_name, kot_sequence, prefix="KOT"):
+	"""Build a KOT number from the order and its sequence (falls back to a timestamp)"""
+	if kot_sequence:
+		return f"{prefix}-{order_name}-{kot_sequence}"
+	return f"{prefix}-{now_datetime().strftime('%Y%m%d-%H%M%S')}"
+
+def generate_delta_kot_print(sales_order, added_items, kot_sequence=None):
+	"""Generate Kitchen Order Ticket (KOT) print data for items added to an existing order.
+	
+	Only the quantities passed in ``added_items`` are printed, so the kitchen
+	sees exactly what is new instead of the whole order.
+	"""
+	kot_data = generate_kot_print({
+		"items": added_items,
+		"pos_profile": sales_order.get("pos_profile"),
+		"restaurant_order_type": sales_order.get("restaurant_order_type"),
+		"table_number": sales_order.get("table_number"),
+		"customer": sales_order.customer,
+		"customer_name": sales_order.customer_name,
+	})
+	
+	kot_data.update({
+		"kot_number": format_kot_number(sales_order.name, kot_sequence),
+		"kot_sequence": kot_sequence,
+		"order_number": sales_order.name,
+		"is_additional": True,
+	})
+	
+	return kot_data
+
+def _get_added_kot_items(items_data):
+	"""Aggregate the quantities of newly added items per (item_code, uom) for a delta KOT"""
+	added_items = {}
+	for item_data in items_data:
+		key = (item_data.get("item_code"), item_data.get("uom"))
+		if key not in added_items:
+			added_items[key] = {
+				"item_code": item_data.get("item_code"),
+				"item_name": item_data.get("item_name") or item_data.get("item_code"),
+				"qty": 0,
+				"uom": item_data.get("uom"),
+				"special_instructions": item_data.get("special_instructions") or "",
+			}
+		added_items[key]["qty"] += flt(item_data.get("qty", 1))
+	
+	return [item for item in added_items.values() if item["qty"] > 0]
+
+def generate_void_kot_print(sales_order, voided_items, kot_sequence=None):
 	"""Generate Kitchen Order Ticket (KOT) print data for voided items"""
 	
-	# Get print width from POS profile if available
-	print_width = "58mm"  # Default width
-	try:
-		if hasattr(sales_order, 'pos_profile') and sales_order.pos_profile:
-			print_width = frappe.db.get_value("POS Profile", sales_order.pos_profile, "posa_kot_print_width") or "58mm"
-	except:
-		pass  # Use default if profile not found
-	
-	# Get order type name
-	order_type_name = ""
-	if sales_order.restaurant_order_type:
-		try:
-			order_type_doc = frappe.get_doc("Restaurant Order Type", sales_order.restaurant_order_type)
-			order_type_name = order_type_doc.order_type_name
-		except:
-			order_type_name = sales_order.restaurant_order_type
+	# Print width and order type name come from the document cache
+	print_width = get_kot_print_width(sales_order.get("pos_profile"))
+	order_type_name = get_order_type_name(sales_order.restaurant_order_type)
 	
 	# Prepare Void KOT data
 	void_kot_data = {
-		"kot_number": f"VOID-KOT-{now_datetime().strftime('%Y%m%d-%H%M%S')}",
+		"kot_number": format_kot_number(sales_order.name, kot_sequence, prefix="VOID-KOT"),
+		"kot_sequence": kot_sequence,
 		"order_number": sales_order.name,
 		"order_type": order_type_name or _("Standard"),
 		"table_number": sales_order.table_number or "",
@@ -822,8 +886,9 @@ def generate_void_kot_print(sales_order, voided_items):
 	return void_kot_data
 
 @frappe.whitelist()
-def reprint_kot(order_name):
-	"""Reprint KOT for an existing order"""
+@track_perf
+def reprint_kot(order_name, output_format="html"):
+	"""Reprint KOT for an existing order as HTML or a base64 encoded ESC/POS stream"""
 	try:
 		# Get the sales order
 		sales_order = frappe.get_doc("Sales Order", order_name)
@@ -850,6 +915,9 @@ def reprint_kot(order_name):
 				"special_instructions": getattr(item, 'special_instructions', '') or ''
 			})
 		
+		if output_format == "escpos":
+			return generate_kot_escpos(order_data)
+		
 		# Generate KOT HTML
 		kot_html = generate_kot_html(order_data)
 		
@@ -860,102 +928,25 @@ def reprint_kot(order_name):
 		frappe.throw(f"Error reprinting KOT: {str(e)}")
 
 @frappe.whitelist()
+@track_perf
 def generate_kot_html(order_data):
-	"""Generate KOT HTML for printing"""
+	"""Generate KOT HTML for printing using the compiled template for the profile's print width"""
 	if isinstance(order_data, str):
 		order_data = json.loads(order_data)
 	
-	kot_data = generate_kot_print(order_data)
-	
-	# Generate KOT HTML template
-	items_html = ""
-	for item in kot_data["items"]:
-		items_html += f"""
-		<tr>
-			<td style="padding: 2px 0; border-bottom: 1px dotted #ccc;">
-				{item['item_name']}
-			</td>
-			<td style="padding: 2px 0; text-align: center; border-bottom: 1px dotted #ccc;">
-				{item['qty']} {item['uom']}
-			</td>
-		</tr>"""
-	
-	table_info = f"<p><strong>Table:</strong> {kot_data['table_number']}</p>" if kot_data["table_number"] else ""
-	notes_section = f"<p style='margin-top: 5px; font-style: italic;'>{kot_data['special_notes']}</p>" if kot_data["special_notes"] else ""
-	
-	kot_html = f"""
-	<!DOCTYPE html>
-	<html>
-	<head>
-		<meta charset="utf-8">
-		<title>KOT {kot_data['kot_number']}</title>
-		<style>
-			body {{ font-family: 'Courier New', monospace; width: 58mm; margin: 0; padding: 5px; font-size: 10px; line-height: 1.2; }}
-			.header {{ text-align: center; border-bottom: 1px solid #000; padding-bottom: 5px; margin-bottom: 8px; }}
-			.kot-title {{ font-size: 12px; font-weight: bold; margin: 2px 0; }}
-			.kot-info {{ margin: 8px 0; font-size: 9px; }}
-			.kot-info p {{ margin: 2px 0; }}
-			.items-table {{ width: 100%; border-collapse: collapse; margin: 8px 0; font-size: 9px; }}
-			.items-table th {{ border-bottom: 1px solid #000; padding: 2px 0; text-align: left; font-weight: bold; font-size: 8px; }}
-			.items-table td {{ padding: 2px 0; vertical-align: top; }}
-			.footer {{ border-top: 1px solid #000; padding-top: 5px; margin-top: 8px; text-align: center; font-size: 9px; }}
-			.dashed-line {{ border-top: 1px dotted #000; margin: 5px 0; }}
-			@media print {{
-				body {{ margin: 0; padding: 2px; width: 58mm; }}
-			}}
-		</style>
-	</head>
-	<body>
-		<div class="header">
-			<h2 class="kot-title">KITCHEN ORDER TICKET</h2>
-			<p><strong>KOT #:</strong> {kot_data['kot_number']}</p>
-		</div>
-		
-		<div class="kot-info">
-			<p><strong>Type:</strong> {kot_data['order_type']}</p>
-			{table_info}
-			<p><strong>Customer:</strong> {kot_data['customer_name']}</p>
-			<p><strong>Date & Time:</strong> {kot_data['datetime']}</p>
-		</div>
-		
-		<div class="dashed-line"></div>
-		
-		<table class="items-table">
-			<thead>
-				<tr>
-					<th style="width: 60%;">ITEM</th>
-					<th style="width: 40%; text-align: center;">QTY</th>
-				</tr>
-			</thead>
-			<tbody>
-				{items_html}
-			</tbody>
-		</table>
-		
-		<div class="dashed-line"></div>
-		
-		<div class="kot-info">
-			<p><strong>Total Items:</strong> {kot_data['total_items']}</p>
-			{notes_section}
-		</div>
-		
-		<div class="footer">
-			<p><strong>*** KITCHEN COPY ***</strong></p>
-			<p>Please prepare items as ordered</p>
-		</div>
-		
-		<script>
-			window.onload = function() {{
-				window.print();
-			}};
-		</script>
-	</body>
-	</html>
-	"""
+	return render_kot_html(generate_kot_print(order_data))
+
+@frappe.whitelist()
+@track_perf
+def generate_kot_escpos(order_data):
+	"""Generate a base64 encoded ESC/POS byte stream for raw network kitchen printers"""
+	if isinstance(order_data, str):
+		order_data = json.loads(order_data)
 	
-	return kot_html
+	return base64.b64encode(render_kot_escpos(generate_kot_print(order_data))).decode()
 
 @frappe.whitelist()
+@track_perf
 def create_invoice_from_multiple_orders(sales_orders, pos_profile_name=None):
 	"""Create a single invoice from multiple sales orders"""
 	if isinstance(sales_orders, str):
@@ -965,145 +956,26 @@ def create_invoice_from_multiple_orders(sales_orders, pos_profile_name=None):
 		frappe.throw(_("No sales orders provided"))
 	
 	try:
-		# Validate all orders exist and submit draft orders
-		orders = []
-		for order_name in sales_orders:
-			order = frappe.get_doc("Sales Order", order_name)
-			
-			# Submit draft orders automatically
-			if order.docstatus == 0:
-				order.submit()
-				frappe.db.commit()
-				
-			if order.docstatus != 1:
-				frappe.throw(_("Order {0} could not be submitted").format(order_name))
-			if order.per_billed >= 100:
-				frappe.throw(_("Order {0} is already fully billed").format(order_name))
-			orders.append(order)
-		
-		# Validate all orders are from the same customer
-		first_customer = orders[0].customer
-		if not all(order.customer == first_customer for order in orders):
-			frappe.throw(_("All orders must be from the same customer"))
-		
-		# Use the first order as the base for the invoice
-		base_order = orders[0]
+		# Validate all orders with one query, then submit draft orders automatically
+		orders = consolidation.validate_orders(consolidation.load_orders(sales_orders))
+		consolidation.submit_draft_orders(orders)
 		
-		# Create invoice from the first order using ERPNext's built-in method
-		from erpnext.selling.doctype.sales_order.sales_order import make_sales_invoice
-		invoice_doc = make_sales_invoice(base_order.name)
-		
-		# Set POS specific fields
-		invoice_doc.is_pos = 1
-		# FORCE DISABLE stock update for restaurant orders to avoid stock validation issues
-		invoice_doc.update_stock = 0
-		
-		if len(orders) > 1:
-			# Add items from additional orders - KEEP SEPARATE LINE ITEMS for proper linking
-			for order in orders[1:]:
-				for item in order.items:
-					# ALWAYS add as separate line item - DO NOT combine quantities
-					# This ensures each Sales Order Item has its own Sales Invoice Item for proper linking
-					new_item = invoice_doc.append("items", {
-						"item_code": item.item_code,
-						"item_name": item.item_name,
-						"description": item.description,
-						"qty": item.qty,
-						"uom": item.uom,
-						"rate": item.rate,
-						"amount": item.qty * item.rate,
-						"warehouse": item.warehouse,
-						"sales_order": order.name,
-						"so_detail": item.name,
-					})
-					
-					# CRITICAL: Ensure the so_detail field is properly set for linking
-					new_item.so_detail = item.name
-					new_item.sales_order = order.name
-			
-			# Recalculate totals
-			invoice_doc.calculate_taxes_and_totals()
+		# Every Sales Order Item gets its own linked Sales Invoice Item
+		invoice_doc = consolidation.build_linked_invoice(orders)
 		
 		# Initialize payment methods from POS Profile
-		# First try to get POS Profile from parameter, then from company settings, then from default
-		if not pos_profile_name:
-			# Try to find a POS Profile for the company
-			pos_profiles = frappe.get_all("POS Profile", 
-				filters={"company": base_order.company, "disabled": 0}, 
-				limit=1)
-			if pos_profiles:
-				pos_profile_name = pos_profiles[0].name
-			else:
-				# Fall back to any enabled POS Profile
-				pos_profiles = frappe.get_all("POS Profile", 
-					filters={"disabled": 0}, 
-					limit=1)
-				if pos_profiles:
-					pos_profile_name = pos_profiles[0].name
-		
-		if pos_profile_name:
-			pos_profile = frappe.get_doc("POS Profile", pos_profile_name)
-			
-			# FORCE DISABLE stock update for restaurant orders to avoid stock validation issues
-			invoice_doc.update_stock = 0
-			
-			# Clear existing payments and add from POS Profile
-			invoice_doc.payments = []
-			
-			for payment_method in pos_profile.payments:
-				payment_entry = {
-					"mode_of_payment": payment_method.mode_of_payment,
-					"amount": 0.0,
-					"base_amount": 0.0,
-					"default": getattr(payment_method, 'default', 0)
-				}
-				
-				# Add optional fields if they exist
-				if hasattr(payment_method, 'account'):
-					payment_entry["account"] = payment_method.account
-				if hasattr(payment_method, 'type'):
-					payment_entry["type"] = payment_method.type
-					
-				invoice_doc.append("payments", payment_entry)
+		pos_profile_name = consolidation.resolve_pos_profile(pos_profile_name, orders[0].company)
+		consolidation.set_pos_profile_payments(invoice_doc, pos_profile_name)
 		
 		# Save the invoice
 		invoice_doc.save()
 		
 		# APPLY SAME LINKING MECHANISM AS SINGLE ORDER
-		# NOTE: We do NOT update Sales Order status here during conversion
-		# Status changes should only happen after successful Sales Invoice submission
-		try:
-			# Prepare Sales Order Item references for linking (but don't mark as billed yet)
-			for item in invoice_doc.items:
-				if item.so_detail:
-					# Only update delivered_qty to maintain order tracking
-					# Do NOT update billed_amt here - that should happen on invoice submission
-					frappe.db.set_value("Sales Order Item", item.so_detail, {
-						"delivered_qty": item.qty
-					})
-			
-			# DO NOT recalculate per_billed or change status here for ANY orders
-			# The Sales Orders should remain in "Submitted" status until payment is completed
-			# Status changes will be handled by the invoice submission process
-			
-			# Commit delivery quantity changes only
-			frappe.db.commit()
-			
-		except Exception as e:
-			# Simplified error handling to avoid logging issues
-			print(f"Warning: Could not update Sales Order item tracking for multiple orders: {str(e)}")
-			# Don't fail the invoice creation if linking fails
+		# Only delivered_qty is tracked here; billing status changes happen on invoice submission
+		consolidation.set_delivered_qty(invoice_doc.items)
 		
 		# Free tables for all dine-in orders
-		for order in orders:
-			if order.get("table_number"):
-				try:
-					table_doc = frappe.get_doc("Restaurant Table", {"table_number": order.table_number})
-					if table_doc.current_order == order.name:
-						table_doc.free_table()
-				except Exception as e:
-					frappe.log_error(f"Failed to free table {order.table_number}: {str(e)}")
-					# Don't fail the invoice creation if table operation fails
+		consolidation.release_tables([order.name for order in orders])
 		
 		return invoice_doc
 		
@@ -1111,7 +983,126 @@ def create_invoice_from_multiple_orders(sales_orders, pos_profile_name=None):
 		frappe.log_error(f"Error creating invoice from multiple orders: {str(e)}")
 		frappe.throw(_("Error creating invoice from orders: {0}").format(str(e)))
 
+# Row fields ``update_child_qty_rate`` does not take from the rows it inserts
+ORDER_ROW_FIELDS = ("warehouse", "price_list_rate", "discount_percentage", "discount_amount")
+
+def _get_order_row_fields():
+	custom_fields = frappe.get_meta("Sales Order Item").get_custom_fields()
+	return ORDER_ROW_FIELDS + tuple(df.fieldname for df in custom_fields)
+
+def _get_trans_item(item_data, docname=None):
+	"""Build a row for ERPNext's ``update_child_qty_rate`` from an order item
+	
+	New rows also carry the warehouse, discount and custom fields the draft path
+	keeps under ``row_fields``; they are applied once ERPNext inserted the rows.
+	"""
+	trans_item = {
+		"item_code": item_data.get("item_code"),
+		"qty": flt(item_data.get("qty", 1)),
+		"uom": item_data.get("uom"),
+		"conversion_factor": flt(item_data.get("conversion_factor")) or 1,
+	}
+	# ERPNext takes a missing rate as 0, new rows without one are priced in
+	# amend_submitted_order_items
+	if item_data.get("rate") not in (None, ""):
+		trans_item["rate"] = flt(item_data.get("rate"))
+	if docname:
+		trans_item["docname"] = docname
+	else:
+		row_fields = {
+			field: item_data.get(field)
+			for field in _get_order_row_fields()
+			if item_data.get(field) not in (None, "")
+		}
+		if row_fields:
+			trans_item["row_fields"] = row_fields
+	if item_data.get("delivery_date"):
+		trans_item["delivery_date"] = item_data.get("delivery_date")
+	return trans_item
+
+def _price_new_row(order, trans_item, row_fields):
+	"""Set the rate of a new row from the order's selling price list and pricing rules"""
+	from erpnext.stock.get_item_details import get_item_details
+	
+	details = get_item_details(
+		{
+			"doctype": "Sales Order",
+			"item_code": trans_item["item_code"],
+			"company": order.company,
+			"customer": order.customer,
+			"currency": order.currency,
+			"conversion_rate": order.conversion_rate,
+			"selling_price_list": order.selling_price_list,
+			"price_list_currency": order.price_list_currency,
+			"plc_conversion_rate": order.plc_conversion_rate,
+			"transaction_date": order.transaction_date,
+			"warehouse": row_fields.get("warehouse") or order.set_warehouse,
+			"uom": trans_item.get("uom"),
+			"conversion_factor": trans_item.get("conversion_factor"),
+			"qty": trans_item.get("qty"),
+		},
+		order.as_dict(),
+		overwrite_warehouse=False,
+	)
+	trans_item["rate"] = flt(details.get("rate")) or flt(details.get("price_list_rate"))
+	for field in ("price_list_rate", "discount_percentage", "discount_amount"):
+		if details.get(field) and field not in row_fields:
+			row_fields[field] = details.get(field)
+
+def _apply_new_row_fields(new_rows, row_fields):
+	"""Write the fields ERPNext left out on the rows it added to the order
+	
+	Rates were passed explicitly, so these fields do not change any amount and
+	are written to the rows directly instead of saving the order again.
+	"""
+	from erpnext.stock.stock_balance import get_reserved_qty, update_bin_qty
+	
+	reserved = set()
+	for item, fields in zip(new_rows, row_fields):
+		if not fields:
+			continue
+		if fields.get("warehouse") and fields["warehouse"] != item.warehouse:
+			reserved.update({(item.item_code, item.warehouse), (item.item_code, fields["warehouse"])})
+		frappe.db.set_value("Sales Order Item", item.name, fields, update_modified=False)
+		item.update(fields)
+	
+	# Move the reservations of re-warehoused rows to their new warehouse
+	for item_code, warehouse in reserved:
+		if warehouse:
+			update_bin_qty(item_code, warehouse, {"reserved_qty": get_reserved_qty(item_code, warehouse)})
+
+def amend_submitted_order_items(order, trans_items):
+	"""Amend the lines of a submitted restaurant order in place.
+	
+	Uses ERPNext's update-items-after-submit path, which inserts new child rows,
+	updates changed quantities and recalculates totals on the submitted order.
+	This avoids cancelling and resubmitting (and the amended copies that creates)
+	every time a table orders another round.
+	"""
+	from erpnext.controllers.accounts_controller import update_child_qty_rate
+	
+	existing_rows = {item.name for item in order.items}
+	row_fields = []
+	for trans_item in trans_items:
+		if not trans_item.get("docname"):
+			fields = trans_item.pop("row_fields", None) or {}
+			if "rate" not in trans_item:
+				_price_new_row(order, trans_item, fields)
+			row_fields.append(fields)
+			if not trans_item.get("delivery_date"):
+				trans_item["delivery_date"] = order.delivery_date
+	
+	update_child_qty_rate("Sales Order", json.dumps(trans_items, default=str), order.name)
+	order = frappe.get_doc("Sales Order", order.name)
+	
+	if any(row_fields):
+		# New rows are appended in the order of their trans items
+		new_rows = [item for item in order.items if item.name not in existing_rows]
+		_apply_new_row_fields(new_rows, row_fields)
+	return order
+
 @frappe.whitelist()
+@track_perf
 def add_items_to_draft_order(order_name, items_data):
 	"""Add new items to a draft sales order (easier than submitted orders)"""
 	if isinstance(items_data, str):
@@ -1158,14 +1149,23 @@ def add_items_to_draft_order(order_name, items_data):
 		order.calculate_taxes_and_totals()
 		order.save()
 		
+		# Send only the newly added quantities to the kitchen
+		kot_sequence = next_kot_sequence(order.name)
+		kot_data = generate_delta_kot_print(order, _get_added_kot_items(items_data), kot_sequence)
+		
 		frappe.log_error(f"Successfully added items to draft Sales Order: {order.name}", "Add Items to Draft Success")
-		return order
+		return {
+			"sales_order": order,
+			"kot_data": kot_data,
+			"kot_sequence": kot_sequence
+		}
 		
 	except Exception as e:
 		frappe.log_error(f"Error adding items to draft order {order_name}: {str(e)} - Type: {type(e).__name__}", "Add Items to Draft Error")
 		frappe.throw(_("Error adding items to order: {0}").format(str(e)))
 
 @frappe.whitelist()
+@track_perf
 def add_items_to_existing_order(order_name, items_data):
 	"""Add new items to an existing submitted sales order"""
 	if isinstance(items_data, str):
@@ -1201,29 +1201,14 @@ def add_items_to_existing_order(order_name, items_data):
 		if order.per_billed >= 100:
 			frappe.throw(_("Cannot add items to fully billed orders"))
 		
-		# Store existing items
-		existing_items = [item.as_dict() for item in order.items]
-		
-		# Cancel the order to allow modifications
-		order.cancel()
-		
-		# Keep existing items and add new ones
-		order.items = []
-		
-		# Re-add existing items and merge with new items
+		# Start from the current lines (all of them must be passed or ERPNext removes
+		# them), keyed by (item_code + rate + uom) for merging
+		trans_items = []
 		existing_items_dict = {}
-		for item_data in existing_items:
-			# Remove some auto-generated fields that might cause issues
-			item_data.pop('name', None)
-			item_data.pop('creation', None)
-			item_data.pop('modified', None)
-			item_data.pop('modified_by', None)
-			item_data.pop('owner', None)
-			item_data.pop('docstatus', None)
-			
-			# Create a key for grouping items (item_code + rate + uom)
-			item_key = f"{item_data.get('item_code')}_{item_data.get('rate')}_{item_data.get('uom')}"
-			existing_items_dict[item_key] = item_data
+		for existing in order.items:
+			trans_item = _get_trans_item(existing.as_dict(), existing.name)
+			trans_items.append(trans_item)
+			existing_items_dict.setdefault(f"{existing.item_code}_{existing.rate}_{existing.uom}", trans_item)
 		
 		# Process new items - merge with existing or add as new
 		for item_data in items_data:
@@ -1231,26 +1216,27 @@ def add_items_to_existing_order(order_name, items_data):
 			
 			if item_key in existing_items_dict:
 				# Increment quantity of existing item
-				existing_items_dict[item_key]['qty'] += item_data.get('qty', 1)
-				# Recalculate amount
-				existing_items_dict[item_key]['amount'] = existing_items_dict[item_key]['qty'] * existing_items_dict[item_key]['rate']
+				existing_items_dict[item_key]["qty"] += flt(item_data.get("qty", 1))
 				frappe.log_error(f"Incremented qty for existing item {item_data.get('item_code')}: {existing_items_dict[item_key]['qty']}", "Add Items Debug")
 			else:
 				# Add as new item
-				existing_items_dict[item_key] = item_data
+				existing_items_dict[item_key] = _get_trans_item(item_data)
+				trans_items.append(existing_items_dict[item_key])
 				frappe.log_error(f"Added new item {item_data.get('item_code')}", "Add Items Debug")
 		
-		# Add all items (existing + new) to the order
-		for item_data in existing_items_dict.values():
-			order.append("items", item_data)
+		# Amend the submitted order in place instead of cancel/amend/resubmit
+		order = amend_submitted_order_items(order, trans_items)
 		
-		# Recalculate and resubmit
-		order.calculate_taxes_and_totals()
-		order.save()
-		order.submit()
+		# Send only the newly added quantities to the kitchen
+		kot_sequence = next_kot_sequence(order.name)
+		kot_data = generate_delta_kot_print(order, _get_added_kot_items(items_data), kot_sequence)
 		
 		frappe.log_error(f"Successfully added items to Sales Order: {order.name}", "Add Items Success")
-		return order
+		return {
+			"sales_order": order,
+			"kot_data": kot_data,
+			"kot_sequence": kot_sequence
+		}
 		
 	except frappe.DoesNotExistError as e:
 		frappe.log_error(f"Sales Order {order_name} not found - DoesNotExistError: {str(e)}", "Add Items Error")
@@ -1260,6 +1246,7 @@ def add_items_to_existing_order(order_name, items_data):
 		frappe.throw(_("Error adding items to order: {0}").format(str(e)))
 
 @frappe.whitelist()
+@track_perf
 def update_submitted_order_items(order_name, items_data):
 	"""Update items in a submitted sales order"""
 	if isinstance(items_data, str):
@@ -1295,18 +1282,16 @@ def update_submitted_order_items(order_name, items_data):
 		if order.per_billed >= 100:
 			frappe.throw(_("Cannot update fully billed orders"))
 		
-		# Cancel the order to allow modifications
-		order.cancel()
+		# Existing lines are matched by their row name, everything else is a new line.
+		# Lines missing from items_data are removed by ERPNext's update items path.
+		existing_rows = {item.name for item in order.items}
+		trans_items = [
+			_get_trans_item(item_data, item_data.get("name") if item_data.get("name") in existing_rows else None)
+			for item_data in items_data
+		]
 		
-		# Update items
-		order.items = []
-		for item_data in items_data:
-			order.append("items", item_data)
-		
-		# Recalculate and resubmit
-		order.calculate_taxes_and_totals()
-		order.save()
-		order.submit()
+		# Amend the submitted order in place instead of cancel/amend/resubmit
+		order = amend_submitted_order_items(order, trans_items)
 		
 		frappe.log_error(f"Successfully updated Sales Order: {order.name}", "Update Order Success")
 		return order
@@ -1319,6 +1304,7 @@ def update_submitted_order_items(order_name, items_data):
 		frappe.throw(_("Error updating order: {0}").format(str(e)))
 
 @frappe.whitelist()
+@track_perf
 def load_multiple_draft_orders_for_editing(sales_order_names, pos_profile_name=None):
 	"""
 	Load multiple draft Sales Orders and combine them into a NEW consolidated order for payment.
@@ -1526,6 +1512,7 @@ def load_multiple_draft_orders_for_editing(sales_order_names, pos_profile_name=N
 			frappe.throw(_("Error loading draft orders: {0}").format(error_msg))
 
 @frappe.whitelist()
+@track_perf
 def finalize_multi_order_payment(consolidated_order_data, payment_data, pos_profile_name=None):
 	"""
 	Improved multi-order payment: Create Sales Invoice directly from Draft orders,
@@ -1542,29 +1529,15 @@ def finalize_multi_order_payment(consolidated_order_data, payment_data, pos_prof
 			frappe.log_error(f"Available keys in consolidated_order_data: {list(consolidated_order_data.keys())}", "Multi-Order Debug")
 			frappe.throw(_("No source orders found in consolidated data. Available keys: {0}").format(list(consolidated_order_data.keys())))
 		
-		# Get all orders and validate
-		orders = []
-		for order_name in order_names:
-			order_doc = frappe.get_doc("Sales Order", order_name)
-			
-			# Ensure all orders are Draft
-			if order_doc.docstatus != 0:
-				frappe.throw(_("Order {0} is not in Draft status").format(order_name))
-			
-			orders.append(order_doc)
-		
-		# Validate all orders are from same customer
-		first_customer = orders[0].customer
+		# Get all orders and validate (all must be Draft and from the same customer)
+		orders = consolidation.validate_orders(consolidation.load_orders(order_names), allow_submitted=False)
 		first_order = orders[0]
-		for order_doc in orders:
-			if order_doc.customer != first_customer:
-				frappe.throw(_("All orders must be from the same customer"))
 		
 		# Create Sales Invoice directly (no intermediate Sales Order)
 		invoice_doc = frappe.new_doc("Sales Invoice")
 		
 		# Copy basic fields from first order
-		invoice_doc.customer = first_customer
+		invoice_doc.customer = first_order.customer
 		invoice_doc.customer_name = first_order.customer_name
 		invoice_doc.posting_date = nowdate()
 		invoice_doc.posting_time = now_datetime().strftime("%H:%M:%S")
@@ -1575,9 +1548,9 @@ def finalize_multi_order_payment(consolidated_order_data, payment_data, pos_prof
 		invoice_doc.is_pos = 1
 		
 		# Copy restaurant fields from first order to maintain context
-		if hasattr(first_order, 'restaurant_order_type') and first_order.restaurant_order_type:
+		if first_order.restaurant_order_type:
 			invoice_doc.restaurant_order_type = first_order.restaurant_order_type
-		if hasattr(first_order, 'table_number') and first_order.table_number:
+		if first_order.table_number:
 			invoice_doc.table_number = first_order.table_number
 		
 		# Mark as multi-order consolidation
@@ -1586,72 +1559,13 @@ def finalize_multi_order_payment(consolidated_order_data, payment_data, pos_prof
 		invoice_doc.multi_order_count = len(order_names)
 		
 		# Aggregate items by item code to avoid duplicates
-		item_aggregation = {}
-		
-		for order_doc in orders:
-			for item in order_doc.items:
-				item_code = item.item_code
-				
-				if item_code not in item_aggregation:
-					item_aggregation[item_code] = {
-						'item_code': item_code,
-						'item_name': item.item_name,
-						'description': item.description,
-						'qty': 0,
-						'rate': item.rate,
-						'amount': 0,
-						'uom': item.uom,
-						'stock_qty': 0,
-						'conversion_factor': item.conversion_factor,
-						'warehouse': item.warehouse,
-						'is_stock_item': item.is_stock_item,
-						'source_orders': [],
-						'sales_orders': []
-					}
-				
-				# Aggregate quantities
-				item_aggregation[item_code]['qty'] += item.qty
-				item_aggregation[item_code]['amount'] += item.amount
-				item_aggregation[item_code]['stock_qty'] += item.stock_qty
-				
-				# Track source orders
-				if order_doc.name not in item_aggregation[item_code]['source_orders']:
-					item_aggregation[item_code]['source_orders'].append(order_doc.name)
-				
-				# Track sales orders (for reference)
-				if hasattr(item, 'sales_order') and item.sales_order:
-					if item.sales_order not in item_aggregation[item_code]['sales_orders']:
-						item_aggregation[item_code]['sales_orders'].append(item.sales_order)
-		
-		# Add aggregated items to invoice
 		total_amount = 0
-		for item_code, item_data in item_aggregation.items():
-			invoice_item = {
-				'item_code': item_data['item_code'],
-				'item_name': item_data['item_name'],
-				'description': item_data['description'],
-				'qty': item_data['qty'],
-				'rate': item_data['rate'],
-				'amount': item_data['amount'],
-				'uom': item_data['uom'],
-				'stock_qty': item_data['stock_qty'],
-				'conversion_factor': item_data['conversion_factor'],
-				'warehouse': item_data['warehouse'],
-				'is_stock_item': item_data['is_stock_item'],
-				'so_detail': None,  # Will be set later
-				'sales_order': None  # Will be set later
-			}
-			
-			# Set the primary sales order reference (first one)
-			if item_data['sales_orders']:
-				invoice_item['sales_order'] = item_data['sales_orders'][0]
-			
+		for item_data in consolidation.aggregate_order_items(orders):
+			source_orders = item_data.pop("source_orders")
 			# Add source order tracking to remarks
-			source_orders_text = ", ".join(item_data['source_orders'])
-			invoice_item['remarks'] = f"Source orders: {source_orders_text}"
-			
-			invoice_doc.append("items", invoice_item)
-			total_amount += item_data['amount']
+			item_data["remarks"] = f"Source orders: {', '.join(source_orders)}"
+			invoice_doc.append("items", item_data)
+			total_amount += item_data["amount"]
 		
 		# Set totals
 		invoice_doc.net_total = total_amount
@@ -1660,82 +1574,20 @@ def finalize_multi_order_payment(consolidated_order_data, payment_data, pos_prof
 		
 		# Set up payment methods from POS Profile
 		if pos_profile_name:
-			pos_profile = frappe.get_doc("POS Profile", pos_profile_name)
 			invoice_doc.pos_profile = pos_profile_name
-			
-			for payment_method in pos_profile.payments:
-				payment_entry = {
-					"mode_of_payment": payment_method.mode_of_payment,
-					"amount": 0.0,
-					"base_amount": 0.0,
-					"default": getattr(payment_method, 'default', 0)
-				}
-				
-				# Add optional fields if they exist
-				if hasattr(payment_method, 'account'):
-					payment_entry["account"] = payment_method.account
-				if hasattr(payment_method, 'type'):
-					payment_entry["type"] = payment_method.type
-					
-				invoice_doc.append("payments", payment_entry)
+			consolidation.set_pos_profile_payments(invoice_doc, pos_profile_name)
 		
 		# Save the consolidated invoice
 		invoice_doc.save()
 		
-		# IMPROVED: Release tables and DELETE draft orders (cleaner approach)
-		tables_to_release = []
-		draft_orders = []
-		
-		for order_name in order_names:
-			order_doc = frappe.get_doc("Sales Order", order_name)
-			draft_orders.append(order_doc)
-			
-			# Collect tables to release BEFORE deleting orders
-			if hasattr(order_doc, 'table_number') and order_doc.table_number:
-				tables_to_release.append({
-					'table_number': order_doc.table_number,
-					'order_name': order_name
-				})
-		
-		# Release all tables first
-		tables_released = []
-		for table_info in tables_to_release:
-			try:
-				# Find the Restaurant Table document  
-				table_docs = frappe.get_all("Restaurant Table", 
-					filters={"table_number": table_info['table_number']}, 
-					fields=["name", "status", "current_order"])
-				
-				if table_docs:
-					table_doc = frappe.get_doc("Restaurant Table", table_docs[0].name)
-					
-					# Release table if it's assigned to one of our orders
-					if table_doc.current_order in order_names:
-						table_doc.status = "Available"
-						table_doc.current_order = ""
-						table_doc.save()
-						tables_released.append(table_info['table_number'])
-						frappe.log_error(f"Released table {table_info['table_number']} before order deletion", "Multi-Order Table Release")
-						
-			except Exception as table_error:
-				frappe.log_error(f"Error releasing table {table_info['table_number']}: {str(table_error)}", "Multi-Order Table Release Error")
+		# Release all tables held by these orders with one statement, BEFORE deleting orders
+		tables_released = consolidation.release_tables(order_names)
 		
 		# Now DELETE all draft orders (much cleaner than marking as completed)
 		orders_deleted = []
-		for order_doc in draft_orders:
-			try:
-				order_name = order_doc.name
-				frappe.delete_doc("Sales Order", order_name, force=1)
-				orders_deleted.append(order_name)
-				frappe.log_error(f"Successfully deleted draft order {order_name} after consolidation", "Multi-Order Deletion")
-			except Exception as order_error:
-				frappe.log_error(f"Error deleting order {order_doc.name}: {str(order_error)}", "Multi-Order Deletion Error")
-		
-		if tables_released:
-			frappe.log_error(f"Successfully released {len(tables_released)} tables: {', '.join(tables_released)}", "Multi-Order Success")
-		
-		if orders_deleted:
-			frappe.log_error(f"Successfully deleted {len(orders_deleted)} draft orders: {', '.join(orders_deleted)}", "Multi-Order Deletion Success")
+		for order in orders:
+			frappe.delete_doc("Sales Order", order.name, force=1)
+			orders_deleted.append(order.name)
 		
 		frappe.log_error(f"✅ Multi-order payment completed: Invoice {invoice_doc.name} created from orders {', '.join(order_names)}. Tables released: {', '.join(tables_released) if tables_released else 'None'}. Orders deleted: {', '.join(orders_deleted)}", "Multi-Order Success")
 		
@@ -1746,6 +1598,7 @@ def finalize_multi_order_payment(consolidated_order_data, payment_data, pos_prof
 		frappe.throw(_("Error processing multiple orders: {0}").format(str(e)))
 
 @frappe.whitelist()
+@track_perf
 def submit_multiple_orders_and_create_invoice(order_names, updated_order_data, pos_profile_name=None):
 	"""
 	NEW CONSOLIDATION WORKFLOW:
@@ -1776,67 +1629,11 @@ def submit_multiple_orders_and_create_invoice(order_names, updated_order_data, p
 			frappe.throw(_("At least one Sales Order is required"))
 		
 		# PHASE 1: VALIDATION AND DATA COLLECTION
-		draft_orders = []
-		consolidated_items = []
-		tables_to_release = []
-		total_amount = 0
-		
-		# Collect order data and handle different statuses gracefully
-		for order_name in order_names:
-			try:
-				order_doc = frappe.get_doc("Sales Order", order_name)
-				
-				# Handle different order statuses
-				if order_doc.docstatus == 0:
-					# Draft order - can be consolidated
-					draft_orders.append(order_doc)
-					frappe.log_error(f"✅ Draft order {order_name} added to consolidation", "Multi-Order Status")
-				elif order_doc.docstatus == 1 and order_doc.per_billed == 0:
-					# Submitted but not billed - can be consolidated
-					draft_orders.append(order_doc)
-					frappe.log_error(f"✅ Submitted unbilled order {order_name} added to consolidation", "Multi-Order Status")
-				elif order_doc.per_billed > 0:
-					# Already billed - skip with warning
-					frappe.log_error(f"⚠️ Skipping order {order_name} - already {order_doc.per_billed}% billed", "Multi-Order Skip")
-					continue
-				else:
-					# Other status - skip with warning
-					frappe.log_error(f"⚠️ Skipping order {order_name} - status: {order_doc.status}, docstatus: {order_doc.docstatus}", "Multi-Order Skip")
-					continue
-				
-				total_amount += order_doc.grand_total
-				
-				# Collect items for consolidation
-				for item in order_doc.items:
-					consolidated_items.append({
-						"item_code": item.item_code,
-						"item_name": item.item_name,
-						"description": item.description,
-						"qty": item.qty,
-						"uom": item.uom,
-						"rate": item.rate,
-						"amount": item.amount,
-						"warehouse": item.warehouse,
-						"source_order": order_name
-					})
-				
-				# Track table assignments
-				if hasattr(order_doc, 'table_number') and order_doc.table_number:
-					tables_to_release.append({
-						'table_number': order_doc.table_number,
-						'order_name': order_name
-					})
-				
-				frappe.log_error(f"✅ Validated order: {order_name} (Items: {len(order_doc.items)}, Amount: {order_doc.grand_total})", "Multi-Order Validation")
-				
-			except Exception as validation_error:
-				frappe.log_error(f"❌ Error processing order {order_name}: {str(validation_error)}", "Multi-Order Error")
-				# Continue with other orders instead of failing completely
-				continue
-		
-		# Validate we have at least some orders to consolidate
-		if not draft_orders:
-			frappe.throw(_("No valid orders found for consolidation. All selected orders may have been already processed or billed."))
+		# One query for all orders; billed or otherwise unusable orders are skipped
+		draft_orders = consolidation.validate_orders(
+			consolidation.load_orders(order_names, skip_missing=True), unbilled_only=True, skip_invalid=True
+		)
+		total_amount = sum(flt(order.grand_total) for order in draft_orders)
 		
 		frappe.log_error(f"📊 Consolidation Summary: {len(draft_orders)} valid orders out of {len(order_names)} requested (Total: ₹{total_amount})", "Multi-Order Summary")
 		
@@ -1884,18 +1681,19 @@ def submit_multiple_orders_and_create_invoice(order_names, updated_order_data, p
 		consolidated_order.custom_consolidated_invoice_reference = ", ".join(order_names)
 		
 		# Add all items from source orders
-		for item_data in consolidated_items:
-			consolidated_order.append("items", {
-				"item_code": item_data["item_code"],
-				"item_name": item_data["item_name"],
-				"description": item_data["description"],
-				"qty": item_data["qty"],
-				"uom": item_data["uom"],
-				"rate": item_data["rate"],
-				"amount": item_data["amount"],
-				"warehouse": item_data["warehouse"],
-				"delivery_date": consolidated_order.delivery_date
-			})
+		for order in draft_orders:
+			for item in order["items"]:
+				consolidated_order.append("items", {
+					"item_code": item.item_code,
+					"item_name": item.item_name,
+					"description": item.description,
+					"qty": item.qty,
+					"uom": item.uom,
+					"rate": item.rate,
+					"amount": item.amount,
+					"warehouse": item.warehouse,
+					"delivery_date": consolidated_order.delivery_date
+				})
 		
 		# Set totals
 		consolidated_order.net_total = total_amount
@@ -1910,28 +1708,7 @@ def submit_multiple_orders_and_create_invoice(order_names, updated_order_data, p
 		# The consolidated order will be loaded into POS cart as DRAFT for review and payment
 		
 		# PHASE 3: ONLY RELEASE TABLES (keep source orders as Draft for later processing)
-		tables_released = []
-		for table_info in tables_to_release:
-			try:
-				table_docs = frappe.get_all("Restaurant Table", 
-					filters={"table_number": table_info['table_number']}, 
-					fields=["name", "status", "current_order"])
-				
-				if table_docs:
-					table_doc = frappe.get_doc("Restaurant Table", table_docs[0].name)
-					
-					# Only release table if it matches one of the source orders
-					for order_doc in draft_orders:
-						if table_doc.current_order == order_doc.name:
-							table_doc.status = "Available"
-							table_doc.current_order = ""
-							table_doc.save()
-							tables_released.append(table_info['table_number'])
-							frappe.log_error(f"🔓 Released table: {table_info['table_number']}", "Multi-Order Table Release")
-							break
-						
-			except Exception as table_error:
-				frappe.log_error(f"⚠️ Table release warning for {table_info['table_number']}: {str(table_error)}", "Multi-Order Table Warning")
+		tables_released = consolidation.release_tables([order.name for order in draft_orders])
 		
 		# PHASE 4: COMMIT AND FINALIZE
 		frappe.db.commit()
@@ -1956,69 +1733,31 @@ Next Step: Load consolidated order into POS cart for checkout
 
 
 @frappe.whitelist()
-def cleanup_fully_billed_orders():
+@track_perf
+def cleanup_fully_billed_orders(batch_size=200):
 	"""
-	Emergency cleanup function to remove Sales Orders that are fully billed but still showing as Draft.
-	These are zombie orders left over from multi-order consolidation failures.
+	Queue archival of restaurant Sales Orders that are fully billed.
+	The orders are copied to Restaurant Order Archive in batches by a background job,
+	and draft zombie orders left over from multi-order consolidation failures are removed.
+	Only System Managers may queue it, the job deletes draft orders.
 	"""
-	try:
-		# Find orders that are fully billed but still in the system
-		fully_billed_orders = frappe.get_all("Sales Order", 
-			filters={
-				"per_billed": [">=", 100],
-				"docstatus": ["!=", 2],  # Not cancelled
-				"restaurant_order_type": ["!=", ""]  # Restaurant orders only
-			}, 
-			fields=["name", "per_billed", "status", "docstatus", "customer"])
-		
-		if not fully_billed_orders:
-			return {"message": "No fully billed orders found to cleanup", "cleaned": 0}
-		
-		cleaned_orders = []
-		cleanup_errors = []
-		
-		for order in fully_billed_orders:
-			try:
-				order_name = order.name
-				
-				# Double-check this is really fully billed
-				if order.per_billed >= 100:
-					# Check if there are any invoices referencing this order
-					invoice_items = frappe.get_all("Sales Invoice Item", 
-						filters={"sales_order": order_name, "docstatus": 1}, 
-						fields=["parent"])
-					
-					if invoice_items:
-						# This order has been billed - safe to delete
-						frappe.delete_doc("Sales Order", order_name, force=1)
-						cleaned_orders.append(order_name)
-						frappe.log_error(f"🧹 CLEANED UP fully billed order: {order_name} (per_billed: {order.per_billed}%)", "Order Cleanup")
-					else:
-						frappe.log_error(f"⚠️ Order {order_name} is marked as fully billed but has no invoice items", "Order Cleanup Warning")
-				
-			except Exception as cleanup_error:
-				error_msg = f"{order.name}: {str(cleanup_error)}"
-				cleanup_errors.append(error_msg)
-				frappe.log_error(f"❌ Cleanup error for {order.name}: {str(cleanup_error)}", "Order Cleanup Error")
-		
-		frappe.db.commit()
-		
-		result = {
-			"message": f"Cleanup completed: {len(cleaned_orders)} orders removed",
-			"cleaned": len(cleaned_orders),
-			"cleaned_orders": cleaned_orders,
-			"errors": cleanup_errors
-		}
-		
-		frappe.log_error(f"🎉 Order cleanup completed: {result}", "Order Cleanup Success")
-		return result
-		
-	except Exception as e:
-		frappe.log_error(f"💥 Order cleanup failed: {str(e)}", "Order Cleanup Critical Error")
-		return {"error": str(e), "cleaned": 0}
+	frappe.only_for("System Manager")
+	job = frappe.enqueue(
+		"posawesome.posawesome.api.order_archive.archive_fully_billed_orders",
+		queue="long",
+		timeout=3600,
+		job_id="posawesome_archive_fully_billed_orders",
+		deduplicate=True,
+		batch_size=cint(batch_size) or 200,
+	)
+	return {
+		"message": _("Archival of fully billed orders has been queued"),
+		"job_id": job.id if job else None,
+	}
 
 
 @frappe.whitelist()
+@track_perf
 def finalize_consolidated_order_submission(consolidated_order_name):
 	"""
 	Called when a consolidated order is submitted through POS PAY workflow.
@@ -2086,6 +1825,7 @@ Reference Field Updated: {consolidated_order.custom_consolidated_invoice_referen
 
 
 @frappe.whitelist()
+@track_perf
 def debug_sales_order_billing_status(order_name):
 	"""
 	Debug function to check billing status of a Sales Order and identify conflicts
@@ -2132,6 +1872,7 @@ def debug_sales_order_billing_status(order_name):
 		return {"error": str(e)}
 
 @frappe.whitelist()
+@track_perf
 def void_order_items(order_name, items_to_void):
 	"""Void specific items from a restaurant order"""
 	try:
@@ -2225,7 +1966,7 @@ def void_order_items(order_name, items_to_void):
 		# Generate KOT print for voided items
 		void_kot_data = None
 		try:
-			void_kot_data = generate_void_kot_print(updated_doc, voided_items)
+			void_kot_data = generate_void_kot_print(updated_doc, voided_items, next_kot_sequence(order_name))
 		except Exception as e:
 			frappe.log_error(f"Error generating void KOT: {str(e)}", "Void KOT Generation Error")
 		
@@ -2256,6 +1997,7 @@ def void_order_items(order_name, items_to_void):
 		frappe.throw(_("Error voiding items: {0}").format(str(e)))
 
 @frappe.whitelist()
+@track_perf
 def debug_test_consolidation():
 	"""Debug function to test multi-order consolidation data preservation"""
 	
@@ -4,8 +4,10 @@
 
 import frappe
 from frappe import _
+from posawesome.posawesome.api.perf import track_perf
 
 @frappe.whitelist()
+@track_perf
 def create_restaurant_custom_fields():
     """Create custom fields for restaurant functionality"""
     
@@ -111,6 +113,7 @@ def create_restaurant_custom_fields():
     }
 
 @frappe.whitelist()
+@track_perf
 def setup_complete_restaurant_system():
     """Complete restaurant system setup"""
     
@@ -134,6 +137,7 @@ def setup_complete_restaurant_system():
     }
 
 @frappe.whitelist()
+@track_perf
 def check_restaurant_setup():
     """Check if restaurant system is properly set up"""
     
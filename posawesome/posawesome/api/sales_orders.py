@@ -9,6 +9,7 @@ from erpnext.selling.doctype.sales_order.sales_order import make_sales_invoice
 from frappe.utils import getdate, nowdate
 
 from posawesome.posawesome.api.payment_entry import create_payment_entry
+from posawesome.posawesome.api.perf import track_perf
 
 
 def _payment_entry_job(order_name, payments):
@@ -18,6 +19,7 @@ def _payment_entry_job(order_name, payments):
 
 
 @frappe.whitelist()
+@track_perf
 def search_orders(company, currency, order_name=None):
     filters = {
         "billing_status": ["in", ["Not Billed", "Partly Billed"]],
@@ -67,6 +69,7 @@ def _map_delivery_dates(data):
 
 
 @frappe.whitelist()
+@track_perf
 def update_sales_order(data):
     """Create or update a Sales Order document."""
     data = json.loads(data)
@@ -120,6 +123,7 @@ def _create_payment_entries(so_doc, payments):
 
 
 @frappe.whitelist()
+@track_perf
 def submit_sales_order(order):
     """Submit sales order and create payment entries."""
     order = json.loads(order)
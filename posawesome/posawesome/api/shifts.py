@@ -8,9 +8,12 @@ import frappe
 from frappe.utils import nowdate
 from frappe import _
 from .utilities import get_version
+from .utils import POS_COMPANY_FIELDS, get_pos_settings
+from posawesome.posawesome.api.perf import track_perf
 
 
 @frappe.whitelist()
+@track_perf
 def get_opening_dialog_data():
     data = {}
 
@@ -61,6 +64,7 @@ def get_opening_dialog_data():
 
 
 @frappe.whitelist()
+@track_perf
 def create_opening_voucher(pos_profile, company, balance_details):
     balance_details = json.loads(balance_details)
 
@@ -85,6 +89,7 @@ def create_opening_voucher(pos_profile, company, balance_details):
 
 
 @frappe.whitelist()
+@track_perf
 def check_opening_shift(user):
     open_vouchers = frappe.db.get_all(
         "POS Opening Shift",
@@ -108,10 +113,12 @@ def check_opening_shift(user):
 
 
 def update_opening_shift_data(data, pos_profile):
-    data["pos_profile"] = frappe.get_doc("POS Profile", pos_profile)
+    data["pos_profile"] = get_pos_settings(pos_profile)
     if data["pos_profile"].get("posa_language"):
         frappe.local.lang = data["pos_profile"].posa_language
-    data["company"] = frappe.get_doc("Company", data["pos_profile"].company)
+    data["company"] = frappe.db.get_value(
+        "Company", data["pos_profile"].company, POS_COMPANY_FIELDS, as_dict=True
+    )
     allow_negative_stock = frappe.get_value(
         "Stock Settings", None, "allow_negative_stock"
     )
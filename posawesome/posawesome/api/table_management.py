@@ -4,8 +4,10 @@
 
 import frappe
 from frappe import _
+from posawesome.posawesome.api.perf import track_perf
 
 @frappe.whitelist()
+@track_perf
 def sync_table_occupations():
 	"""Sync table occupations with existing restaurant orders"""
 	
@@ -97,6 +99,7 @@ def sync_table_occupations():
 	return result
 
 @frappe.whitelist()
+@track_perf
 def check_table_order_consistency():
 	"""Check consistency between table occupations and orders"""
 	
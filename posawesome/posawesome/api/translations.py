@@ -0,0 +1,217 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Compiled translation bundles for the POS.
+
+The messages of every installed app's CSV files and of the site's
+``Translation`` records are compiled once per language into
+``public/translations/<lang>.<hash>.json``. The content hash in the file
+name makes every bundle immutable, so browsers and CDNs can cache it
+forever and a change simply produces a new file. The site's manifest of
+current bundles lives in Redis. Translation changes drop the entry of
+their language, and bundles are rebuilt after every migrate.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+
+import frappe
+from frappe import _
+from posawesome.posawesome.api.perf import track_perf
+
+BUNDLE_MANIFEST_KEY = "posa_translation_bundles"
+LANGUAGE_OPTIONS_KEY = "posa_language_options"
+BUNDLE_DIR = ("public", "translations")
+BUNDLE_URL = "/assets/posawesome/translations/{0}"
+
+# Superseded bundles may still be in use by other sites of the bench or by
+# open tabs, so they are only removed after a week
+STALE_BUNDLE_SECONDS = 7 * 24 * 60 * 60
+
+
+def normalize_language(code: str) -> str:
+	"""Return language code normalized for comparison."""
+	return code.strip().lower().replace("_", "-")
+
+
+def collect_languages() -> list[str]:
+	"""Return the language codes of all apps' CSV files and Translation records.
+
+	English (``en``) is always included so that users can explicitly select
+	it in the POS profile.
+	"""
+	languages = {"en"}
+
+	for app in frappe.get_installed_apps():
+		translations_path = frappe.get_app_path(app, "translations")
+		if os.path.exists(translations_path):
+			for filename in os.listdir(translations_path):
+				if filename.endswith(".csv"):
+					languages.add(normalize_language(os.path.splitext(filename)[0]))
+
+	if frappe.db.table_exists("Translation"):
+		for language in frappe.db.sql_list(
+			"SELECT DISTINCT language FROM `tabTranslation` WHERE language IS NOT NULL"
+		):
+			languages.add(normalize_language(language))
+
+	return sorted(languages)
+
+
+def get_languages() -> list[str]:
+	languages = frappe.cache().get_value(LANGUAGE_OPTIONS_KEY)
+	if languages is None:
+		languages = collect_languages()
+		frappe.cache().set_value(LANGUAGE_OPTIONS_KEY, languages)
+	return languages
+
+
+def collect_messages(lang: str) -> dict:
+	"""Return the translations of ``lang`` from all apps and Translation records.
+
+	``lang`` is a normalized code; files and records are loaded under their
+	original codes (``pt-BR.csv``), which matters on case sensitive file
+	systems.
+	"""
+	from frappe.translate import get_translations_from_csv
+
+	lang = normalize_language(lang)
+	if lang == "en":
+		# English is the base language and has no translation file
+		return {}
+
+	messages = {}
+	for app in frappe.get_installed_apps():
+		translations_path = frappe.get_app_path(app, "translations")
+		if not os.path.exists(translations_path):
+			continue
+		for filename in sorted(os.listdir(translations_path)):
+			code, extension = os.path.splitext(filename)
+			if extension != ".csv" or normalize_language(code) != lang:
+				continue
+			try:
+				messages.update(get_translations_from_csv(code, app) or {})
+			except Exception:
+				pass
+
+	if frappe.db.table_exists("Translation"):
+		codes = [
+			code
+			for code in frappe.db.sql_list(
+				"SELECT DISTINCT language FROM `tabTranslation` WHERE language IS NOT NULL"
+			)
+			if normalize_language(code) == lang
+		]
+		if codes:
+			for source, target in frappe.db.sql(
+				"""
+				SELECT source_text, translated_text
+				FROM `tabTranslation`
+				WHERE language IN %s
+				""",
+				(tuple(codes),),
+			):
+				messages[source] = target
+
+	return messages
+
+
+def _bundle_dir() -> str:
+	return frappe.get_app_path("posawesome", *BUNDLE_DIR)
+
+
+def _prune_bundles(lang: str, keep: str):
+	directory = _bundle_dir()
+	cutoff = time.time() - STALE_BUNDLE_SECONDS
+	for filename in os.listdir(directory):
+		if filename == keep or not filename.startswith(f"{lang}.") or not filename.endswith(".json"):
+			continue
+		path = os.path.join(directory, filename)
+		try:
+			if os.path.getmtime(path) < cutoff:
+				os.remove(path)
+		except OSError:
+			pass
+
+
+def build_bundle(lang: str) -> dict:
+	"""Compile the bundle of ``lang`` and record it in the manifest."""
+	content = json.dumps(collect_messages(lang), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+	content_hash = hashlib.sha1(content.encode()).hexdigest()[:12]
+	filename = f"{lang}.{content_hash}.json"
+
+	directory = _bundle_dir()
+	os.makedirs(directory, exist_ok=True)
+	path = os.path.join(directory, filename)
+	if not os.path.exists(path):
+		# Write to a temporary file first so a bundle is never served half written
+		tmp_path = f"{path}.{os.getpid()}.tmp"
+		with open(tmp_path, "w", encoding="utf-8") as f:
+			f.write(content)
+		os.replace(tmp_path, path)
+	_prune_bundles(lang, filename)
+
+	bundle = {"lang": lang, "hash": content_hash, "url": BUNDLE_URL.format(filename)}
+	frappe.cache().hset(BUNDLE_MANIFEST_KEY, lang, bundle)
+	return bundle
+
+
+def build_translation_bundles():
+	"""Build step: compile the bundles of every known language.
+
+	Runs after ``bench migrate``. It can also be run with
+	``bench execute posawesome.posawesome.api.translations.build_translation_bundles``.
+	"""
+	frappe.cache().delete_value([BUNDLE_MANIFEST_KEY, LANGUAGE_OPTIONS_KEY])
+	bundles = []
+	for lang in get_languages():
+		try:
+			bundles.append(build_bundle(lang))
+		except Exception:
+			frappe.log_error(frappe.get_traceback(), f"POS translation bundle {lang}")
+	return bundles
+
+
+def get_bundle(lang: str) -> dict:
+	"""Return the current bundle of ``lang``, compiling it when missing."""
+	lang = normalize_language(lang)
+	# Only known codes become file names
+	if lang not in get_languages():
+		frappe.throw(_("Language {0} has no translations").format(lang), frappe.DoesNotExistError)
+	bundle = frappe.cache().hget(BUNDLE_MANIFEST_KEY, lang)
+	if not bundle or not os.path.exists(os.path.join(_bundle_dir(), bundle["url"].rsplit("/", 1)[-1])):
+		bundle = build_bundle(lang)
+	return bundle
+
+
+def load_bundle(lang: str) -> dict:
+	bundle = get_bundle(lang)
+	with open(os.path.join(_bundle_dir(), bundle["url"].rsplit("/", 1)[-1]), encoding="utf-8") as f:
+		return json.load(f)
+
+
+@frappe.whitelist()
+@track_perf
+def get_translation_bundle(lang: str | None = None) -> dict:
+	"""Return ``{lang, hash, url}`` of the compiled bundle of ``lang``.
+
+	The POS compares the hash with its cached copy and only downloads the
+	immutable bundle file when it changed.
+	"""
+	return get_bundle(lang or frappe.local.lang or "en")
+
+
+def clear_translation_bundle(doc=None, method=None):
+	"""Translation hook dropping the bundle of the changed language."""
+	frappe.cache().delete_value(LANGUAGE_OPTIONS_KEY)
+	if not doc:
+		frappe.cache().delete_value(BUNDLE_MANIFEST_KEY)
+		return
+	previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+	for language in {doc.get("language"), previous and previous.get("language")}:
+		if language:
+			frappe.cache().hdel(BUNDLE_MANIFEST_KEY, normalize_language(language))
@@ -13,6 +13,7 @@ import psutil
 import functools
 
 from .utils import get_item_groups
+from posawesome.posawesome.api.perf import track_perf
 
 
 def get_version():
@@ -131,6 +132,7 @@ def get_company_domain(company):
 
 
 @frappe.whitelist()
+@track_perf
 def get_selling_price_lists():
     """Return all selling price lists"""
     return frappe.get_all(
@@ -142,6 +144,7 @@ def get_selling_price_lists():
 
 
 @frappe.whitelist()
+@track_perf
 def get_app_info() -> Dict[str, List[Dict[str, str]]]:
     """
     Return a list of installed apps and their versions.
@@ -171,6 +174,7 @@ def ensure_child_doctype(doc, table_field, child_doctype):
 
 
 @frappe.whitelist()
+@track_perf
 def get_sales_person_names():
     import json
 
@@ -193,76 +197,38 @@ def get_sales_person_names():
 
 
 @frappe.whitelist()
+@track_perf
 def get_language_options():
     """Return newline separated language codes from translations directories of all apps.
 
     Always include English (``en``) in the list so that users can explicitly
     select it in the POS profile.
     """
-    import os
+    from posawesome.posawesome.api.translations import get_languages
 
-    languages = {"en"}
-
-    def normalize(code: str) -> str:
-        """Return language code normalized for comparison."""
-        return code.strip().lower().replace("_", "-")
-
-    # Collect languages from translation CSV files
-    for app in frappe.get_installed_apps():
-        translations_path = frappe.get_app_path(app, "translations")
-        if os.path.exists(translations_path):
-            for filename in os.listdir(translations_path):
-                if filename.endswith(".csv"):
-                    languages.add(normalize(os.path.splitext(filename)[0]))
-
-    # Also include languages from the Translation doctype, if available
-    if frappe.db.table_exists("Translation"):
-        rows = frappe.db.sql(
-            "SELECT DISTINCT language FROM `tabTranslation` WHERE language IS NOT NULL"
-        )
-        for (language,) in rows:
-            languages.add(normalize(language))
-
-    # Normalize to lowercase and deduplicate, then sort for consistent order
-    return "\n".join(sorted(languages))
+    return "\n".join(get_languages())
 
 
 @frappe.whitelist()
+@track_perf
 def get_translation_dict(lang: str) -> dict:
     """Return translations for the given language from all installed apps."""
-    from frappe.translate import get_translations_from_csv
+    from posawesome.posawesome.api.translations import (
+        get_languages,
+        load_bundle,
+        normalize_language,
+    )
 
-    if lang == "en":
+    if lang == "en" or normalize_language(lang) not in get_languages():
         # English is the base language and does not have a separate
         # translation file. Return an empty dict to avoid file lookups.
         return {}
 
-    translations = {}
-
-    for app in frappe.get_installed_apps():
-        try:
-            messages = get_translations_from_csv(lang, app) or {}
-            translations.update(messages)
-        except Exception:
-            pass
-
-    # Include translations stored in the Translation doctype, if present
-    if frappe.db.table_exists("Translation"):
-        rows = frappe.db.sql(
-            """
-	        SELECT source_text, translated_text
-	        FROM `tabTranslation`
-	        WHERE language = %s
-	    """,
-            (lang,),
-        )
-        for source, target in rows:
-            translations[source] = target
-
-    return translations
+    return load_bundle(lang)
 
 
 @frappe.whitelist()
+@track_perf
 def get_pos_profile_tax_inclusive(pos_profile: str):
     """Return the 'posa_tax_inclusive' setting for the given POS Profile."""
     if not pos_profile:
@@ -270,8 +236,7 @@ def get_pos_profile_tax_inclusive(pos_profile: str):
     return frappe.get_cached_value("POS Profile", pos_profile, "posa_tax_inclusive")
 
 
-@frappe.whitelist()
-def get_database_usage():
+def collect_database_usage():
     db_size = None
     db_connections = None
     db_slow_queries = None
@@ -363,8 +328,7 @@ def get_database_usage():
     }
 
 
-@frappe.whitelist()
-def get_server_usage():
+def collect_server_usage():
     try:
 
         cpu_percent = psutil.cpu_percent(interval=0.5)
@@ -403,6 +367,57 @@ def get_server_usage():
     }
 
 
+# kind -> (cache key, refresh interval in seconds, collector)
+METRICS_SAMPLERS = {
+    "server": ("posa_server_usage", 5, collect_server_usage),
+    "database": ("posa_database_usage", 60, collect_database_usage),
+}
+
+
+def sample_metrics(kind):
+    """Collect one kind of usage metrics and store them in Redis.
+
+    Runs as a background job so the CPU sampling interval and the
+    information_schema scans never hold a web worker.
+    """
+    cache_key, interval, collect = METRICS_SAMPLERS[kind]
+    metrics = collect()
+    metrics["sampled_at"] = time.time()
+    frappe.cache().set_value(cache_key, metrics, expires_in_sec=interval * 10)
+    return metrics
+
+
+def get_sampled_metrics(kind):
+    """Return the last stored sample of ``kind``, refreshing it in the background.
+
+    A stale or missing sample queues one deduplicated sampling job. Until it
+    has run, the previous sample (or ``sampled_at: None``) is returned.
+    """
+    cache_key, interval, _collect = METRICS_SAMPLERS[kind]
+    metrics = frappe.cache().get_value(cache_key)
+    if not metrics or time.time() - metrics["sampled_at"] >= interval:
+        frappe.enqueue(
+            "posawesome.posawesome.api.utilities.sample_metrics",
+            queue="short",
+            job_id=f"posawesome_sample_{kind}_metrics",
+            deduplicate=True,
+            kind=kind,
+        )
+    return metrics or {"sampled_at": None}
+
+
+@frappe.whitelist()
+@track_perf
+def get_database_usage():
+    return get_sampled_metrics("database")
+
+
+@frappe.whitelist()
+@track_perf
+def get_server_usage():
+    return get_sampled_metrics("server")
+
+
 # Cache for language data
 _LANGUAGE_CACHE = {
     "languages": None,
@@ -461,6 +476,7 @@ def _update_language_cache(languages):
 
 
 @frappe.whitelist()
+@track_perf
 def get_available_languages():
     """Get list of available languages with caching."""
     # Return cached data if valid
@@ -515,6 +531,7 @@ def _get_user_language_cached(user):
 
 
 @frappe.whitelist()
+@track_perf
 def get_current_user_language():
     """Get current user's language with optimized caching."""
     try:
@@ -550,6 +567,7 @@ def get_current_user_language():
 
 
 @frappe.whitelist()
+@track_perf
 def set_current_user_language(lang_code):
     """Set language with optimized database operations."""
     try:
@@ -590,6 +608,7 @@ def set_current_user_language(lang_code):
 
 
 @frappe.whitelist()
+@track_perf
 def get_language_info(lang_code):
     """Get detailed information about a specific language."""
     try:
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
-from functools import cache
+import hashlib
+import json
 
 import frappe
+from frappe import _
+from frappe.model import no_value_fields, table_fields
+from posawesome.posawesome.api.perf import track_perf
 
 # Reusable ORM filter to exclude template items
 HAS_VARIANTS_EXCLUSION = {"has_variants": 0}
 
 
 @frappe.whitelist()
+@track_perf
 def get_active_pos_profile(user=None):
 	"""Return the active POS profile for the given user."""
 	user = user or frappe.session.user
@@ -18,10 +23,11 @@ def get_active_pos_profile(user=None):
 		profile = frappe.db.get_value("POS Profile", {"disabled": 0}, "name")
 	if not profile:
 		return None
-	return frappe.get_doc("POS Profile", profile).as_dict()
+	return get_pos_settings(profile)
 
 
 @frappe.whitelist()
+@track_perf
 def get_default_warehouse(company=None):
 	"""Return the default warehouse for the given company."""
 	company = company or frappe.defaults.get_default("company")
@@ -33,44 +39,185 @@ def get_default_warehouse(company=None):
 	return warehouse
 
 
-@cache
+# Slim POS Profile projections, one key per profile
+POS_SETTINGS_CACHE_KEY = "posa_pos_settings"
+POS_SETTINGS_CACHE_TTL = 24 * 60 * 60
+
+# Child tables the POS does not need, they only grow the payload
+POS_SETTINGS_EXCLUDED_TABLES = ("applicable_for_users",)
+
+# Company fields sent to the POS with its profile
+POS_COMPANY_FIELDS = ("name", "company_name", "abbr", "country", "default_currency")
+
+# Keys of a profile reference sent by the POS instead of the whole profile
+POS_PROFILE_REFERENCE_KEYS = {"name", "version"}
+
+
+def build_pos_settings(pos_profile: str) -> dict:
+	"""Return the fields of a POS Profile the POS and its APIs use.
+
+	Only value fields and the child rows the POS reads are kept, without
+	the standard document fields. ``posa_settings_version`` is a hash of
+	the projection, so terminals can tell when their copy is stale.
+	"""
+	doc = frappe.get_doc("POS Profile", pos_profile)
+	settings = {"name": doc.name, "modified": doc.modified}
+	for df in doc.meta.fields:
+		if df.fieldtype in table_fields:
+			if df.fieldname not in POS_SETTINGS_EXCLUDED_TABLES:
+				settings[df.fieldname] = [row.as_dict(no_default_fields=True) for row in doc.get(df.fieldname)]
+		elif df.fieldtype not in no_value_fields:
+			settings[df.fieldname] = doc.get(df.fieldname)
+
+	settings["posa_settings_version"] = hashlib.sha1(
+		json.dumps(settings, sort_keys=True, default=str).encode()
+	).hexdigest()[:12]
+	return settings
+
+
+def get_pos_settings(pos_profile: str) -> frappe._dict:
+	"""Return the cached projection of ``pos_profile``."""
+	key = f"{POS_SETTINGS_CACHE_KEY}:{pos_profile}"
+	settings = frappe.cache().get_value(key)
+	if settings is None:
+		settings = build_pos_settings(pos_profile)
+		frappe.cache().set_value(key, settings, expires_in_sec=POS_SETTINGS_CACHE_TTL)
+	return frappe._dict(settings)
+
+
+def clear_pos_settings_cache(doc=None, method=None, *args, **kwargs):
+	"""POS Profile hook dropping the projection of the changed profile."""
+	if not doc:
+		frappe.cache().delete_keys(POS_SETTINGS_CACHE_KEY)
+		return
+	names = {doc.name, *(name for name in args[:1] if isinstance(name, str))}
+	frappe.cache().delete_value([f"{POS_SETTINGS_CACHE_KEY}:{name}" for name in names])
+
+
+def load_pos_profile(pos_profile) -> dict:
+	"""Return the settings of the POS Profile passed to a POS API.
+
+	The POS sends the profile name and the version of its copy, as a dict,
+	JSON or a plain name, and the settings are resolved from the cache.
+	Older clients sending the whole profile as JSON keep working. When the
+	terminal's version is stale the current one is added to the response as
+	``pos_settings_version``.
+	"""
+	if isinstance(pos_profile, str):
+		try:
+			pos_profile = json.loads(pos_profile)
+		except ValueError:
+			pass
+		if not isinstance(pos_profile, dict):
+			pos_profile = {"name": str(pos_profile)}
+	if not pos_profile or set(pos_profile) - POS_PROFILE_REFERENCE_KEYS:
+		return pos_profile or {}
+
+	settings = get_pos_settings(pos_profile["name"])
+	version = pos_profile.get("version")
+	if version and version != settings.posa_settings_version and getattr(frappe.local, "response", None) is not None:
+		frappe.local.response["pos_settings_version"] = settings.posa_settings_version
+	return settings
+
+
+def validate_profile_access(pos_profile: str, has_open_shift: bool = False):
+	"""Only users of the profile, or with a shift open on it, may load it."""
+	if has_open_shift or "System Manager" in frappe.get_roles():
+		return
+	if not frappe.db.exists("POS Profile User", {"parent": pos_profile, "user": frappe.session.user}):
+		frappe.throw(
+			_("You are not allowed to use POS Profile {0}").format(pos_profile),
+			frappe.PermissionError,
+		)
+
+
+@frappe.whitelist()
+@track_perf
+def get_pos_profile_settings(pos_profile: str, version: str | None = None):
+	"""Return the slim settings of ``pos_profile``, or ``{"changed": 0}`` when
+	the caller's ``version`` is current."""
+	validate_profile_access(pos_profile)
+	settings = get_pos_settings(pos_profile)
+	if version and version == settings.posa_settings_version:
+		return {"version": version, "changed": 0}
+	return {"version": settings.posa_settings_version, "changed": 1, "settings": settings}
+
+
+# Expanded item groups per POS Profile, under a version bumped on changes
+ITEM_GROUPS_CACHE_KEY = "posa_item_groups"
+ITEM_GROUPS_VERSION_KEY = "posa_item_groups_version"
+ITEM_GROUPS_CACHE_TTL = 24 * 60 * 60
+
+
+def get_item_groups_version() -> str:
+	version = frappe.cache().get_value(ITEM_GROUPS_VERSION_KEY)
+	if not version:
+		version = frappe.generate_hash(length=10)
+		frappe.cache().set_value(ITEM_GROUPS_VERSION_KEY, version)
+	return version
+
+
+def clear_item_groups_cache(doc=None, method=None):
+	"""Invalidate every cached expansion by moving to a new version.
+
+	Entries of older versions are never read again and expire on their own.
+	"""
+	frappe.cache().set_value(ITEM_GROUPS_VERSION_KEY, frappe.generate_hash(length=10))
+
+
+# Version of the POS catalogue prices, part of the cached item and price
+# lookups, so one bump invalidates all of them
+PRICE_VERSION_KEY = "posa_price_version"
+
+
+def get_price_version() -> str:
+	version = frappe.cache().get_value(PRICE_VERSION_KEY)
+	if not version:
+		version = bump_price_version()
+	return version
+
+
+def bump_price_version(doc=None, method=None) -> str:
+	"""Move the catalogue prices to a new version, also an Item Price hook."""
+	version = frappe.generate_hash(length=10)
+	frappe.cache().set_value(PRICE_VERSION_KEY, version)
+	return version
+
+
 def get_item_groups(pos_profile: str) -> list[str]:
 	"""Return all item groups for a POS profile, including descendants.
 
 	The linked groups from the ``POS Profile Item Group`` child table are
-	expanded to include all of their descendants using ERPNext's
-	``get_child_groups`` utility. Results are cached to avoid duplicate
-	database calls within a process. If the child DocType is missing, an
+	expanded to all of their descendants with one nested set query. The
+	result is shared through Redis under a versioned key, which POS Profile
+	and Item Group changes invalidate. If the child DocType is missing, an
 	empty list is returned instead of raising a database error.
 	"""
 
-	if not pos_profile or not frappe.db.exists("DocType", "POS Profile Item Group"):
+	if not pos_profile:
 		return []
 
-	try:
-		from erpnext.utilities.doctype.item_group.item_group import get_child_groups
-	except Exception:
-		get_child_groups = None
+	cache_key = f"{ITEM_GROUPS_CACHE_KEY}:{get_item_groups_version()}:{pos_profile}"
+	groups = frappe.cache().get_value(cache_key)
+	if groups is None:
+		groups = _expand_item_groups(pos_profile)
+		frappe.cache().set_value(cache_key, groups, expires_in_sec=ITEM_GROUPS_CACHE_TTL)
+	return list(groups)
 
-	groups = frappe.get_all(
-		"POS Profile Item Group",
-		filters={"parent": pos_profile},
-		pluck="item_group",
-	)
 
-	all_groups: set[str] = set()
-	for group in groups:
-		if not group:
-			continue
-		if get_child_groups:
-			try:
-				descendants = get_child_groups(group) or []
-			except Exception:
-				descendants = []
-		else:
-			descendants = frappe.db.get_descendants("Item Group", group) or []
-
-		all_groups.add(group)
-		all_groups.update(descendants)
-
-	return list(all_groups)
+def _expand_item_groups(pos_profile: str) -> list[str]:
+	if not frappe.db.exists("DocType", "POS Profile Item Group"):
+		return []
+
+	return frappe.db.sql_list(
+		"""
+		SELECT DISTINCT child.name
+		FROM `tabPOS Profile Item Group` pig
+		INNER JOIN `tabItem Group` ancestor ON ancestor.name = pig.item_group
+		INNER JOIN `tabItem Group` child
+			ON child.lft >= ancestor.lft AND child.rgt <= ancestor.rgt
+		WHERE pig.parent = %s AND pig.parenttype = 'POS Profile'
+		ORDER BY child.lft
+		""",
+		(pos_profile,),
+	)
@@ -0,0 +1,159 @@
+# Copyright (c) 2025, Youssef Restom and contributors
+# For license information, please see license.txt
+
+"""Precomputed attribute matrices of variant templates.
+
+A matrix lists a template's attributes in the template's order, the
+values each one takes among its enabled variants and an index from every
+combination of values to the variant's item code. The POS keys the index
+with ``JSON.stringify`` of the chosen values in attribute order, so a
+selection resolves with one lookup. Matrices live in a Redis hash and are
+rebuilt in the background whenever a template or one of its variants is
+saved.
+"""
+
+from __future__ import annotations
+
+import json
+
+import frappe
+from posawesome.posawesome.api.perf import track_perf
+
+VARIANT_MATRIX_CACHE_KEY = "posa_variant_matrix"
+
+
+def combination_key(values) -> str:
+	"""Return the index key of ``values``, matching ``JSON.stringify`` in the POS."""
+	return json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+
+
+def build_variant_matrix(template: str) -> dict:
+	"""Compute the matrix of ``template`` and store it in the cache."""
+	attributes = frappe.db.sql_list(
+		"""
+		SELECT attribute
+		FROM `tabItem Variant Attribute`
+		WHERE parent = %s AND parenttype = 'Item'
+		ORDER BY idx
+		""",
+		(template,),
+	)
+	rows = frappe.db.sql(
+		"""
+		SELECT i.name AS item_code, iva.attribute, iva.attribute_value
+		FROM `tabItem` i
+		INNER JOIN `tabItem Variant Attribute` iva
+			ON iva.parent = i.name AND iva.parenttype = 'Item'
+		WHERE i.variant_of = %s AND i.disabled = 0
+		""",
+		(template,),
+		as_dict=1,
+	)
+
+	item_attributes = {}
+	for row in rows:
+		if row.attribute not in attributes:
+			# Attributes dropped from the template no longer tell variants apart
+			continue
+		item_attributes.setdefault(row.item_code, {})[row.attribute] = row.attribute_value
+
+	# Values follow their order on the Item Attribute, numeric ones sort by value
+	value_order = {}
+	if attributes:
+		for row in frappe.get_all(
+			"Item Attribute Value",
+			filters={"parent": ["in", attributes]},
+			fields=["parent", "attribute_value"],
+			order_by="idx asc",
+		):
+			order = value_order.setdefault(row.parent, {})
+			order.setdefault(row.attribute_value, len(order))
+
+	values = {}
+	for attribute in attributes:
+		used = {attrs[attribute] for attrs in item_attributes.values() if attrs.get(attribute) is not None}
+		order = value_order.get(attribute, {})
+		values[attribute] = sorted(used, key=lambda value: (order.get(value, len(order)), _numeric(value), value))
+
+	index = {}
+	for item_code in sorted(item_attributes):
+		attrs = item_attributes[item_code]
+		if all(attrs.get(attribute) is not None for attribute in attributes):
+			index.setdefault(combination_key(attrs[attribute] for attribute in attributes), item_code)
+
+	matrix = {
+		"template": template,
+		"attributes": attributes,
+		"values": values,
+		"index": index,
+		"item_attributes": item_attributes,
+	}
+	frappe.cache().hset(VARIANT_MATRIX_CACHE_KEY, template, matrix)
+	return matrix
+
+
+def _numeric(value):
+	try:
+		return float(value)
+	except (TypeError, ValueError):
+		return 0
+
+
+def get_matrix(template: str) -> dict:
+	matrix = frappe.cache().hget(VARIANT_MATRIX_CACHE_KEY, template)
+	if matrix is None:
+		matrix = build_variant_matrix(template)
+	return matrix
+
+
+@frappe.whitelist()
+@track_perf
+def get_variant_matrix(item_code: str) -> dict:
+	"""Return the variant matrix of the template ``item_code``.
+
+	``index`` maps the combination key of the chosen values to the variant,
+	``item_attributes`` the variants to their values.
+	"""
+	return get_matrix(item_code)
+
+
+def resolve_variant(template: str, attributes: dict) -> str | None:
+	"""Return the variant of ``template`` with the given attribute values."""
+	matrix = get_matrix(template)
+	return matrix["index"].get(combination_key(attributes.get(attribute) for attribute in matrix["attributes"]))
+
+
+def refresh_variant_matrix(doc, method=None, *args, **kwargs):
+	"""Item hook rebuilding the matrices of the templates the item belongs to."""
+	templates = {doc.get("variant_of")}
+	if doc.get("has_variants"):
+		templates.add(doc.name)
+	previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+	if previous:
+		templates.add(previous.get("variant_of"))
+	if method == "after_rename" and args:
+		# The old name of a renamed template is gone for good
+		frappe.cache().hdel(VARIANT_MATRIX_CACHE_KEY, args[0])
+	templates.discard(None)
+
+	for template in templates:
+		frappe.cache().hdel(VARIANT_MATRIX_CACHE_KEY, template)
+		if method == "on_trash" and template == doc.name:
+			continue
+		try:
+			frappe.enqueue(
+				"posawesome.posawesome.api.variant_matrix.build_variant_matrix",
+				queue="short",
+				job_id=f"posa_variant_matrix::{template}",
+				deduplicate=True,
+				enqueue_after_commit=True,
+				template=template,
+			)
+		except Exception:
+			# Saving the item must not fail, the matrix is built on its next read
+			frappe.log_error(frappe.get_traceback(), f"POS variant matrix {template}")
+
+
+def clear_variant_matrices(doc=None, method=None, *args, **kwargs):
+	"""Item Attribute hook, value order changes affect every matrix."""
+	frappe.cache().delete_value(VARIANT_MATRIX_CACHE_KEY)
@@ -0,0 +1 @@
+# Customer Loyalty Balance Module
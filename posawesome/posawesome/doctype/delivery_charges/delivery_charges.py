@@ -6,6 +6,9 @@ from frappe import _
 import json
 from frappe.model.document import Document
 
+# Redis hash of resolved charges, keyed by the resolver arguments
+DELIVERY_CHARGES_CACHE_KEY = "posa_delivery_charges"
+
 
 class DeliveryCharges(Document):
     def validate(self):
@@ -29,6 +32,10 @@ class DeliveryCharges(Document):
             self.profiles_list = None
 
 
+def clear_delivery_charges_cache(doc=None, method=None):
+    frappe.cache().delete_value(DELIVERY_CHARGES_CACHE_KEY)
+
+
 def get_applicable_delivery_charges(
     company,
     pos_profile=None,
@@ -36,6 +43,31 @@ def get_applicable_delivery_charges(
     address=None,
     delivery_charges=None,
     restrict=False,
+):
+    """Return the Delivery Charges applicable for a company, profile and address.
+
+    Results are cached per set of arguments until a Delivery Charges or an
+    Address is changed, so invoice validation normally runs no query here.
+    """
+    cache_field = json.dumps(
+        [company, pos_profile, customer, address, delivery_charges, bool(restrict)]
+    )
+    charges = frappe.cache().hget(DELIVERY_CHARGES_CACHE_KEY, cache_field)
+    if charges is None:
+        charges = resolve_delivery_charges(
+            company, pos_profile, customer, address, delivery_charges, restrict
+        )
+        frappe.cache().hset(DELIVERY_CHARGES_CACHE_KEY, cache_field, charges)
+    return charges
+
+
+def resolve_delivery_charges(
+    company,
+    pos_profile=None,
+    customer=None,
+    address=None,
+    delivery_charges=None,
+    restrict=False,
 ):
     charges = []
     address_list = []
@@ -55,12 +87,17 @@ def get_applicable_delivery_charges(
                 pluck="parent",
             )
         )
-    for address in address_list:
-        address_charges = frappe.get_cached_value(
-            "Address", address, "posa_delivery_charges"
+    if address_list:
+        delivery_charges_list.extend(
+            frappe.get_all(
+                "Address",
+                filters={
+                    "name": ["in", address_list],
+                    "posa_delivery_charges": ["is", "set"],
+                },
+                pluck="posa_delivery_charges",
+            )
         )
-        if address_charges:
-            delivery_charges_list.append(address_charges)
 
     delivery_charges_filters = {"disabled": 0, "company": company}
     if delivery_charges:
@@ -78,16 +115,22 @@ def get_applicable_delivery_charges(
     )
     delivery_charges_list = [i.name for i in delivery_charges_items]
 
+    if not delivery_charges_list:
+        return charges
+
     delivery_profiels_filters = {"parent": ("in", delivery_charges_list)}
     if pos_profile:
         delivery_profiels_filters["pos_profile"] = pos_profile
-    delivery_profiels = frappe.get_all(
+    delivery_profiels = {}
+    for row in frappe.get_all(
         "Delivery Charges POS Profile",
         filters=delivery_profiels_filters,
-        fields=["*"],
-    )
+        fields=["parent", "rate"],
+        order_by="idx asc",
+    ):
+        delivery_profiels.setdefault(row.parent, row)
     for charge in delivery_charges_items:
-        profile = next((i for i in delivery_profiels if i.parent == charge.name), None)
+        profile = delivery_profiels.get(charge.name)
         if profile:
             charge.rate = profile.rate
             charges.append(charge)
@@ -5,6 +5,7 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 from posawesome.posawesome.api.payment_entry import create_payment_entry
+from posawesome.posawesome.api.m_pesa import normalize_msisdn
 
 
 class MpesaPaymentRegister(Document):
@@ -13,6 +14,7 @@ class MpesaPaymentRegister(Document):
 
     def set_missing_values(self):
         self.currency = "KES"
+        self.phone_key = normalize_msisdn(self.msisdn)
         self.full_name = ""
         if self.firstname:
             self.full_name = self.firstname
@@ -0,0 +1 @@
+# Restaurant Order Archive Module
@@ -0,0 +1,75 @@
+frappe.pages["pos-performance"].on_page_load = function (wrapper) {
+	const page = frappe.ui.make_app_page({
+		parent: wrapper,
+		title: __("POS Performance"),
+		single_column: true,
+	});
+
+	const minutes = page.add_field({
+		fieldname: "minutes",
+		label: __("Period"),
+		fieldtype: "Select",
+		options: [
+			{ value: "10", label: __("Last 10 minutes") },
+			{ value: "60", label: __("Last hour") },
+			{ value: "360", label: __("Last 6 hours") },
+			{ value: "1440", label: __("Last 24 hours") },
+		],
+		default: "60",
+		change: () => refresh(),
+	});
+	page.set_primary_action(__("Refresh"), () => refresh(), "refresh");
+
+	const $body = $('<div class="pos-performance"></div>').appendTo(page.main);
+
+	const columns = [
+		["endpoint", __("Endpoint")],
+		["calls", __("Calls")],
+		["p50_ms", __("p50 (ms)")],
+		["p95_ms", __("p95 (ms)")],
+		["p99_ms", __("p99 (ms)")],
+		["avg_ms", __("Avg (ms)")],
+		["avg_queries", __("Avg Queries")],
+		["avg_query_ms", __("Avg Query Time (ms)")],
+		["avg_response_bytes", __("Avg Response")],
+		["cache_hit_ratio", __("Cache Hit Ratio")],
+	];
+
+	function format(field, value) {
+		if (value === null || value === undefined) return "-";
+		if (field === "avg_response_bytes") return frappe.form.formatters.FileSize(value);
+		if (field === "cache_hit_ratio") return `${(value * 100).toFixed(1)}%`;
+		if (field === "endpoint") return frappe.utils.escape_html(value);
+		return format_number(value, null, field === "calls" ? 0 : 2);
+	}
+
+	function render(stats) {
+		if (!stats.endpoints.length) {
+			$body.html(`<p class="text-muted">${__("No POS calls recorded in this period.")}</p>`);
+			return;
+		}
+		const head = columns.map(([, label]) => `<th>${label}</th>`).join("");
+		const rows = stats.endpoints
+			.map((row) => `<tr>${columns.map(([field]) => `<td>${format(field, row[field])}</td>`).join("")}</tr>`)
+			.join("");
+		$body.html(`
+			<p class="text-muted small">${__("Percentiles are estimated from a histogram and are accurate to about 20%.")}</p>
+			<div class="table-responsive">
+				<table class="table table-bordered table-hover">
+					<thead><tr>${head}</tr></thead>
+					<tbody>${rows}</tbody>
+				</table>
+			</div>
+		`);
+	}
+
+	function refresh() {
+		frappe.call({
+			method: "posawesome.posawesome.api.perf.get_pos_perf_stats",
+			args: { minutes: minutes.get_value() },
+			callback: (r) => r.message && render(r.message),
+		});
+	}
+
+	refresh();
+};